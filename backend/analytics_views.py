@@ -0,0 +1,93 @@
+# Debounced refresh of the materialized analytics views in database/migrations/005_analytics_views.sql
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Materialized view -> base tables it aggregates
+MATERIALIZED_VIEWS = {
+    'course_enrollment_stats': {'courses', 'enrollments'},
+    'grade_distribution': {'courses', 'enrollments'},
+    'department_cgpa_stats': {'students'}
+}
+
+
+class ViewRefresher:
+    """Marks views stale from table_changed notifications and refreshes them once writes go quiet.
+
+    A burst of writes (a bulk import, a grading session) costs one refresh per view:
+    the refresh waits until no change arrived for `debounce` seconds, but never
+    longer than `max_delay` seconds after the view first went stale.
+    """
+
+    def __init__(self, db, debounce=None, max_delay=None):
+        self.db = db
+        self.debounce = float(debounce or os.getenv('MV_REFRESH_DEBOUNCE', '2'))
+        self.max_delay = float(max_delay or os.getenv('MV_REFRESH_MAX_DELAY', '30'))
+        # view -> monotonic time it went stale
+        self.stale = {}
+        self._last_change = 0.0
+        self._wake = asyncio.Event()
+        self.refreshes = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_refresh_ms = 0.0
+
+    async def handle_notify(self, payload):
+        # payload is a changed table name, or None when the listener (re)connected
+        now = time.monotonic()
+        for view, tables in MATERIALIZED_VIEWS.items():
+            if payload is None or payload in tables:
+                self.stale.setdefault(view, now)
+        if self.stale:
+            self._last_change = now
+            self._wake.set()
+
+    async def run(self):
+        while True:
+            await self._wake.wait()
+            while True:
+                now = time.monotonic()
+                delay = min(self._last_change + self.debounce, min(self.stale.values()) + self.max_delay) - now
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self._wake.clear()
+            views, self.stale = self.stale, {}
+            for view, since in views.items():
+                await self._refresh(view, since)
+
+    async def _refresh(self, view, since):
+        start = time.perf_counter()
+        try:
+            rows = await self.db.execute_query("SELECT refresh_analytics_view(%s) AS refreshed", [view])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Refreshing {view} failed: ", e)
+            self.failures += 1
+            return
+        if rows[0]['refreshed']:
+            self.refreshes += 1
+            self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 2)
+        else:
+            # Another backend holds the refresh lock; its snapshot may predate our change, so retry
+            self.skipped += 1
+            self.stale.setdefault(view, since)
+            self._last_change = time.monotonic()
+            self._wake.set()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "stale": {view: round(now - since, 2) for view, since in self.stale.items()},
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_refresh_ms": self.last_refresh_ms,
+            "debounce_seconds": self.debounce,
+            "max_delay_seconds": self.max_delay
+        }
@@ -1,21 +1,118 @@
 # Backend API
 # Integrated by: Arsh Javed
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
+from decimal import Decimal
+from contextlib import asynccontextmanager
 from database import Database
-from gemini_parser import GeminiParser
+from async_database import AsyncDatabase
+from audit_writer import AuditWriter
+from gemini_parser import GeminiParser, PROCEDURE_NOTES
+from llm_client import LLMUnavailable
+from auth import USER_QUERY, PasswordVerifier, LoginRecorder, TokenCache
+from schema_catalog import SchemaCatalog
+from result_cache import ResultCache, FUNCTION_TABLES, referenced_tables
+from sql_analyzer import PolicyViolation, analyze, check_statement, check_procedure, paged, with_limit
+from cost_guard import CostGuard, QueryTooExpensive
+from index_advisor import IndexAdvisor
+from bulk_import import BulkImporter, BulkImportError, ENTITIES, parquet_chunks
+from exporter import MEDIA_TYPES, arrow_stream
+from analytics_views import MATERIALIZED_VIEWS, ViewRefresher
+from psycopg.errors import QueryCanceled
+from plan_store import PlanStore
+from metrics import REGISTRY, Gauge, MetricsMiddleware, rows_returned, stage
+import metrics
 import uvicorn
+import asyncio
+import base64
 import jwt
 import datetime
 from datetime import timedelta
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="AI-Native DBMS API")
+db = Database()
+adb = AsyncDatabase()
+audit = AuditWriter(adb)
+parser = GeminiParser()
+plans = PlanStore()
+catalog = SchemaCatalog(adb)
+results = ResultCache()
+costs = CostGuard(adb)
+advisor = IndexAdvisor(adb)
+importer = BulkImporter(adb, audit)
+views = ViewRefresher(adb)
+passwords = PasswordVerifier()
+logins = LoginRecorder(adb)
+tokens = TokenCache()
+catalog.on_change(lambda: parser.set_schema_section(catalog.prompt_section(PROCEDURE_NOTES)))
+security = HTTPBearer()
+
+# Point-in-time values read from the components' own counters on every scrape
+REGISTRY.add(Gauge('dbms_db_pool_connections', 'Async pool connections by state',
+                   lambda: {('in_use',): adb.stats()['in_use'], ('waiting',): adb.stats()['waiting']}, ('state',)))
+REGISTRY.add(Gauge('dbms_audit_queue_depth', 'Audit entries waiting to be written', lambda: audit.stats()['queue_depth']))
+REGISTRY.add(Gauge('dbms_llm_breaker_open', '1 while the LLM circuit breaker is open',
+                   lambda: int(parser.llm.breaker.state == 'open')))
+REGISTRY.add(Gauge('dbms_cache_lookups_total', 'Cache lookups by cache and outcome', lambda: {
+    ('result', 'hit'): results.hits, ('result', 'miss'): results.misses,
+    ('translation', 'hit'): parser.cache.hits + parser.cache.disk_hits, ('translation', 'miss'): parser.cache.misses,
+    ('token', 'hit'): tokens.hits, ('token', 'miss'): tokens.misses
+}, ('cache', 'outcome'), kind='counter'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+AUDIT_PARTITIONS_AHEAD = int(os.getenv('AUDIT_PARTITIONS_AHEAD', '3'))
+# Operations older than this can no longer be reverted
+ROW_CHANGES_KEEP_DAYS = int(os.getenv('ROW_CHANGES_KEEP_DAYS', '30'))
+
+async def audit_partition_maintenance():
+    # Keep next months' audit_log partitions created ahead of time and drop expired row changes
+    while True:
+        try:
+            await adb.execute_query("SELECT ensure_audit_log_partitions(%s)", [AUDIT_PARTITIONS_AHEAD], fetch=False)
+        except Exception as e:
+            print("Audit partition maintenance failed: ", e)
+        try:
+            await adb.execute_query("SELECT purge_row_changes(%s)", [ROW_CHANGES_KEEP_DAYS], fetch=False)
+        except Exception as e:
+            print("Row change purge failed: ", e)
+        await asyncio.sleep(86400)
+
+async def table_changed(payload):
+    await results.handle_notify(payload)
+    await views.handle_notify(payload)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    passwords.start()
+    await adb.open()
+    await audit.start()
+    await logins.start()
+    maintenance = asyncio.create_task(audit_partition_maintenance())
+    refresher = asyncio.create_task(views.run())
+    listener = asyncio.create_task(adb.listen({
+        'schema_changed': catalog.handle_notify,
+        'table_changed': table_changed
+    }))
+    yield
+    listener.cancel()
+    refresher.cancel()
+    maintenance.cancel()
+    await logins.close()
+    passwords.close()
+    await audit.close()
+    await adb.close()
+    db.close()
+    parser.close()
+
+app = FastAPI(title="AI-Native DBMS API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,15 +120,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
-
-db = Database()
-parser = GeminiParser()
-security = HTTPBearer()
+if metrics.ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 SECRET_KEY = os.getenv('JWT_SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480
+MAX_PAGE_SIZE = int(os.getenv('QUERY_MAX_PAGE_SIZE', '1000'))
+# SELECTs without a LIMIT get LIMIT QUERY_MAX_ROWS (EXPORT_MAX_ROWS for /export) appended,
+# or are refused when QUERY_UNBOUNDED=reject. Paged reads cap the total across pages instead.
+QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', '10000'))
+EXPORT_MAX_ROWS = int(os.getenv('EXPORT_MAX_ROWS', '1000000'))
+QUERY_UNBOUNDED = os.getenv('QUERY_UNBOUNDED', 'limit')
 
 class LoginRequest(BaseModel):
     username: str
@@ -48,6 +150,10 @@ class LoginResponse(BaseModel):
 class QueryRequest(BaseModel):
     text: str
     confirm: bool = False
+    plan_id: Optional[str] = None
+    stream: bool = False
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
 
 class QueryResponse(BaseModel):
     success: bool
@@ -56,6 +162,15 @@ class QueryResponse(BaseModel):
     explanation: str = ""
     sql_query: str = ""
     needs_confirmation: bool = False
+    plan_id: Optional[str] = None
+    next_cursor: Optional[str] = None
+    operation: str = ""
+    op_id: Optional[int] = None
+
+class ExportRequest(BaseModel):
+    text: Optional[str] = None
+    plan_id: Optional[str] = None
+    format: str = 'csv'
 
 class UserInfo(BaseModel):
     user_id: int
@@ -72,54 +187,124 @@ def create_access_token(data: dict):
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInfo:
     try:
         token = credentials.credentials
+        user = tokens.get(token)
+        if user is not None:
+            return user
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return UserInfo(
+        user = UserInfo(
             user_id=payload.get("user_id"),
             username=payload.get("sub"),
             role=payload.get("role"),
             email=payload.get("email")
         )
+        tokens.set(token, user, payload['exp'])
+        return user
     except:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+async def stream_rows(query, params, username, settings=None):
+    count = 0
+    async for rows in adb.stream_query(query, params, settings=settings):
+        count += len(rows)
+        yield ''.join(json.dumps(row, default=json_default) + '\n' for row in rows)
+    rows_returned(count)
+    await audit.log('SELECT', 'query', username, 'SUCCESS')
+
+async def audited(chunks, operation, username):
+    async for chunk in chunks:
+        yield chunk
+    await audit.log(operation, 'query', username, 'SUCCESS')
+
+def llm_unavailable(error):
+    return HTTPException(
+        status_code=503,
+        detail={"error": "llm_unavailable", "message": error.message},
+        headers={"Retry-After": str(error.retry_after)} if error.retry_after else None
+    )
+
+def authorize(parsed, user):
+    # Checks a parsed plan against the caller's role on the SQL AST and returns the plan to execute
+    if parsed.get('operation') not in ('select', 'insert', 'update', 'delete'):
+        raise HTTPException(status_code=400, detail="Unsupported operation")
+    try:
+        if parsed.get('procedure'):
+            check_procedure(parsed['procedure'], user.role)
+            if parsed['operation'] != 'select':
+                return parsed
+            placeholders = ', '.join(['%s'] * len(parsed.get('params') or []))
+            parsed = {**parsed, 'query': f"SELECT * FROM {parsed['procedure']}({placeholders})", 'procedure': None}
+        if not parsed.get('query'):
+            raise HTTPException(status_code=400, detail="No query or procedure specified")
+        analysis = analyze(parsed['query'])
+        check_statement(analysis, user.role, user.username, parsed.get('params'))
+    except PolicyViolation as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+    if analysis.kind != parsed['operation']:
+        # The statement decides what runs, not the operation the LLM declared
+        parsed = {**parsed, 'operation': analysis.kind}
+    return parsed
+
+def bound(parsed, max_rows):
+    # Caps an authorized SELECT that has no LIMIT of its own
+    if parsed['operation'] != 'select' or analyze(parsed['query']).has_limit:
+        return parsed
+    if QUERY_UNBOUNDED == 'reject':
+        raise HTTPException(status_code=400, detail="Query has no LIMIT; please narrow it down")
+    return {**parsed, 'query': with_limit(parsed['query'], max_rows)}
+
 def require_admin(user: UserInfo = Depends(verify_token)) -> UserInfo:
     if user.role != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return user
 
+def require_staff(user: UserInfo = Depends(verify_token)) -> UserInfo:
+    if user.role not in ('admin', 'faculty'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin or faculty access required")
+    return user
+
 @app.get("/")
 def root():
     return {"message": "AI-Native DBMS API"}
 
 @app.post("/auth/login", response_model=LoginResponse)
-def login(request: LoginRequest):
+async def login(request: LoginRequest):
     try:
-        users = {
-            'admin': {'user_id': 1, 'role': 'admin', 'email': 'admin@university.edu'},
-            'student1': {'user_id': 2, 'role': 'student', 'email': 'student1@university.edu'},
-            'faculty1': {'user_id': 3, 'role': 'faculty', 'email': 'faculty1@university.edu'}
-        }
-        
-        if request.username in users and request.password in ['admin123', 'user123']:
-            user = users[request.username]
-            token_data = {
-                "sub": request.username,
-                "user_id": user['user_id'],
-                "role": user['role'],
-                "email": user['email']
-            }
-            access_token = create_access_token(token_data)
-            
-            return LoginResponse(
-                access_token=access_token,
-                token_type="bearer",
-                user_id=user['user_id'],
-                username=request.username,
-                role=user['role'],
-                email=user['email']
-            )
-        else:
+        rows = await adb.execute_query(USER_QUERY, [request.username], prepare=True)
+        user = rows[0] if rows else None
+        # bcrypt runs in the process pool; unknown users are checked against a dummy hash
+        with stage('password'):
+            valid = await passwords.verify(request.password, user['password_hash'] if user else None)
+        if valid is None:
+            raise HTTPException(status_code=503, detail="Too many logins in progress, please retry",
+                                headers={"Retry-After": "1"})
+        if not valid or not user or not user['is_active']:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+        logins.record(user['user_id'])
+        token_data = {
+            "sub": user['username'],
+            "user_id": user['user_id'],
+            "role": user['role'],
+            "email": user['email']
+        }
+        access_token = create_access_token(token_data)
+
+        return LoginResponse(
+            access_token=access_token,
+            token_type="bearer",
+            user_id=user['user_id'],
+            username=user['username'],
+            role=user['role'],
+            email=user['email']
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -132,12 +317,36 @@ def get_current_user(user: UserInfo = Depends(verify_token)):
     return user
 
 @app.post("/query", response_model=QueryResponse)
-def execute_query(request: QueryRequest, user: UserInfo = Depends(verify_token)):
+async def execute_query(request: QueryRequest, user: UserInfo = Depends(verify_token)):
     try:
-        parsed = parser.parse(request.text, user.username, user.role)
+        question, asked_as = request.text, user.role
+        if request.confirm and request.plan_id:
+            # Execute exactly the plan the user approved instead of asking the LLM again.
+            # SELECT plans stay available so the client can page through results.
+            taken = plans.take(user.username, request.plan_id,
+                               keep_if=lambda plan: plan.get('operation') == 'select')
+            if taken is None:
+                raise HTTPException(status_code=404, detail="Query plan expired or not found, please resubmit the query")
+            # Learn from and describe the question the plan was translated from, not the text sent now
+            parsed, question, asked_as = taken
+        else:
+            with stage('parse'):
+                parsed = await parser.parse_async(request.text, user.username, user.role)
+        learnable = bool(question) and asked_as == user.role
         
         if not parsed:
             raise HTTPException(status_code=400, detail="Could not parse query")
+        # The plan is stored unbounded so /export can apply its own row cap
+        with stage('authorize'):
+            plan = authorize(parsed, user)
+            parsed = bound(plan, QUERY_MAX_ROWS)
+        # Paged reads are costed per page, on the statement that runs
+        paging = request.confirm and parsed['operation'] == 'select' and not request.stream \
+            and bool(request.limit or request.cursor)
+        if parsed.get('query') and not parsed.get('procedure') and not paging:
+            with stage('cost_check'):
+                await costs.check(parsed['query'], parsed.get('params') or None, user.role)
+        settings = costs.settings(user.role)
         
         if not request.confirm:
             # Generate SQL preview based on operation type
@@ -152,57 +361,68 @@ def execute_query(request: QueryRequest, user: UserInfo = Depends(verify_token))
                 data=[],
                 explanation=parsed.get('explanation', ''),
                 sql_query=sql_preview,
-                needs_confirmation=True
+                needs_confirmation=True,
+                plan_id=plans.put(user.username, plan, request.text, user.role)
             )
         
         if parsed['operation'] == 'select':
-            query = parsed['query'].lower()
-            
-            if user.role != 'admin':
-                # Block direct access to audit_log table
-                if 'from audit_log' in query or 'join audit_log' in query:
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="Access denied: Cannot access audit logs"
-                    )
-                # Block queries that select password or other sensitive system_users fields directly
-                if 'system_users.password' in query.replace(' ', ''):
-                    raise HTTPException(
-                        status_code=status.HTTP_403_FORBIDDEN,
-                        detail="Access denied: Cannot access sensitive fields"
-                    )
+            if request.stream:
+                return StreamingResponse(
+                    stream_rows(parsed['query'], parsed.get('params') or None, user.username, settings),
+                    media_type="application/x-ndjson"
+                )
             
-            result = db.execute_query(parsed['query'])
-            db.execute_query("SELECT log_operation(%s, %s, %s, %s)", 
-                           ['SELECT', 'query', user.username, 'SUCCESS'], fetch=False)
+            tables = referenced_tables(parsed['query'])
+            with stage('execute'):
+                if paging:
+                    limit = max(1, min(request.limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+                    # Pages follow the query's own ORDER BY; the row cap spans all pages
+                    page = paged(plan['query'])
+                    if page is None:
+                        raise HTTPException(status_code=400,
+                                            detail="Query cannot be paged: ORDER BY must use selected columns")
+                    key = results.make_key('query', user.role, user.username, plan['query'],
+                                           [plan.get('params'), limit, request.cursor])
+                    result, next_cursor = await results.read_through(key, tables, lambda: adb.fetch_page(
+                        *page, plan.get('params'), limit, request.cursor, QUERY_MAX_ROWS, settings,
+                        lambda statement, params: costs.check(statement, params, user.role)))
+                else:
+                    key = results.make_key('query', user.role, user.username, parsed['query'], parsed.get('params'))
+                    result = await results.read_through(key, tables, lambda: adb.execute_query(
+                        parsed['query'], parsed.get('params') or None, settings=settings, shared=True))
+                    next_cursor = None
+            rows_returned(len(result))
+            advisor.observe(parsed['query'])
+            with stage('audit'):
+                await audit.log('SELECT', 'query', user.username, 'SUCCESS')
+            if learnable and not request.cursor:
+                with stage('learn'):
+                    parser.learn(question, plan, user.username)
             return QueryResponse(
                 success=True,
                 message="Query executed successfully",
-                data=[dict(row) for row in result],
+                data=result,
                 explanation=parsed.get('explanation', ''),
                 sql_query=parsed.get('query', ''),
-                needs_confirmation=False
+                needs_confirmation=False,
+                next_cursor=next_cursor,
+                operation='select'
             )
         
         elif parsed['operation'] in ['insert', 'update', 'delete']:
-            # Permission checks
-            if parsed['operation'] == 'delete' and user.role != 'admin':
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only admin can delete records"
-                )
-            
-            if parsed['operation'] == 'insert' and user.role == 'student':
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Students cannot add records"
-                )
-            
+            # Captured row changes are recorded under an operation named after the request
+            settings = {**settings, 'app.user': user.username, 'app.op_description': question[:500]}
             # Check if procedure is specified
             if parsed.get('procedure'):
                 placeholders = ','.join(['%s'] * len(parsed['params']))
                 query = f"SELECT * FROM {parsed['procedure']}({placeholders})"
-                result = db.execute_query(query, parsed['params'])
+                with stage('execute'):
+                    result, op_id = await adb.execute_write(query, parsed['params'], fetch=True, prepare=True,
+                                                            settings=settings)
+                    await results.invalidate(FUNCTION_TABLES.get(parsed['procedure'], set()))
+                if learnable and result[0].get('success', False):
+                    with stage('learn'):
+                        parser.learn(question, plan, user.username)
                 
                 return QueryResponse(
                     success=result[0].get('success', False),
@@ -210,15 +430,19 @@ def execute_query(request: QueryRequest, user: UserInfo = Depends(verify_token))
                     data=[dict(row) for row in result],
                     explanation=parsed.get('explanation', ''),
                     sql_query=f"CALL {parsed['procedure']}({', '.join(map(str, parsed['params']))})",
-                    needs_confirmation=False
+                    needs_confirmation=False,
+                    op_id=op_id
                 )
             else:
-                if not parsed.get('query'):
-                    raise HTTPException(status_code=400, detail="No query or procedure specified")
-                
-                db.execute_query(parsed['query'], parsed.get('params', []), fetch=False)
-                db.execute_query("SELECT log_operation(%s, %s, %s, %s)", 
-                               [parsed['operation'].upper(), 'query', user.username, 'SUCCESS'], fetch=False)
+                with stage('execute'):
+                    _, op_id = await adb.execute_write(parsed['query'], parsed.get('params', []), settings=settings)
+                    await results.invalidate(referenced_tables(parsed['query']) or set())
+                advisor.observe(parsed['query'])
+                with stage('audit'):
+                    await audit.log(parsed['operation'].upper(), 'query', user.username, 'SUCCESS', op_id)
+                if learnable:
+                    with stage('learn'):
+                        parser.learn(question, plan, user.username)
                 
                 return QueryResponse(
                     success=True,
@@ -226,115 +450,194 @@ def execute_query(request: QueryRequest, user: UserInfo = Depends(verify_token))
                     data=[],
                     explanation=parsed.get('explanation', ''),
                     sql_query=parsed.get('query', ''),
-                    needs_confirmation=False
+                    needs_confirmation=False,
+                    op_id=op_id
                 )
         else:
             raise HTTPException(status_code=400, detail="Unsupported operation")
     
     except HTTPException:
         raise
+    except QueryTooExpensive as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+    except LLMUnavailable as e:
+        raise llm_unavailable(e)
+    except QueryCanceled:
+        timeout = costs.budget(user.role)['statement_timeout']
+        raise HTTPException(status_code=408, detail={
+            "error": "query_timeout",
+            "message": f"The query ran longer than {timeout} and was cancelled. Try adding filters.",
+            "statement_timeout": timeout
+        })
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
       
 
+@app.post("/export")
+async def export_query(request: ExportRequest, user: UserInfo = Depends(verify_token)):
+    # Same plan, role and cost checks as /query, but the result is streamed as CSV, Arrow or Parquet
+    if request.format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, expected one of {', '.join(MEDIA_TYPES)}")
+    try:
+        if request.plan_id:
+            taken = plans.take(user.username, request.plan_id,
+                               keep_if=lambda plan: plan.get('operation') == 'select')
+            if taken is None:
+                raise HTTPException(status_code=404, detail="Query plan expired or not found, please resubmit the query")
+            parsed = taken[0]
+        elif request.text:
+            with stage('parse'):
+                parsed = await parser.parse_async(request.text, user.username, user.role)
+        else:
+            raise HTTPException(status_code=400, detail="Provide the query text or a plan_id")
+        if not parsed:
+            raise HTTPException(status_code=400, detail="Could not parse query")
+        with stage('authorize'):
+            parsed = bound(authorize(parsed, user), EXPORT_MAX_ROWS)
+        if parsed['operation'] != 'select':
+            raise HTTPException(status_code=400, detail="Only SELECT queries can be exported")
+        with stage('cost_check'):
+            await costs.check(parsed['query'], parsed.get('params') or None, user.role)
+    except HTTPException:
+        raise
+    except QueryTooExpensive as e:
+        raise HTTPException(status_code=400, detail=e.detail)
+    except LLMUnavailable as e:
+        raise llm_unavailable(e)
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    settings = costs.settings(user.role)
+    params = parsed.get('params') or None
+    if request.format == 'csv':
+        body = adb.copy_out(parsed['query'], params, settings)
+    else:
+        body = arrow_stream(adb.stream_tuples(parsed['query'], params, settings=settings), request.format)
+    return StreamingResponse(
+        audited(body, 'EXPORT', user.username),
+        media_type=MEDIA_TYPES[request.format],
+        headers={"Content-Disposition": f'attachment; filename="export.{request.format}"'}
+    )
+
 @app.get("/profile")
-def get_profile(user: UserInfo = Depends(verify_token)):
+async def get_profile(user: UserInfo = Depends(verify_token)):
     try:
-        result = db.execute_query(
+        key = results.make_key('profile', user.role, user.user_id)
+        result = await results.read_through(key, FUNCTION_TABLES['get_my_profile'], lambda: adb.execute_query(
             "SELECT * FROM get_my_profile(%s, %s)",
-            [user.user_id, user.role]
-        )
+            [user.user_id, user.role],
+            prepare=True
+        ))
         return {"profile": dict(result[0]) if result else {}}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/audit-logs")
-def get_audit_logs(user: UserInfo = Depends(verify_token)):
+async def get_audit_logs(
+    user: UserInfo = Depends(verify_token),
+    executed_by: Optional[str] = None,
+    operation: Optional[str] = None,
+    table_name: Optional[str] = None,
+    log_status: Optional[str] = Query(None, alias="status"),
+    start: Optional[datetime.datetime] = None,
+    end: Optional[datetime.datetime] = None,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None
+):
     try:
-        result = db.execute_query("SELECT * FROM get_audit_logs(%s)", [user.role])
-        return {"logs": [dict(row) for row in result]}
+        before_at, before_id = None, None
+        if cursor:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            before_at, before_id = datetime.datetime.fromisoformat(position['at']), position['id']
+        
+        result = await adb.execute_query(
+            "SELECT * FROM get_audit_logs(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+            [user.role, limit + 1, executed_by, operation, table_name, log_status, start, end, before_at, before_id],
+            prepare=True
+        )
+        
+        next_cursor = None
+        if len(result) > limit:
+            result = result[:limit]
+            last = result[-1]
+            next_cursor = base64.urlsafe_b64encode(
+                json.dumps({"at": last['executed_at'].isoformat(), "id": last['log_id']}).encode()
+            ).decode()
+        return {"logs": result, "next_cursor": next_cursor}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=403 if "Only admin" in str(e) else 500, detail=str(e))
 
+@app.post("/audit-logs/archive")
+async def archive_audit_logs(keep_months: int = Query(12, ge=1), drop: bool = False,
+                             user: UserInfo = Depends(require_admin)):
+    try:
+        await adb.execute_query("SELECT ensure_audit_log_partitions(%s)", [AUDIT_PARTITIONS_AHEAD], fetch=False)
+        result = await adb.execute_query("SELECT * FROM archive_audit_log_partitions(%s, %s)", [keep_months, drop])
+        return {"partitions": result}
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/operations")
+async def get_operations(executed_by: Optional[str] = None, limit: int = Query(50, ge=1, le=500),
+                         before: Optional[int] = None, user: UserInfo = Depends(require_admin)):
+    try:
+        result = await adb.execute_query("SELECT * FROM get_operations(%s, %s, %s)", [executed_by, limit, before],
+                                         prepare=True)
+        return {"operations": result, "next_before": result[-1]['op_id'] if len(result) == limit else None}
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def revert(query, params):
+    # Both revert functions undo everything in one transaction or nothing at all
+    result = (await adb.execute_query(query, params))[0]
+    if not result['success']:
+        raise HTTPException(status_code=404 if 'not found' in result['message'] else 409, detail=result['message'])
+    await results.invalidate(set(result['tables']))
+    return result
+
+@app.post("/operations/{op_id}/revert")
+async def revert_operation(op_id: int, force: bool = False, user: UserInfo = Depends(require_admin)):
+    try:
+        return await revert("SELECT * FROM revert_operations(%s, %s, %s)", [[op_id], user.username, force])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/operations/revert")
+async def revert_user_operations(executed_by: str, start: datetime.datetime, end: Optional[datetime.datetime] = None,
+                                 force: bool = False, user: UserInfo = Depends(require_admin)):
+    try:
+        return await revert("SELECT * FROM revert_user_operations(%s, %s, %s, %s, %s)",
+                            [executed_by, start, end, user.username, force])
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/users")
-def get_users(user: UserInfo = Depends(require_admin)):
+async def get_users(user: UserInfo = Depends(require_admin)):
     try:
-        result = db.execute_query("SELECT * FROM get_all_users(%s)", [user.role])
-        return {"users": [dict(row) for row in result]}
+        key = results.make_key('users', user.role, '')
+        result = await results.read_through(key, FUNCTION_TABLES['get_all_users'], lambda: adb.execute_query(
+            "SELECT * FROM get_all_users(%s)", [user.role], prepare=True))
+        return {"users": result}
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/schema")
-def get_schema(user: UserInfo = Depends(verify_token)):
+async def get_schema(user: UserInfo = Depends(verify_token)):
     try:
-        if user.role == 'admin':
-            tables_query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name"
-            columns_query = "SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_schema = 'public' ORDER BY table_name, ordinal_position"
-            procedures_query = """
-                SELECT 
-                    r.routine_name,
-                    COALESCE(
-                        string_agg(
-                            COALESCE(p.parameter_name, '') || ' ' || COALESCE(p.data_type, ''), 
-                            ', ' ORDER BY p.ordinal_position
-                        ),
-                        'no parameters'
-                    ) as parameters
-                FROM information_schema.routines r
-                LEFT JOIN information_schema.parameters p 
-                    ON r.specific_name = p.specific_name 
-                    AND p.parameter_mode = 'IN'
-                WHERE r.routine_schema = 'public' 
-                    AND r.routine_type = 'FUNCTION'
-                GROUP BY r.routine_name
-                ORDER BY r.routine_name
-            """
-        else:
-            tables_query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' AND table_name NOT IN ('audit_log', 'system_users') ORDER BY table_name"
-            columns_query = "SELECT table_name, column_name, data_type FROM information_schema.columns WHERE table_schema = 'public' AND table_name NOT IN ('audit_log', 'system_users') ORDER BY table_name, ordinal_position"
-            
-            # Filter procedures based on role
-            if user.role == 'faculty':
-                # Faculty can see enrollment and grade management procedures
-                allowed_procs = ['enroll_student', 'update_grade', 'get_student_courses', 'get_faculty_courses', 'get_course_enrollments', 'get_my_profile']
-            else:  # student
-                # Students can only view their own data
-                allowed_procs = ['get_student_courses', 'get_my_profile']
-            
-            procedures_query = f"""
-                SELECT 
-                    r.routine_name,
-                    COALESCE(
-                        string_agg(
-                            COALESCE(p.parameter_name, '') || ' ' || COALESCE(p.data_type, ''), 
-                            ', ' ORDER BY p.ordinal_position
-                        ),
-                        'no parameters'
-                    ) as parameters
-                FROM information_schema.routines r
-                LEFT JOIN information_schema.parameters p 
-                    ON r.specific_name = p.specific_name 
-                    AND p.parameter_mode = 'IN'
-                WHERE r.routine_schema = 'public' 
-                    AND r.routine_type = 'FUNCTION'
-                    AND r.routine_name IN ({','.join([f"'{p}'" for p in allowed_procs])})
-                GROUP BY r.routine_name
-                ORDER BY r.routine_name
-            """
-        
-        tables = db.execute_query(tables_query)
-        columns = db.execute_query(columns_query)
-        procedures = db.execute_query(procedures_query)
-        
-        return {
-            "tables": [dict(row) for row in tables],
-            "columns": [dict(row) for row in columns],
-            "procedures": [dict(row) for row in procedures] if procedures else []
-        }
+        return await catalog.for_role(user.role)
     except Exception as e:
         print(e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -356,6 +659,68 @@ def load_procedures(user: UserInfo = Depends(require_admin)):
         print("Exception: ", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/import/{entity}")
+async def bulk_import(entity: str, request: Request, format: str = Query('csv', pattern='^(csv|parquet)$'),
+                      user: UserInfo = Depends(require_admin)):
+    # The request body is the file itself; CSV is streamed into COPY as it arrives
+    if entity not in ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Unknown entity, expected one of {', '.join(ENTITIES)}")
+    try:
+        chunks = parquet_chunks(await request.body()) if format == 'parquet' else request.stream()
+        return await importer.run(entity, chunks, user.username)
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail={"message": e.message, "errors": e.errors})
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/{view}")
+async def get_analytics(view: str, user: UserInfo = Depends(require_staff)):
+    # Precomputed aggregates; at most a few seconds behind the base tables
+    if view not in MATERIALIZED_VIEWS:
+        raise HTTPException(status_code=404, detail=f"Unknown view, expected one of {', '.join(MATERIALIZED_VIEWS)}")
+    try:
+        key = results.make_key('analytics', user.role, '', view)
+        with stage('execute'):
+            result = await results.read_through(key, {view}, lambda: adb.execute_query(
+                f"SELECT * FROM {view}", prepare=True))
+        rows_returned(len(result))
+        return {"view": view, "rows": result}
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/advisor/indexes")
+async def get_index_advice(min_rows: Optional[int] = Query(None, ge=0), user: UserInfo = Depends(require_admin)):
+    try:
+        return await advisor.report(min_rows)
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/stats")
+def get_stats(user: UserInfo = Depends(require_admin)):
+    return {
+        "pool": db.stats(),
+        "async_pool": adb.stats(),
+        "translation_cache": parser.cache.stats(),
+        "parser": parser.stats(),
+        "plans": plans.stats(),
+        "audit": audit.stats(),
+        "result_cache": results.stats(),
+        "cost_guard": costs.stats(),
+        "imports": importer.stats(),
+        "analytics_views": views.stats(),
+        "auth": {"passwords": passwords.stats(), "last_login": logins.stats(), "tokens": tokens.stats()}
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    # Prometheus scrape target; protected by a static bearer token when METRICS_TOKEN is set
+    if METRICS_TOKEN and request.headers.get('authorization') != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
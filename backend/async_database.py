@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from psycopg import AsyncConnection, sql
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+from dotenv import load_dotenv
+from coalescing import SingleFlight
+from metrics import DB_POOL_WAIT
+from sql_analyzer import page_query
+
+load_dotenv()
+
+class AsyncDatabase:
+    def __init__(self, min_size=None, max_size=None):
+        self.min_size = int(min_size or os.getenv('DB_POOL_MIN', '2'))
+        self.max_size = int(max_size or os.getenv('DB_POOL_MAX', '20'))
+        self.ping_after = float(os.getenv('DB_POOL_PING_AFTER', '30'))
+        self.batch_size = int(os.getenv('DB_FETCH_BATCH', '500'))
+        self.prepared_max = int(os.getenv('DB_PREPARED_MAX', '100'))
+        # Mirrors psycopg's per-connection prepared-statement LRU so hit rates can be reported
+        self._prepared = weakref.WeakKeyDictionary()
+        self.prepared_hits = 0
+        self.prepared_misses = 0
+        self._health_task = None
+        self.flights = SingleFlight()
+        self.conninfo = make_conninfo(
+            host=os.getenv('DB_HOST', 'localhost'),
+            port=os.getenv('DB_PORT', '5432'),
+            dbname=os.getenv('DB_NAME', 'mydb'),
+            user=os.getenv('DB_USER', 'user'),
+            password=os.getenv('DB_PASSWORD', 'password')
+        )
+        self.pool = AsyncConnectionPool(
+            self.conninfo,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            # Only statements executed with prepare=True are prepared server-side;
+            # ad-hoc LLM SQL would otherwise churn the cache.
+            kwargs={"row_factory": dict_row, "prepare_threshold": 2 ** 31 - 1},
+            configure=self._configure,
+            open=False
+        )
+
+    async def _configure(self, conn):
+        conn.prepared_max = self.prepared_max
+
+    def _track_prepared(self, conn, query, params):
+        statements = self._prepared.get(conn)
+        if statements is None:
+            statements = self._prepared[conn] = OrderedDict()
+        key = (query, tuple(type(p) for p in params or ()))
+        if key in statements:
+            statements.move_to_end(key)
+            self.prepared_hits += 1
+        else:
+            statements[key] = True
+            self.prepared_misses += 1
+            while len(statements) > self.prepared_max:
+                statements.popitem(last=False)
+
+    @asynccontextmanager
+    async def _connection(self):
+        started = time.perf_counter()
+        async with self.pool.connection() as conn:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+            yield conn
+
+    async def open(self):
+        try:
+            await self.pool.open(wait=True)
+        except Exception as e:
+            raise Exception(f"Database connection failed: {str(e)}")
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        # Idle connections are pinged periodically; broken ones are replaced by the pool
+        while True:
+            await asyncio.sleep(self.ping_after)
+            try:
+                await self.pool.check()
+            except Exception as e:
+                print("Pool health check failed: ", e)
+
+    async def _apply_settings(self, conn, settings):
+        # set_config(..., true) is transaction-local, so it ends with the checkout
+        if settings:
+            await conn.execute(
+                sql.SQL("SELECT {}").format(sql.SQL(', ').join(
+                    sql.SQL("set_config({}, %s, true)").format(sql.Literal(name)) for name in settings
+                )),
+                list(settings.values())
+            )
+
+    async def execute_query(self, query, params=None, fetch=True, prepare=False, settings=None, shared=False):
+        # pool.connection() commits on success and rolls back on error.
+        # prepare=True is for fixed-shape statements: they are parsed and planned
+        # once per connection and kept in a per-connection LRU of DB_PREPARED_MAX.
+        # settings (e.g. statement_timeout) apply to this statement only.
+        # shared=True (reads only): identical statements already running hand their
+        # rows to this caller instead of executing again.
+        if shared:
+            key = json.dumps([query, params, settings, prepare], default=str)
+            return await self.flights.do(key, lambda: self.execute_query(query, params, fetch, prepare, settings))
+        async with self._connection() as conn:
+            await self._apply_settings(conn, settings)
+            if prepare:
+                self._track_prepared(conn, query, params)
+            async with conn.cursor() as cur:
+                await cur.execute(query, params, prepare=prepare or None)
+                if fetch:
+                    return await cur.fetchall()
+                return None
+
+    async def execute_write(self, query, params=None, fetch=False, prepare=False, settings=None):
+        # Like execute_query, but also returns the id of the operation the row-change
+        # triggers recorded this transaction under (None when no row was written)
+        async with self._connection() as conn:
+            await self._apply_settings(conn, settings)
+            if prepare:
+                self._track_prepared(conn, query, params)
+            async with conn.cursor() as cur:
+                await cur.execute(query, params, prepare=prepare or None)
+                rows = await cur.fetchall() if fetch else None
+                await cur.execute("SELECT NULLIF(current_setting('app.op_id', true), '')::bigint AS op_id")
+                return rows, (await cur.fetchone())['op_id']
+
+    async def stream_query(self, query, params=None, batch_size=None, settings=None):
+        # Server-side named cursor: rows arrive in batches instead of one fetchall()
+        batch_size = batch_size or self.batch_size
+        async with self._connection() as conn:
+            await self._apply_settings(conn, settings)
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+                await cur.execute(query, params)
+                while True:
+                    rows = await cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    async def stream_tuples(self, query, params=None, batch_size=None, settings=None):
+        # Like stream_query, but yields (columns, rows as tuples) for columnar consumers.
+        # An empty result still yields its columns once.
+        batch_size = batch_size or self.batch_size
+        async with self._connection() as conn:
+            await self._apply_settings(conn, settings)
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}", row_factory=tuple_row) as cur:
+                await cur.execute(query, params)
+                rows = await cur.fetchmany(batch_size)
+                yield cur.description, rows
+                while rows:
+                    rows = await cur.fetchmany(batch_size)
+                    if rows:
+                        yield cur.description, rows
+
+    async def copy_out(self, query, params=None, settings=None):
+        # COPY (query) TO STDOUT as CSV, passing chunks through as the server sends them
+        async with self._connection() as conn:
+            await self._apply_settings(conn, settings)
+            async with conn.cursor() as cur:
+                statement = sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER)").format(
+                    sql.SQL(query.strip().rstrip(';')))
+                async with cur.copy(statement, params) as copy:
+                    async for data in copy:
+                        yield bytes(data)
+
+    async def fetch_page(self, inner, keys, params=None, limit=100, cursor=None, max_rows=None, settings=None,
+                         check=None):
+        # Keyset-pages sql_analyzer.paged() output. The cursor holds the last row's ORDER BY
+        # key values and text form, so the next page seeks straight past it, plus how many
+        # identical rows were already served and the running total for max_rows, which caps
+        # the whole result across pages. check(statement, params) runs before the statement.
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode())) if cursor else None
+        served = state['n'] if state else 0
+        last_page = max_rows is not None and served + limit >= max_rows
+        if last_page:
+            limit = max_rows - served
+            if limit <= 0:
+                return [], None
+        statement, after_params = page_query(inner, keys, (state['v'], state['t']) if state else None)
+        params = [*(params or []), *after_params, state['d'] if state else 0, limit + 1]
+        if check is not None:
+            await check(statement, params)
+        rows = await self.execute_query(statement, params, settings=settings)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if not last_page:
+                last = (rows[-1]['_page_keys'], rows[-1]['_page_row'])
+                repeats = 0
+                for row in reversed(rows):
+                    if (row['_page_keys'], row['_page_row']) != last:
+                        break
+                    repeats += 1
+                if state and repeats == len(rows) and last == (state['v'], state['t']):
+                    repeats += state['d']
+                next_cursor = base64.urlsafe_b64encode(json.dumps(
+                    {"v": last[0], "t": last[1], "d": repeats, "n": served + limit}).encode()).decode()
+        for row in rows:
+            for column in [c for c in row if c == '_page_row' or c.startswith('_page_k')]:
+                del row[column]
+        return rows, next_cursor
+
+    async def listen(self, handlers):
+        # LISTEN on a dedicated connection and dispatch NOTIFY payloads to
+        # handlers[channel]. Handlers get None after every (re)connect, since
+        # notifications sent while disconnected are lost.
+        while True:
+            try:
+                async with await AsyncConnection.connect(self.conninfo, autocommit=True) as conn:
+                    for channel in handlers:
+                        await conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(channel)))
+                    for handler in handlers.values():
+                        await handler(None)
+                    async for notify in conn.notifies():
+                        try:
+                            await handlers[notify.channel](notify.payload)
+                        except Exception as e:
+                            print(f"Notification handler for {notify.channel} failed: ", e)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Listener connection lost: ", e)
+                await asyncio.sleep(5)
+
+    def stats(self):
+        stats = self.pool.get_stats()
+        requests = stats.get('requests_num', 0)
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": stats.get('pool_size', 0) - stats.get('pool_available', 0),
+            "waiting": stats.get('requests_waiting', 0),
+            "checkouts": requests,
+            "reconnects": stats.get('connections_lost', 0),
+            "avg_checkout_ms": round(stats.get('requests_wait_ms', 0) / requests, 3) if requests else 0.0,
+            "shared_reads": self.flights.shared,
+            "prepared_hits": self.prepared_hits,
+            "prepared_misses": self.prepared_misses,
+            "prepared_hit_rate": round(self.prepared_hits / (self.prepared_hits + self.prepared_misses), 4)
+                if self.prepared_hits + self.prepared_misses else 0.0
+        }
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+        await self.pool.close()
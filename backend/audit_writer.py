@@ -0,0 +1,152 @@
+# Batched audit-log writer
+
+import asyncio
+import datetime
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+INSERT_BATCH = """
+    INSERT INTO audit_log (operation, table_name, executed_by, executed_at, status, op_id)
+    SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::timestamptz[], %s::varchar[], %s::bigint[])
+"""
+
+MODES = ('sync', 'group', 'async')
+
+
+class AuditWriter:
+    """Queues audit records and writes them to audit_log in multi-row batches.
+
+    Modes:
+      sync  - every record is its own INSERT, committed before log() returns
+      group - callers wait for the commit, but concurrent records share one INSERT
+      async - log() returns once the record is queued; a flusher writes on size/time thresholds
+    """
+
+    def __init__(self, db, mode=None, max_queue=None, batch_size=None, flush_interval=None):
+        self.db = db
+        self.mode = mode or os.getenv('AUDIT_MODE', 'group')
+        if self.mode not in MODES:
+            raise ValueError(f"AUDIT_MODE must be one of {', '.join(MODES)}")
+        self.max_queue = int(max_queue or os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+        self.batch_size = int(batch_size or os.getenv('AUDIT_BATCH_SIZE', '500'))
+        self.flush_interval = float(flush_interval or os.getenv('AUDIT_FLUSH_INTERVAL', '0.5'))
+        self.queue = None
+        self._task = None
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0
+        self.failed = 0
+        self.high_water = 0
+        self.last_flush_ms = 0.0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def log(self, operation, table_name, executed_by, status, op_id=None):
+        # op_id links the record to the row changes a write captured, for /operations/{op_id}/revert
+        record = (operation, table_name, executed_by, datetime.datetime.now(datetime.UTC), status, op_id)
+        if self.mode == 'sync' or self._task is None:
+            await self._write([record])
+            return
+
+        done = asyncio.get_running_loop().create_future() if self.mode == 'group' else None
+        if self.queue.full():
+            # Backpressure: the caller waits for the flusher to make room
+            self.blocked += 1
+        await self.queue.put((record, done))
+        self.enqueued += 1
+        self.high_water = max(self.high_water, self.queue.qsize())
+        if done is not None:
+            await done
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            if self.mode == 'group':
+                # Group commit: take whatever queued up while the previous flush ran
+                while len(batch) < self.batch_size and not self.queue.empty():
+                    item = self.queue.get_nowait()
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+            else:
+                deadline = loop.time() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+            await self._flush(batch)
+
+        # Shutdown: drain whatever is left
+        remaining = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    async def _flush(self, batch):
+        records = [record for record, _ in batch]
+        error = None
+        try:
+            await self._write(records)
+        except Exception as e:
+            self.failed += len(records)
+            error = e
+            print("Audit flush failed: ", e)
+        for _, done in batch:
+            if done is not None and not done.done():
+                if error is None:
+                    done.set_result(None)
+                else:
+                    done.set_exception(error)
+
+    async def _write(self, records):
+        start = time.perf_counter()
+        columns = [list(column) for column in zip(*records)]
+        await self.db.execute_query(INSERT_BATCH, columns, fetch=False, prepare=True)
+        self.written += len(records)
+        self.batches += 1
+        self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_capacity": self.max_queue,
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "blocked_puts": self.blocked,
+            "failed": self.failed,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
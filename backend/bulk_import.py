@@ -0,0 +1,360 @@
+# Bulk import of students, faculty, courses and enrollments through COPY
+#
+#   python backend/bulk_import.py students intake.csv
+#   python backend/bulk_import.py enrollments fall.parquet --username admin
+
+import argparse
+import asyncio
+import csv
+import io
+import time
+from psycopg import sql
+
+STAGE = "import_stage"
+
+# Per entity: accepted columns, required ones, the FROM clause validation runs over,
+# per-row checks as (condition, message) in priority order, and the upsert statements.
+# Rows whose values did not change are skipped rather than rewritten; the last
+# statement reports how many rows were inserted and updated.
+ENTITIES = {
+    'students': {
+        'columns': ['username', 'email', 'full_name', 'roll_number', 'department', 'year', 'cgpa', 'password_hash'],
+        'required': ['username', 'email', 'full_name', 'roll_number', 'department', 'year'],
+        'source': """
+            FROM import_stage s
+            LEFT JOIN system_users u ON u.username = trim(s.username)
+            LEFT JOIN system_users e ON e.email = trim(s.email)
+            LEFT JOIN students st ON st.user_id = u.user_id
+            LEFT JOIN students r ON r.roll_number = trim(s.roll_number)
+        """,
+        'checks': [
+            ("trim(s.year) !~ '^[0-9]{1,2}$'", "year must be a whole number"),
+            ("NULLIF(trim(s.cgpa), '') !~ '^[0-9](\\.[0-9]{1,2})?$'", "cgpa must be between 0 and 9.99"),
+            ("count(*) OVER (PARTITION BY trim(s.username)) > 1", "username appears more than once in the file"),
+            ("count(*) OVER (PARTITION BY trim(s.roll_number)) > 1", "roll_number appears more than once in the file"),
+            ("u.role IS NOT NULL AND u.role <> 'student'", "username belongs to a non-student account"),
+            ("e.username IS NOT NULL AND e.username <> trim(s.username)", "email is already used by another account"),
+            ("st.roll_number IS NOT NULL AND st.roll_number <> trim(s.roll_number)", "user already has a different roll_number"),
+            ("r.user_id IS NOT NULL AND r.user_id IS DISTINCT FROM u.user_id", "roll_number belongs to another user")
+        ],
+        'upsert': ["""
+            INSERT INTO system_users (username, password_hash, role, email, full_name)
+            SELECT trim(username), COALESCE(NULLIF(password_hash, ''), '!'), 'student', trim(email), trim(full_name)
+            FROM import_stage
+            ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email, full_name = EXCLUDED.full_name
+                WHERE (system_users.email, system_users.full_name) IS DISTINCT FROM (EXCLUDED.email, EXCLUDED.full_name)
+        """, """
+            WITH upserted AS (
+                INSERT INTO students (user_id, roll_number, department, year, cgpa)
+                SELECT u.user_id, trim(s.roll_number), trim(s.department), trim(s.year)::INTEGER, NULLIF(trim(s.cgpa), '')::NUMERIC
+                FROM import_stage s
+                JOIN system_users u ON u.username = trim(s.username)
+                ON CONFLICT (roll_number) DO UPDATE
+                    SET department = EXCLUDED.department, year = EXCLUDED.year, cgpa = EXCLUDED.cgpa
+                    WHERE (students.department, students.year, students.cgpa)
+                        IS DISTINCT FROM (EXCLUDED.department, EXCLUDED.year, EXCLUDED.cgpa)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM upserted
+        """]
+    },
+    'faculty': {
+        'columns': ['username', 'email', 'full_name', 'employee_id', 'department', 'designation', 'password_hash'],
+        'required': ['username', 'email', 'full_name', 'employee_id', 'department', 'designation'],
+        'source': """
+            FROM import_stage s
+            LEFT JOIN system_users u ON u.username = trim(s.username)
+            LEFT JOIN system_users e ON e.email = trim(s.email)
+            LEFT JOIN faculty f ON f.user_id = u.user_id
+            LEFT JOIN faculty r ON r.employee_id = trim(s.employee_id)
+        """,
+        'checks': [
+            ("count(*) OVER (PARTITION BY trim(s.username)) > 1", "username appears more than once in the file"),
+            ("count(*) OVER (PARTITION BY trim(s.employee_id)) > 1", "employee_id appears more than once in the file"),
+            ("u.role IS NOT NULL AND u.role <> 'faculty'", "username belongs to a non-faculty account"),
+            ("e.username IS NOT NULL AND e.username <> trim(s.username)", "email is already used by another account"),
+            ("f.employee_id IS NOT NULL AND f.employee_id <> trim(s.employee_id)", "user already has a different employee_id"),
+            ("r.user_id IS NOT NULL AND r.user_id IS DISTINCT FROM u.user_id", "employee_id belongs to another user")
+        ],
+        'upsert': ["""
+            INSERT INTO system_users (username, password_hash, role, email, full_name)
+            SELECT trim(username), COALESCE(NULLIF(password_hash, ''), '!'), 'faculty', trim(email), trim(full_name)
+            FROM import_stage
+            ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email, full_name = EXCLUDED.full_name
+                WHERE (system_users.email, system_users.full_name) IS DISTINCT FROM (EXCLUDED.email, EXCLUDED.full_name)
+        """, """
+            WITH upserted AS (
+                INSERT INTO faculty (user_id, employee_id, department, designation)
+                SELECT u.user_id, trim(s.employee_id), trim(s.department), trim(s.designation)
+                FROM import_stage s
+                JOIN system_users u ON u.username = trim(s.username)
+                ON CONFLICT (employee_id) DO UPDATE
+                    SET department = EXCLUDED.department, designation = EXCLUDED.designation
+                    WHERE (faculty.department, faculty.designation) IS DISTINCT FROM (EXCLUDED.department, EXCLUDED.designation)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM upserted
+        """]
+    },
+    'courses': {
+        'columns': ['course_code', 'course_name', 'credits', 'faculty_employee_id', 'department'],
+        'required': ['course_code', 'course_name', 'credits', 'department'],
+        'source': """
+            FROM import_stage s
+            LEFT JOIN faculty f ON f.employee_id = trim(s.faculty_employee_id)
+        """,
+        'checks': [
+            ("trim(s.credits) !~ '^[0-9]{1,2}$'", "credits must be a whole number"),
+            ("count(*) OVER (PARTITION BY trim(s.course_code)) > 1", "course_code appears more than once in the file"),
+            ("NULLIF(trim(s.faculty_employee_id), '') IS NOT NULL AND f.faculty_id IS NULL", "unknown faculty_employee_id")
+        ],
+        'upsert': ["""
+            WITH upserted AS (
+                INSERT INTO courses (course_code, course_name, credits, faculty_id, department)
+                SELECT trim(s.course_code), trim(s.course_name), trim(s.credits)::INTEGER, f.faculty_id, trim(s.department)
+                FROM import_stage s
+                LEFT JOIN faculty f ON f.employee_id = trim(s.faculty_employee_id)
+                ON CONFLICT (course_code) DO UPDATE
+                    SET course_name = EXCLUDED.course_name, credits = EXCLUDED.credits,
+                        faculty_id = EXCLUDED.faculty_id, department = EXCLUDED.department
+                    WHERE (courses.course_name, courses.credits, courses.faculty_id, courses.department)
+                        IS DISTINCT FROM (EXCLUDED.course_name, EXCLUDED.credits, EXCLUDED.faculty_id, EXCLUDED.department)
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM upserted
+        """]
+    },
+    'enrollments': {
+        'columns': ['roll_number', 'course_code', 'semester', 'grade'],
+        'required': ['roll_number', 'course_code', 'semester'],
+        'source': """
+            FROM import_stage s
+            LEFT JOIN students st ON st.roll_number = trim(s.roll_number)
+            LEFT JOIN courses c ON c.course_code = trim(s.course_code)
+        """,
+        'checks': [
+            ("length(trim(s.grade)) > 2", "grade must be at most 2 characters"),
+            ("st.student_id IS NULL", "unknown roll_number"),
+            ("c.course_id IS NULL", "unknown course_code"),
+            ("count(*) OVER (PARTITION BY trim(s.roll_number), trim(s.course_code), trim(s.semester)) > 1",
+             "enrollment appears more than once in the file")
+        ],
+        'upsert': ["""
+            WITH upserted AS (
+                INSERT INTO enrollments (student_id, course_id, semester, grade)
+                SELECT st.student_id, c.course_id, trim(s.semester), NULLIF(trim(s.grade), '')
+                FROM import_stage s
+                JOIN students st ON st.roll_number = trim(s.roll_number)
+                JOIN courses c ON c.course_code = trim(s.course_code)
+                ON CONFLICT (student_id, course_id, semester) DO UPDATE
+                    SET grade = EXCLUDED.grade
+                    WHERE EXCLUDED.grade IS NOT NULL AND EXCLUDED.grade IS DISTINCT FROM enrollments.grade
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) FILTER (WHERE NOT inserted) AS updated FROM upserted
+        """]
+    }
+}
+
+
+class BulkImportError(Exception):
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.message = message
+        self.errors = errors or []
+
+
+def validation_query(spec, max_errors):
+    # First failing check per row; missing required values are reported before anything else
+    checks = [(f"NULLIF(trim(s.{column}), '') IS NULL", f"{column} is required") for column in spec['required']]
+    checks += spec['checks']
+    case = ' '.join(f"WHEN {condition} THEN '{message}'" for condition, message in checks)
+    return f"""
+        SELECT row_no, error, count(*) OVER () AS total
+        FROM (SELECT s.row_no, CASE {case} END AS error {spec['source']}) checked
+        WHERE error IS NOT NULL
+        ORDER BY row_no
+        LIMIT {int(max_errors)}
+    """
+
+
+async def csv_chunks(path, chunk_size=1 << 20):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+async def parquet_chunks(data, batch_size=65536):
+    # Parquet needs random access to its footer, so it is read whole and re-encoded as CSV batches
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    source = pq.ParquetFile(io.BytesIO(data) if isinstance(data, bytes) else data)
+    yield (','.join(source.schema_arrow.names) + '\n').encode()
+    for batch in source.iter_batches(batch_size=batch_size):
+        out = io.BytesIO()
+        pacsv.write_csv(batch, out, pacsv.WriteOptions(include_header=False))
+        yield out.getvalue()
+
+
+class BulkImporter:
+    """COPYs a CSV stream into a temp staging table, validates it set-based and upserts it in one transaction."""
+
+    def __init__(self, db, audit=None, max_errors=50):
+        self.db = db
+        self.audit = audit
+        self.max_errors = max_errors
+        self.imports = 0
+        self.rows = 0
+        self.last = None
+
+    async def run(self, entity, chunks, username, progress=None):
+        """chunks: async iterator of CSV bytes with a header row. Returns a report dict."""
+        spec = ENTITIES.get(entity)
+        if spec is None:
+            raise BulkImportError(f"Unknown entity '{entity}', expected one of {', '.join(ENTITIES)}")
+        report = progress or (lambda stage, info: None)
+        start = time.perf_counter()
+        timings = {}
+
+        op_id = None
+        async with self.db.pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Upserted rows are captured as one revertible operation
+                await cur.execute("SELECT set_config('app.user', %s, true), set_config('app.op_description', %s, true)",
+                                  [username, f"Bulk import into {entity}"])
+                await cur.execute(sql.SQL("CREATE TEMP TABLE {} (row_no BIGSERIAL, {}) ON COMMIT DROP").format(
+                    sql.Identifier(STAGE),
+                    sql.SQL(', ').join(sql.SQL("{} TEXT").format(sql.Identifier(c)) for c in spec['columns'])
+                ))
+
+                chunks = aiter(chunks)
+                first = b''
+                while b'\n' not in first:
+                    chunk = await anext(chunks, None)
+                    if chunk is None:
+                        break
+                    first += chunk
+                if not first.strip():
+                    raise BulkImportError("The file is empty")
+                first_line, _, first = first.partition(b'\n')
+                header = self._header(spec, first_line)
+
+                copied = 0
+                async with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+                    sql.Identifier(STAGE), sql.SQL(', ').join(map(sql.Identifier, header))
+                )) as copy:
+                    chunk = first
+                    while chunk is not None:
+                        await copy.write(chunk)
+                        copied += len(chunk)
+                        report('copy', {"bytes": copied, "seconds": round(time.perf_counter() - start, 3)})
+                        chunk = await anext(chunks, None)
+                rows = cur.rowcount
+                timings['copy_ms'] = round((time.perf_counter() - start) * 1000, 1)
+                report('copied', {"rows": rows})
+
+                mark = time.perf_counter()
+                await cur.execute(f"ANALYZE {STAGE}")
+                await cur.execute(validation_query(spec, self.max_errors))
+                errors = await cur.fetchall()
+                timings['validate_ms'] = round((time.perf_counter() - mark) * 1000, 1)
+                if errors:
+                    await conn.rollback()
+                else:
+                    mark = time.perf_counter()
+                    for statement in spec['upsert']:
+                        await cur.execute(statement)
+                    counts = await cur.fetchone()
+                    await cur.execute("SELECT NULLIF(current_setting('app.op_id', true), '')::bigint AS op_id")
+                    op_id = (await cur.fetchone())['op_id']
+                    timings['upsert_ms'] = round((time.perf_counter() - mark) * 1000, 1)
+
+        if errors:
+            await self._audit(entity, rows, username, 'FAILED')
+            raise BulkImportError(
+                f"{errors[0]['total']} of {rows} rows failed validation; nothing was imported",
+                [{"row": e['row_no'], "error": e['error']} for e in errors]
+            )
+
+        seconds = time.perf_counter() - start
+        await self._audit(entity, rows, username, 'SUCCESS', op_id)
+        self.imports += 1
+        self.rows += rows
+        self.last = {
+            "entity": entity,
+            "rows": rows,
+            "inserted": counts['inserted'],
+            "updated": counts['updated'],
+            "unchanged": rows - counts['inserted'] - counts['updated'],
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds) if seconds else rows,
+            "op_id": op_id,
+            **timings
+        }
+        report('done', self.last)
+        return self.last
+
+    def _header(self, spec, line):
+        header = [c.strip().lower() for c in next(csv.reader([line.decode('utf-8-sig').strip('\r')]))]
+        unknown = [c for c in header if c not in spec['columns']]
+        missing = [c for c in spec['required'] if c not in header]
+        if unknown or missing:
+            raise BulkImportError(
+                "CSV header does not match: "
+                + '; '.join(filter(None, [unknown and f"unknown columns {', '.join(unknown)}",
+                                          missing and f"missing columns {', '.join(missing)}"]))
+            )
+        return header
+
+    async def _audit(self, entity, rows, username, status, op_id=None):
+        # One summarized record per batch instead of one per row
+        if self.audit is not None:
+            await self.audit.log(f"BULK_IMPORT {rows} ROWS", entity, username, status, op_id)
+
+    def stats(self):
+        return {"imports": self.imports, "rows": self.rows, "last": self.last}
+
+
+async def main():
+    from async_database import AsyncDatabase
+    from audit_writer import AuditWriter
+
+    arg_parser = argparse.ArgumentParser(description="Bulk import CSV or Parquet files")
+    arg_parser.add_argument('entity', choices=list(ENTITIES))
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--username', default='admin', help="recorded as executed_by in the audit log")
+    args = arg_parser.parse_args()
+
+    db = AsyncDatabase(1, 1)
+    await db.open()
+    try:
+        if args.path.endswith('.parquet'):
+            chunks = parquet_chunks(args.path)
+        else:
+            chunks = csv_chunks(args.path)
+
+        def progress(stage, info):
+            if stage == 'copy':
+                print(f"\r  copying: {info['bytes'] / 1e6:.1f} MB in {info['seconds']}s", end='', flush=True)
+            elif stage == 'copied':
+                print(f"\n  staged {info['rows']} rows, validating ...")
+
+        try:
+            result = await BulkImporter(db, AuditWriter(db, mode='sync')).run(args.entity, chunks, args.username, progress)
+        except BulkImportError as e:
+            print(f"\n{e.message}")
+            for error in e.errors:
+                print(f"  row {error['row']}: {error['error']}")
+            raise SystemExit(1)
+        print(f"  {result['inserted']} inserted, {result['updated']} updated, {result['unchanged']} unchanged in {result['seconds']}s "
+              f"({result['rows_per_second']} rows/s)")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
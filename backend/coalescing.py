@@ -0,0 +1,105 @@
+# Single-flight request coalescing and micro-batching for bursts of concurrent identical work
+
+import asyncio
+
+
+class SingleFlight:
+    """Concurrent callers with the same key share one execution of the work.
+
+    The work runs as its own task, so a caller that disconnects does not cancel it
+    for the others still waiting. Nothing is kept once it finishes; this dedupes
+    in-flight work only and is not a cache.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self.executions = 0
+        self.shared = 0
+
+    async def do(self, key, work):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executions += 1
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark the exception retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        total = self.executions + self.shared
+        return {
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "shared": self.shared,
+            "shared_rate": round(self.shared / total, 4) if total else 0.0
+        }
+
+
+class MicroBatcher:
+    """Collects items for up to `window` seconds (or `max_size` items) and runs them as one batch.
+
+    run_batch(items) returns one result per item, in order; an exception instance in
+    that list fails only its own item, as does a missing result.
+    """
+
+    def __init__(self, run_batch, window, max_size):
+        self.run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        # Items the batch returned no result for fail instead of waiting forever
+        results = list(results)
+        missing = RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items")
+        results += [missing] * (len(batch) - len(results))
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
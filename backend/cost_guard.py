@@ -0,0 +1,108 @@
+# EXPLAIN-based cost guard and per-role query budgets
+
+from collections import OrderedDict
+import json
+import os
+import time
+from dotenv import load_dotenv
+from sql_analyzer import normalize_sql
+
+load_dotenv()
+
+# Planner estimates a role may spend per statement, and the limits its statements run under
+DEFAULT_BUDGETS = {
+    'admin': {'max_cost': 10000000, 'max_rows': 5000000, 'statement_timeout': '60s', 'work_mem': '64MB'},
+    'faculty': {'max_cost': 1000000, 'max_rows': 500000, 'statement_timeout': '15s', 'work_mem': '16MB'},
+    'student': {'max_cost': 100000, 'max_rows': 100000, 'statement_timeout': '5s', 'work_mem': '4MB'}
+}
+
+
+def load_budgets():
+    # Overridable per role, e.g. QUERY_MAX_COST_STUDENT=50000 or QUERY_STATEMENT_TIMEOUT_FACULTY=10s
+    budgets = {}
+    for role, defaults in DEFAULT_BUDGETS.items():
+        budget = {}
+        for name, default in defaults.items():
+            value = os.getenv(f"QUERY_{name.upper()}_{role.upper()}")
+            if value is None:
+                budget[name] = default
+            elif isinstance(default, str):
+                budget[name] = value
+            else:
+                budget[name] = float(value)
+        budgets[role] = budget
+    return budgets
+
+
+class QueryTooExpensive(Exception):
+    def __init__(self, detail):
+        super().__init__(detail['message'])
+        self.detail = detail
+
+
+class CostGuard:
+    """Estimates statements with EXPLAIN before they run and refuses ones over the caller's budget."""
+
+    def __init__(self, db, max_size=None, ttl=None):
+        self.db = db
+        self.budgets = load_budgets()
+        self.max_size = int(max_size or os.getenv('COST_CACHE_SIZE', '1024'))
+        # Estimates drift as tables grow, so they are only trusted for a while
+        self.ttl = float(ttl or os.getenv('COST_CACHE_TTL', '300'))
+        self._estimates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def budget(self, role):
+        return self.budgets.get(role, self.budgets['student'])
+
+    def settings(self, role):
+        budget = self.budget(role)
+        return {'statement_timeout': budget['statement_timeout'], 'work_mem': budget['work_mem']}
+
+    async def estimate(self, query, params=None):
+        key = (normalize_sql(query), json.dumps(params, default=str))
+        entry = self._estimates.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._estimates.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        rows = await self.db.execute_query(f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}", params or None)
+        plan = rows[0]['QUERY PLAN'][0]['Plan']
+        # For UPDATE/DELETE the rows that matter are the ones fed into ModifyTable
+        scanned = plan['Plans'][0] if plan['Node Type'] == 'ModifyTable' and plan.get('Plans') else plan
+        estimate = {'cost': plan['Total Cost'], 'rows': scanned['Plan Rows']}
+
+        self._estimates[key] = (time.monotonic() + self.ttl, estimate)
+        self._estimates.move_to_end(key)
+        while len(self._estimates) > self.max_size:
+            self._estimates.popitem(last=False)
+        return estimate
+
+    async def check(self, query, params, role):
+        estimate = await self.estimate(query, params)
+        budget = self.budget(role)
+        if estimate['cost'] > budget['max_cost'] or estimate['rows'] > budget['max_rows']:
+            self.rejected += 1
+            raise QueryTooExpensive({
+                "error": "query_too_expensive",
+                "message": "This query is too expensive to run. Try adding filters or asking for fewer rows.",
+                "estimated_cost": estimate['cost'],
+                "estimated_rows": estimate['rows'],
+                "max_cost": budget['max_cost'],
+                "max_rows": budget['max_rows']
+            })
+        return estimate
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._estimates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "rejected": self.rejected
+        }
@@ -1,18 +1,39 @@
 import psycopg2
+from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
+from contextlib import contextmanager
+import threading
+import time
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 class Database:
-    def __init__(self):
-        self.conn = None
+    def __init__(self, minconn=None, maxconn=None):
+        self.minconn = int(minconn or os.getenv('DB_POOL_MIN', '2'))
+        self.maxconn = int(maxconn or os.getenv('DB_POOL_MAX', '20'))
+        self.checkout_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.ping_after = float(os.getenv('DB_POOL_PING_AFTER', '30'))
+        self.pool = None
+        # ThreadedConnectionPool raises instead of blocking when exhausted,
+        # so callers queue on this semaphore before taking a connection.
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._reconnects = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_used = {}
         self.connect()
-    
+
     def connect(self):
         try:
-            self.conn = psycopg2.connect(
+            self.pool = pool.ThreadedConnectionPool(
+                self.minconn,
+                self.maxconn,
                 host=os.getenv('DB_HOST', 'localhost'),
                 port=os.getenv('DB_PORT', '5432'),
                 database=os.getenv('DB_NAME', 'mydb'),
@@ -21,21 +42,106 @@ class Database:
             )
         except Exception as e:
             raise Exception(f"Database connection failed: {str(e)}")
-    
-    def execute_query(self, query, params=None, fetch=True):
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        # Only ping connections that sat idle long enough to have been dropped
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.ping_after:
+            return True
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(query, params)
-                if fetch:
-                    result = cur.fetchall()
-                    self.conn.commit()
-                    return result
-                self.conn.commit()
-                return None
-        except Exception as e:
-            self.conn.rollback()
-            raise e
-    
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        start = time.perf_counter()
+        with self._lock:
+            self._waiting += 1
+        acquired = self._slots.acquire(timeout=self.checkout_timeout)
+        with self._lock:
+            self._waiting -= 1
+        if not acquired:
+            raise Exception("Database pool exhausted: timed out waiting for a connection")
+
+        try:
+            conn = self.pool.getconn()
+            if not self._is_healthy(conn):
+                # Stale connection (server restart, idle timeout): drop it and open a fresh one
+                self._last_used.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                with self._lock:
+                    self._reconnects += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        return conn
+
+    def _checkin(self, conn, discard=False):
+        try:
+            discard = discard or bool(conn.closed)
+            if discard:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=discard)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self._checkin(conn, discard)
+
+    def execute_query(self, query, params=None, fetch=True):
+        with self.connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(query, params)
+                    if fetch:
+                        result = cur.fetchall()
+                        conn.commit()
+                        return result
+                    conn.commit()
+                    return None
+            except Exception as e:
+                if not conn.closed:
+                    conn.rollback()
+                raise e
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "reconnects": self._reconnects,
+                "avg_checkout_ms": round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_checkout_ms": round(self._max_wait * 1000, 3)
+            }
+
     def close(self):
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.closeall()
@@ -0,0 +1,101 @@
+# Columnar export of query results as Arrow IPC streams or Parquet
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Postgres type OID -> Arrow type; anything else is exported as text
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    25: pa.string(),
+    1042: pa.string(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1083: pa.time64('us'),
+    1114: pa.timestamp('us'),
+    1184: pa.timestamp('us', tz='UTC')
+}
+
+NUMERIC_OID = 1700
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def arrow_schema(columns):
+    fields = []
+    for column in columns:
+        if column.type_code == NUMERIC_OID:
+            # numeric(p, s) keeps its exact type; unconstrained numeric (AVG, SUM, ...) becomes float64
+            if column.precision is not None and column.scale is not None:
+                arrow_type = pa.decimal128(column.precision, column.scale)
+            else:
+                arrow_type = pa.float64()
+        else:
+            arrow_type = PG_ARROW_TYPES.get(column.type_code, pa.string())
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def record_batch(schema, rows):
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in rows]
+        if pa.types.is_floating(field.type):
+            values = [None if v is None else float(v) for v in values]
+        elif pa.types.is_string(field.type):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _Drain:
+    """Write-only file object whose buffered bytes are handed out after every batch."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def arrow_stream(batches, format='arrow'):
+    """batches: async iterator of (columns, rows) from AsyncDatabase.stream_tuples."""
+    drain = _Drain()
+    sink = pa.PythonFile(drain, mode='w')
+    writer = None
+    async for columns, rows in batches:
+        if writer is None:
+            schema = arrow_schema(columns)
+            writer = pq.ParquetWriter(sink, schema) if format == 'parquet' else pa.ipc.new_stream(sink, schema)
+        if rows:
+            writer.write_batch(record_batch(schema, rows))
+            yield drain.take()
+    if writer is not None:
+        writer.close()
+    yield drain.take()
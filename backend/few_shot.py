@@ -0,0 +1,209 @@
+# Retrieval of the few-shot examples and schema lines relevant to one question
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dotenv import load_dotenv
+from translation_cache import USER_PLACEHOLDER, normalize_text
+
+load_dotenv()
+
+TOKEN = re.compile(r'[a-z0-9+]+')
+STOP_WORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'by', 'with', 'and', 'or', 'is', 'are', 'all',
+    'me', 'show', 'list', 'get', 'give', 'what', 'which', 'who', 'how', 'many', 'much', 'please'
+}
+SECTION_HEADERS = ('TABLES:', 'VIEWS:', 'STORED PROCEDURES:')
+SCHEMA_LINE = re.compile(r'^(?:\d+\.|-)\s+(\w+)')
+
+
+def tokenize(text):
+    terms = []
+    for token in TOKEN.findall(text.lower().replace('_', ' ')):
+        if token in STOP_WORDS:
+            continue
+        # Crude plural folding so "students" matches "student_id"
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class TfidfIndex:
+    """Cosine similarity over TF-IDF vectors; small enough to rebuild on every change."""
+
+    def __init__(self):
+        self.texts = []
+        self._vectors = []
+        self._idf = {}
+
+    def rebuild(self, texts):
+        self.texts = list(texts)
+        docs = [Counter(tokenize(t)) for t in self.texts]
+        df = Counter(term for doc in docs for term in doc)
+        n = len(docs)
+        self._idf = {term: math.log((1 + n) / (1 + count)) + 1 for term, count in df.items()}
+        self._vectors = [self._vector(doc) for doc in docs]
+
+    def _vector(self, counts):
+        vector = {term: (1 + math.log(tf)) * self._idf.get(term, 0.0) for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    def search(self, text, k):
+        query = self._vector(Counter(tokenize(text)))
+        if not query:
+            return []
+        scored = []
+        for i, vector in enumerate(self._vectors):
+            score = sum(w * vector.get(term, 0.0) for term, w in query.items())
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(reverse=True)
+        return [(i, score) for score, i in scored[:k]]
+
+
+class EmbeddingIndex:
+    """Dense cosine similarity with a local CPU sentence-embedding model (NL_EMBED_MODEL)."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.texts = []
+        self._vectors = None
+
+    def rebuild(self, texts):
+        self.texts = list(texts)
+        self._vectors = self.model.encode(self.texts, normalize_embeddings=True) if self.texts else None
+
+    def search(self, text, k):
+        if self._vectors is None:
+            return []
+        scores = self._vectors @ self.model.encode([text], normalize_embeddings=True)[0]
+        top = scores.argsort()[::-1][:k]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def make_index():
+    model_name = os.getenv('NL_EMBED_MODEL', '')
+    if model_name:
+        try:
+            return EmbeddingIndex(model_name)
+        except Exception as e:
+            print(f"Embedding model {model_name} unavailable, using TF-IDF: ", e)
+    return TfidfIndex()
+
+
+def render_answer(parsed):
+    if parsed.get('procedure'):
+        return f"procedure: {parsed['procedure']}, params: {json.dumps(parsed.get('params') or [])}"
+    query = parsed.get('query') or ''
+    # Procedure calls rewritten to bound SELECTs carry their arguments separately; not a usable example
+    return '' if '%s' in query else query
+
+
+class ExampleLibrary:
+    """Verified NL -> SQL examples plus schema lines, searched per question to build a small prompt.
+
+    Seed examples come from the parser; confirmed queries that executed successfully are
+    added with learn() and, when NL_EXAMPLES_PATH is set, persisted to SQLite.
+    """
+
+    def __init__(self, seeds, max_examples=None, path=None):
+        self.max_examples = int(max_examples or os.getenv('NL_EXAMPLES_MAX', '2000'))
+        self.path = path if path is not None else os.getenv('NL_EXAMPLES_PATH', '')
+        self._lock = threading.Lock()
+        self._seeds = list(seeds)
+        self._learned = {}
+        self._disk = None
+        if self.path:
+            self._disk = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS examples (question TEXT PRIMARY KEY, answer TEXT NOT NULL, learned_at REAL NOT NULL)"
+            )
+            rows = self._disk.execute(
+                "SELECT question, answer FROM examples ORDER BY learned_at DESC LIMIT ?", (self.max_examples,)
+            ).fetchall()
+            self._learned = dict(reversed(rows))
+        self.examples = make_index()
+        self.schema = make_index()
+        self._schema_lines = []
+        self._rebuild_examples()
+        self.learned = 0
+
+    def _rebuild_examples(self):
+        seeded = {normalize_text(q) for q, _ in self._seeds}
+        self._examples = self._seeds + [(q, a) for q, a in self._learned.items() if q not in seeded]
+        self.examples.rebuild([q for q, _ in self._examples])
+
+    def set_schema(self, section):
+        # Each table/view/procedure line is one searchable document, tagged with its section
+        lines, header = [], None
+        for line in section.splitlines():
+            line = line.strip()
+            if line in SECTION_HEADERS:
+                header = line
+            elif header and SCHEMA_LINE.match(line):
+                lines.append((header, SCHEMA_LINE.match(line).group(1), line))
+        with self._lock:
+            self._schema_lines = lines
+            self.schema.rebuild([f"{name} {line}" for _, name, line in lines])
+
+    def learn(self, question, parsed, username):
+        """Adds a confirmed, successfully executed translation with the user's name generalized."""
+        answer = render_answer(parsed)
+        if not answer or parsed.get('operation') not in ('select', 'insert', 'update', 'delete'):
+            return
+        answer = answer.replace(f"'{username}'", f"'{USER_PLACEHOLDER}'").replace(f'"{username}"', f'"{USER_PLACEHOLDER}"')
+        question = normalize_text(question)
+        with self._lock:
+            if self._learned.get(question) == answer:
+                return
+            self._learned.pop(question, None)
+            self._learned[question] = answer
+            while len(self._learned) > self.max_examples:
+                self._learned.pop(next(iter(self._learned)))
+            self._rebuild_examples()
+            self.learned += 1
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO examples (question, answer, learned_at) VALUES (?, ?, ?)",
+                    (question, answer, time.time())
+                )
+
+    def select(self, question, k_examples, k_schema):
+        """Returns (schema section, example lines), or (None, examples) when no schema line matched."""
+        with self._lock:
+            examples = [self._examples[i] for i, _ in self.examples.search(question, k_examples)]
+            names = {name for _, name, _ in self._schema_lines}
+            # Objects the chosen examples use, plus the closest schema lines to the question itself
+            wanted = {word for _, answer in examples for word in re.findall(r'\w+', answer)} & names
+            wanted |= {self._schema_lines[i][1] for i, _ in self.schema.search(question, k_schema)}
+            if not wanted:
+                return None, examples
+            sections = {}
+            for header, name, line in self._schema_lines:
+                if name in wanted:
+                    sections.setdefault(header, []).append(SCHEMA_LINE.sub(lambda m: f"- {m.group(1)}", line, count=1))
+        return '\n\n'.join(f"{header}\n" + '\n'.join(lines) for header, lines in sections.items()), examples
+
+    def stats(self):
+        with self._lock:
+            return {
+                "examples": len(self._examples),
+                "seed_examples": len(self._seeds),
+                "learned_examples": len(self._examples) - len(self._seeds),
+                "learned_this_run": self.learned,
+                "schema_lines": len(self._schema_lines),
+                "index": type(self.examples).__name__
+            }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
@@ -4,7 +4,19 @@ from google import genai
 from google.genai import types
 from pydantic import BaseModel, Field
 from typing import Optional, List, Literal
+from translation_cache import TranslationCache, USER_PLACEHOLDER, bind_user
+from few_shot import ExampleLibrary
+from intent_matcher import IntentMatcher
+from llm_client import ResilientLLM
+from coalescing import SingleFlight, MicroBatcher
+from metrics import LLM_SECONDS, LLM_TOKENS, stage
+from collections import deque
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,19 +31,15 @@ class SQLQuery(BaseModel):
     explanation: str = Field(description="Query explanation")
 
 
-class GeminiParser:
-    
-    def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        self.client = genai.Client(api_key=self.api_key)
-        self.model = 'gemini-2.0-flash-lite'
-        
-        self.system_instruction = """You are a SQL query generator for PostgreSQL university database.
+SYSTEM_HEADER = """You are a SQL query generator for PostgreSQL university database."""
+
+BATCH_HEADER = """Translate each numbered request below on its own. Return a JSON array with exactly one
+object per request, in the same order.
 
-TABLES:
+"""
+
+# Fallback used until the schema catalog has introspected the live database
+DEFAULT_SCHEMA_SECTION = """TABLES:
 1. system_users (user_id, username, email, full_name, role, is_active, created_at)
 2. students (student_id, user_id, roll_number, department, year, cgpa)
 3. faculty (faculty_id, user_id, employee_id, department, designation)
@@ -40,6 +48,9 @@ TABLES:
 
 VIEWS:
 - active_users (user_id, username, email, full_name, role, is_active, created_at)
+- course_enrollment_stats (course_id, course_code, course_name, department, faculty_id, semester, enrollment_count, graded_count)
+- grade_distribution (course_id, course_code, semester, grade, student_count)
+- department_cgpa_stats (department, student_count, rated_count, avg_cgpa, min_cgpa, max_cgpa, median_cgpa)
 
 STORED PROCEDURES:
 1. add_student(p_username, p_password_hash, p_email, p_full_name, p_roll_number, p_department, p_year, p_cgpa) - Admin only
@@ -49,9 +60,9 @@ STORED PROCEDURES:
 5. update_grade(p_enrollment_id, p_grade, p_username) - Faculty only, requires enrollment_id NOT student_id
 6. get_student_courses(p_student_id) - Returns student's enrolled courses with grades
 7. get_faculty_courses(p_faculty_id) - Returns courses taught by faculty
-8. get_course_enrollments(p_course_id) - Returns students enrolled in a course
+8. get_course_enrollments(p_course_id) - Returns students enrolled in a course"""
 
-IMPORTANT RULES:
+SYSTEM_RULES = """IMPORTANT RULES:
 1. For SELECT queries: Generate full SQL query using proper JOIN syntax
 2. For INSERT/UPDATE operations with available procedures: Set procedure name and params
 3. For UPDATE operations without procedures: Generate full UPDATE SQL query
@@ -65,52 +76,259 @@ IMPORTANT RULES:
 11. Only admin can access audit_log and system_users table directly
 12. Students and faculty can only view their own data
 13. Use stored procedures for insert/update operations when available
-14. For profile updates (name, email): Generate UPDATE system_users SET ... WHERE username = 'username'
+14. For profile updates (name, email): Generate UPDATE system_users SET ... WHERE username = '__user__'
 15. IMPORTANT: Grades are LETTER GRADES (A+, A, B+, B, etc.) NOT numeric values. Do not convert numbers to letters.
 16. IMPORTANT: CGPA is stored in students table (numeric), grade is in enrollments table (letter)
 17. If user provides numeric value for grade, return error explaining grades must be letter grades
-
-EXAMPLES:
-- "show all students" -> SELECT s.student_id, su.full_name, s.roll_number, s.department, s.year, s.cgpa FROM students s JOIN system_users su ON s.user_id = su.user_id WHERE su.is_active = TRUE
-- "show my students" (for faculty) -> SELECT DISTINCT s.student_id, su.full_name, s.roll_number, s.department, s.year, s.cgpa FROM students s JOIN system_users su ON s.user_id = su.user_id JOIN enrollments e ON s.student_id = e.student_id JOIN courses c ON e.course_id = c.course_id WHERE c.faculty_id = (SELECT faculty_id FROM faculty WHERE user_id = (SELECT user_id FROM system_users WHERE username = 'username'))
-- "show my courses" (for student) -> SELECT * FROM get_student_courses((SELECT student_id FROM students WHERE user_id = (SELECT user_id FROM system_users WHERE username = 'username')))
-- "show all faculty" -> SELECT f.faculty_id, su.full_name, f.employee_id, f.department, f.designation FROM faculty f JOIN system_users su ON f.user_id = su.user_id WHERE su.is_active = TRUE
-- "show enrollments for course 1" -> SELECT DISTINCT e.enrollment_id, e.student_id, su.full_name, e.grade, e.semester FROM enrollments e JOIN students s ON e.student_id = s.student_id JOIN system_users su ON s.user_id = su.user_id WHERE e.course_id = 1
-- "enroll student 1 in course 2" -> procedure: enroll_student, params: [1, 2, 'Fall 2024', 'faculty1']
-- "update grade of enrollment 5 to A+" -> procedure: update_grade, params: [5, 'A+', 'faculty1']
-- "update cgpa of student 1 to 8.5" -> UPDATE students SET cgpa = 8.5 WHERE student_id = 1
-- "update grade to 9.2" -> ERROR: Grades must be letter grades (A+, A, B+, etc.), not numeric values. Use "update cgpa" for numeric grades.
-- "update my name to Arsh" -> UPDATE system_users SET full_name = 'Arsh' WHERE username = 'username'
+18. For aggregate questions (counts, averages, distributions per course, semester or department), read the precomputed views course_enrollment_stats, grade_distribution and department_cgpa_stats instead of aggregating base tables
 """
 
-    def parse(self, text: str, username: str = 'system', role: str = 'user') -> dict:
-        try:
-            enhanced_prompt = f"""User: {username} (Role: {role})
+# Verified NL -> SQL pairs; the few-shot library retrieves the closest ones per question
+EXAMPLES = [
+    ("show all students",
+     "SELECT s.student_id, su.full_name, s.roll_number, s.department, s.year, s.cgpa FROM students s JOIN system_users su ON s.user_id = su.user_id WHERE su.is_active = TRUE"),
+    ("show my students (for faculty)",
+     "SELECT DISTINCT s.student_id, su.full_name, s.roll_number, s.department, s.year, s.cgpa FROM students s JOIN system_users su ON s.user_id = su.user_id JOIN enrollments e ON s.student_id = e.student_id JOIN courses c ON e.course_id = c.course_id WHERE c.faculty_id = (SELECT faculty_id FROM faculty WHERE user_id = (SELECT user_id FROM system_users WHERE username = '__user__'))"),
+    ("show my courses (for student)",
+     "SELECT * FROM get_student_courses((SELECT student_id FROM students WHERE user_id = (SELECT user_id FROM system_users WHERE username = '__user__')))"),
+    ("show all faculty",
+     "SELECT f.faculty_id, su.full_name, f.employee_id, f.department, f.designation FROM faculty f JOIN system_users su ON f.user_id = su.user_id WHERE su.is_active = TRUE"),
+    ("show enrollments for course 1",
+     "SELECT DISTINCT e.enrollment_id, e.student_id, su.full_name, e.grade, e.semester FROM enrollments e JOIN students s ON e.student_id = s.student_id JOIN system_users su ON s.user_id = su.user_id WHERE e.course_id = 1"),
+    ("enroll student 1 in course 2",
+     "procedure: enroll_student, params: [1, 2, 'Fall 2024', '__user__']"),
+    ("update grade of enrollment 5 to A+",
+     "procedure: update_grade, params: [5, 'A+', '__user__']"),
+    ("update cgpa of student 1 to 8.5",
+     "UPDATE students SET cgpa = 8.5 WHERE student_id = 1"),
+    ("update grade to 9.2",
+     'ERROR: Grades must be letter grades (A+, A, B+, etc.), not numeric values. Use "update cgpa" for numeric grades.'),
+    ("update my name to Arsh",
+     "UPDATE system_users SET full_name = 'Arsh' WHERE username = '__user__'"),
+    ("average cgpa by department",
+     "SELECT department, avg_cgpa, student_count FROM department_cgpa_stats ORDER BY department"),
+    ("enrollment count per course per semester",
+     "SELECT course_code, course_name, semester, enrollment_count FROM course_enrollment_stats ORDER BY course_code, semester"),
+    ("grade distribution for CS101",
+     "SELECT semester, grade, student_count FROM grade_distribution WHERE course_code = 'CS101' ORDER BY semester, grade")
+]
+
+
+
+def render_examples(examples):
+    return '\n'.join(f'- "{question}" -> {answer}' for question, answer in examples)
+
+
+PROCEDURE_NOTES = {
+    'add_student': 'Admin only',
+    'add_faculty': 'Admin only',
+    'add_course': 'Admin only',
+    'enroll_student': 'Admin/Faculty',
+    'update_grade': 'Faculty only, requires enrollment_id NOT student_id',
+    'get_student_courses': "Returns student's enrolled courses with grades",
+    'get_faculty_courses': 'Returns courses taught by faculty',
+    'get_course_enrollments': 'Returns students enrolled in a course'
+}
+
+
+class GeminiParser:
+    
+    def __init__(self):
+        self.api_key = os.getenv('GEMINI_API_KEY') or os.getenv('GOOGLE_API_KEY')
+        if not self.api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        
+        # GEMINI_BASE_URL points the client at a proxy or a local fake server for load tests
+        base_url = os.getenv('GEMINI_BASE_URL')
+        self.client = genai.Client(api_key=self.api_key,
+                                   http_options=types.HttpOptions(base_url=base_url) if base_url else None)
+        self.llm = ResilientLLM()
+        self.model = 'gemini-2.0-flash-lite'
+        
+        self.schema_section = DEFAULT_SCHEMA_SECTION
+        # Send only the examples and schema lines closest to each question instead of the whole prompt
+        self.few_shot = os.getenv('NL_FEW_SHOT', 'on').lower() not in ('0', 'off', 'false')
+        self.k_examples = int(os.getenv('NL_FEW_SHOT_EXAMPLES', '4'))
+        self.k_schema = int(os.getenv('NL_FEW_SHOT_TABLES', '4'))
+        self.library = ExampleLibrary(EXAMPLES)
+        # Common requests are answered from templates before the cache or the LLM is consulted
+        self.intents = IntentMatcher() if os.getenv('NL_FAST_PATH', 'on').lower() not in ('0', 'off', 'false') else None
+        self._build_instruction()
+        self.cache = TranslationCache()
+        self._stats_lock = threading.Lock()
+        self.llm_calls = 0
+        self.prompt_chars = 0
+        self.prompt_tokens = 0
+        self._latencies = deque(maxlen=1000)
+        # Identical in-flight requests share one LLM call; with NL_BATCH_WINDOW_MS set, distinct
+        # requests arriving within the window are translated together in one call
+        self.flights = SingleFlight()
+        window = float(os.getenv('NL_BATCH_WINDOW_MS', '0')) / 1000
+        self.batcher = MicroBatcher(self._run_batch, window, int(os.getenv('NL_BATCH_MAX', '8'))) if window > 0 else None
+
+    def _build_instruction(self):
+        self.system_instruction = (f"{SYSTEM_HEADER}\n\n{self.schema_section}\n\n{SYSTEM_RULES}\n"
+                                   f"EXAMPLES:\n{render_examples(EXAMPLES)}")
+        self.prompt_version = hashlib.sha256(f"{self.model}\n{self.system_instruction}".encode()).hexdigest()[:16]
+        self.library.set_schema(self.schema_section)
+
+    def set_schema_section(self, section: str):
+        if section and section != self.schema_section:
+            self.schema_section = section
+            self._build_instruction()
+
+    def instruction_for(self, text: str) -> str:
+        if not self.few_shot:
+            return self.system_instruction
+        schema, examples = self.library.select(text, self.k_examples, self.k_schema)
+        # Nothing matched: fall back to the full schema rather than guess
+        return (f"{SYSTEM_HEADER}\n\n{schema or self.schema_section}\n\n{SYSTEM_RULES}\n"
+                f"EXAMPLES:\n{render_examples(examples or EXAMPLES)}")
+
+    def learn(self, text: str, parsed: dict, username: str):
+        """Adds a confirmed translation that executed successfully to the few-shot library."""
+        self.library.learn(text, parsed, username)
+
+    def _prompt(self, text: str, username: str, role: str) -> str:
+        return f"""User: {username} (Role: {role})
 Query: {text}
 
 Convert to SQL operation with username and role in parameters."""
-            
-            response = self.client.models.generate_content(
+
+    def _config(self, instruction: str, timeout: Optional[float] = None, schema=SQLQuery,
+                max_tokens: int = 500) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            system_instruction=instruction,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None,
+            response_mime_type='application/json',
+            response_schema=schema,
+            temperature=0.1,
+            max_output_tokens=max_tokens,
+        )
+
+    def _record(self, instruction, response, started, kind='single'):
+        usage = getattr(response, 'usage_metadata', None)
+        LLM_SECONDS.observe(time.perf_counter() - started, kind)
+        LLM_TOKENS.inc(getattr(usage, 'prompt_token_count', None) or 0, 'prompt')
+        LLM_TOKENS.inc(getattr(usage, 'candidates_token_count', None) or 0, 'output')
+        with self._stats_lock:
+            self.llm_calls += 1
+            self.prompt_chars += len(instruction)
+            self.prompt_tokens += getattr(usage, 'prompt_token_count', None) or 0
+            self._latencies.append((time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def _result(text):
+        # None when the model answered with something that is not a usable plan
+        try:
+            result = json.loads(text) if text else None
+        except ValueError:
+            return None
+        return result if isinstance(result, dict) else None
+
+    def parse(self, text: str, username: str = 'system', role: str = 'user') -> Optional[dict]:
+        """Raises LLMUnavailable when the model cannot be reached within the deadline."""
+        if self.intents is not None:
+            matched = self.intents.match(text, username, role)
+            if matched is not None:
+                return matched
+        key = self.cache.make_key(text, USER_PLACEHOLDER, role, self.prompt_version)
+        result = self.cache.get(key)
+        if result is None:
+            instruction = self.instruction_for(text)
+            started = time.perf_counter()
+            with stage('llm'):
+                response = self.llm.call_sync(lambda timeout: self.client.models.generate_content(
+                    model=self.model,
+                    contents=self._prompt(text, USER_PLACEHOLDER, role),
+                    config=self._config(instruction, timeout)
+                ))
+            self._record(instruction, response, started)
+            result = self._result(response.text)
+            if result is not None:
+                self.cache.set(key, result)
+        return bind_user(result, username)
+
+    async def parse_async(self, text: str, username: str = 'system', role: str = 'user') -> Optional[dict]:
+        """Raises LLMUnavailable when the model cannot be reached within the deadline."""
+        if self.intents is not None:
+            matched = self.intents.match(text, username, role)
+            if matched is not None:
+                return matched
+        # Translations are made and cached for the role, with the username filled in afterwards
+        key = self.cache.make_key(text, USER_PLACEHOLDER, role, self.prompt_version)
+        result = await self.cache.get_async(key)
+        if result is None:
+            result = await self.flights.do(key, lambda: self._translate(key, text, role))
+        return bind_user(result, username)
+
+    async def _translate(self, key, text, role):
+        if self.batcher is not None:
+            result = await self.batcher.submit((text, role))
+        else:
+            result = await self._translate_one(text, role)
+        if result is not None:
+            await self.cache.set_async(key, result)
+        return result
+
+    async def _translate_one(self, text, role):
+        instruction = self.instruction_for(text)
+        started = time.perf_counter()
+        with stage('llm'):
+            response = await self.llm.call(lambda: self.client.aio.models.generate_content(
                 model=self.model,
-                contents=enhanced_prompt,
-                config=types.GenerateContentConfig(
-                    system_instruction=self.system_instruction,
-                    response_mime_type='application/json',
-                    response_schema=SQLQuery,
-                    temperature=0.1,
-                    max_output_tokens=500,
-                )
-            )
-            
-            if response.text:
-                import json
-                result = json.loads(response.text)
-                return result
-        except Exception as e:
-            print("Exception: ", e)
-            return "Error while parsing the response."
-    
+                contents=self._prompt(text, USER_PLACEHOLDER, role),
+                config=self._config(instruction)
+            ))
+        self._record(instruction, response, started)
+        return self._result(response.text)
+
+    async def _run_batch(self, items):
+        if len(items) == 1:
+            return [await self._translate_one(*items[0])]
+        # One full prompt is cheaper per request than a retrieved prompt for each of them
+        instruction = self.system_instruction
+        contents = BATCH_HEADER + '\n\n'.join(
+            f"{i}. {self._prompt(text, USER_PLACEHOLDER, role)}" for i, (text, role) in enumerate(items, 1))
+        started = time.perf_counter()
+        with stage('llm'):
+            response = await self.llm.call(lambda: self.client.aio.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=self._config(instruction, schema=list[SQLQuery], max_tokens=500 * len(items))
+            ))
+        self._record(instruction, response, started, kind='batch')
+        try:
+            results = json.loads(response.text) if response.text else None
+        except ValueError:
+            results = None
+        if not isinstance(results, list) or len(results) != len(items):
+            # Misaligned answer: translate each request on its own
+            return await asyncio.gather(*(self._translate_one(text, role) for text, role in items),
+                                        return_exceptions=True)
+        return [r if isinstance(r, dict) else None for r in results]
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            calls = self.llm_calls
+            return {
+                "fast_path": self.intents.stats() if self.intents is not None else None,
+                "few_shot": self.few_shot,
+                "llm_calls": calls,
+                "full_prompt_chars": len(self.system_instruction),
+                "avg_prompt_chars": round(self.prompt_chars / calls) if calls else 0,
+                "avg_prompt_tokens": round(self.prompt_tokens / calls) if calls else 0,
+                "p50_parse_ms": round(latencies[len(latencies) // 2], 1) if latencies else 0.0,
+                "library": self.library.stats(),
+                "llm": self.llm.stats(),
+                "coalescing": self.flights.stats(),
+                "batching": self.batcher.stats() if self.batcher is not None else None
+            }
+
     def close(self):
         """Close the Gemini client connection"""
+        self.cache.close()
+        self.library.close()
         if hasattr(self.client, 'close'):
             self.client.close()
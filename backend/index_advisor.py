@@ -0,0 +1,87 @@
+# Missing-index advisor built on pg_stat_user_tables, pg_stat_statements and observed /query shapes
+
+from collections import Counter
+import os
+from dotenv import load_dotenv
+from sql_analyzer import analyze
+
+load_dotenv()
+
+TABLE_STATS_QUERY = """
+    SELECT relname AS table_name, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan, n_live_tup
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'public'
+    ORDER BY seq_tup_read DESC
+"""
+
+# Leading column of every index; a filter on it can already use an index
+INDEXED_COLUMNS_QUERY = """
+    SELECT t.relname AS table_name, a.attname AS column_name
+    FROM pg_index i
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = i.indkey[0]
+    WHERE n.nspname = 'public'
+"""
+
+STATEMENTS_QUERY = """
+    SELECT query, calls, total_exec_time, mean_exec_time, rows
+    FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+    ORDER BY total_exec_time DESC
+    LIMIT %s
+"""
+
+
+class IndexAdvisor:
+    """Suggests single-column indexes for filter columns that no index leads with."""
+
+    def __init__(self, db, min_rows=None):
+        self.db = db
+        self.min_rows = int(min_rows or os.getenv('ADVISOR_MIN_ROWS', '1000'))
+        # (table, column) -> times it appeared in a WHERE/JOIN of an executed /query statement
+        self.observed = Counter()
+
+    def observe(self, query):
+        self.observed.update(analyze(query).filters)
+
+    async def _statements(self, limit):
+        # pg_stat_statements is optional: it needs shared_preload_libraries and CREATE EXTENSION
+        try:
+            return await self.db.execute_query(STATEMENTS_QUERY, [limit])
+        except Exception:
+            return None
+
+    async def report(self, min_rows=None, limit=20):
+        min_rows = self.min_rows if min_rows is None else min_rows
+        tables = await self.db.execute_query(TABLE_STATS_QUERY)
+        indexed = {(r['table_name'], r['column_name']) for r in await self.db.execute_query(INDEXED_COLUMNS_QUERY)}
+        statements = await self._statements(limit)
+
+        uses = Counter(self.observed)
+        for statement in statements or []:
+            uses.update({column: statement['calls'] for column in analyze(statement['query']).filters})
+
+        by_table = {t['table_name']: t for t in tables}
+        for t in tables:
+            t['seq_scan_heavy'] = t['n_live_tup'] >= min_rows and t['seq_scan'] > t['idx_scan']
+
+        suggestions = []
+        for (table, column), count in uses.most_common():
+            stats = by_table.get(table)
+            if stats is None or (table, column) in indexed or stats['n_live_tup'] < min_rows:
+                continue
+            suggestions.append({
+                "table": table,
+                "column": column,
+                "uses": count,
+                "table_rows": stats['n_live_tup'],
+                "seq_scans": stats['seq_scan'],
+                "sql": f"CREATE INDEX CONCURRENTLY idx_{table}_{column} ON {table} ({column});"
+            })
+
+        return {
+            "tables": [t for t in tables if t['seq_scan_heavy']],
+            "statements": statements,
+            "suggestions": suggestions
+        }
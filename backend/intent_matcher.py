@@ -0,0 +1,194 @@
+# Deterministic fast path for common requests: regex templates with slot filling, no LLM call
+
+from collections import Counter
+import datetime
+import re
+import threading
+from sql_analyzer import PROCEDURE_ROLES
+
+STUDENT_COLUMNS = "s.student_id, su.full_name, s.roll_number, s.department, s.year, s.cgpa"
+MY_STUDENT_ID = "(SELECT student_id FROM students WHERE user_id = (SELECT user_id FROM system_users WHERE username = %s))"
+MY_FACULTY_ID = "(SELECT faculty_id FROM faculty WHERE user_id = (SELECT user_id FROM system_users WHERE username = %s))"
+# Roles that may see every student's records and the analytics views
+STAFF_ROLES = {'admin', 'faculty'}
+GRADE = r'(?P<grade>[a-df][+-]?|o)'
+SEMESTER = r'(?P<semester>(?:spring|summer|fall|winter) \d{4})'
+
+
+def current_semester(today=None):
+    today = today or datetime.date.today()
+    return f"{'Spring' if today.month <= 6 else 'Fall'} {today.year}"
+
+
+def _select(table, query, explanation, params=None):
+    return {"operation": "select", "table": table, "query": query, "procedure": None,
+            "params": params or [], "explanation": explanation}
+
+
+def _all_students(m, username, role):
+    if role not in STAFF_ROLES:
+        return None
+    return _select('students',
+                   f"SELECT {STUDENT_COLUMNS} FROM students s JOIN system_users su ON s.user_id = su.user_id "
+                   "WHERE su.is_active = TRUE",
+                   "List all active students")
+
+
+def _all_faculty(m, username, role):
+    return _select('faculty',
+                   "SELECT f.faculty_id, su.full_name, f.employee_id, f.department, f.designation FROM faculty f "
+                   "JOIN system_users su ON f.user_id = su.user_id WHERE su.is_active = TRUE",
+                   "List all active faculty")
+
+
+def _my_courses(m, username, role):
+    if role == 'student':
+        return _select('enrollments', f"SELECT * FROM get_student_courses({MY_STUDENT_ID})",
+                       "List the courses you are enrolled in", [username])
+    if role == 'faculty':
+        return _select('courses', f"SELECT * FROM get_faculty_courses({MY_FACULTY_ID})",
+                       "List the courses you teach", [username])
+    return None
+
+
+def _my_students(m, username, role):
+    if role != 'faculty':
+        return None
+    return _select('students',
+                   f"SELECT DISTINCT {STUDENT_COLUMNS} FROM students s JOIN system_users su ON s.user_id = su.user_id "
+                   "JOIN enrollments e ON s.student_id = e.student_id JOIN courses c ON e.course_id = c.course_id "
+                   f"WHERE c.faculty_id = {MY_FACULTY_ID}",
+                   "List students enrolled in your courses", [username])
+
+
+def _course_enrollments(m, username, role):
+    # Same data as get_course_enrollments, classmates' grades included
+    if role not in PROCEDURE_ROLES['get_course_enrollments']:
+        return None
+    return _select('enrollments',
+                   "SELECT DISTINCT e.enrollment_id, e.student_id, su.full_name, e.grade, e.semester FROM enrollments e "
+                   "JOIN students s ON e.student_id = s.student_id JOIN system_users su ON s.user_id = su.user_id "
+                   f"WHERE e.course_id = {int(m['course'])}",
+                   f"List enrollments for course {int(m['course'])}")
+
+
+def _department_cgpa(m, username, role):
+    if role not in STAFF_ROLES:
+        return None
+    return _select('department_cgpa_stats',
+                   "SELECT department, avg_cgpa, student_count FROM department_cgpa_stats ORDER BY department",
+                   "Average CGPA per department")
+
+
+def _course_counts(m, username, role):
+    if role not in STAFF_ROLES:
+        return None
+    return _select('course_enrollment_stats',
+                   "SELECT course_code, course_name, semester, enrollment_count FROM course_enrollment_stats "
+                   "ORDER BY course_code, semester",
+                   "Enrollment count per course and semester")
+
+
+def _grade_distribution(m, username, role):
+    if role not in STAFF_ROLES:
+        return None
+    code = m['code'].upper()
+    return _select('grade_distribution',
+                   "SELECT semester, grade, student_count FROM grade_distribution WHERE course_code = %s "
+                   "ORDER BY semester, grade",
+                   f"Grade distribution for {code}", [code])
+
+
+def _enroll(m, username, role):
+    if role not in PROCEDURE_ROLES['enroll_student']:
+        return None
+    semester = m['semester'].title() if m['semester'] else current_semester()
+    return {"operation": "insert", "table": "enrollments", "query": None, "procedure": "enroll_student",
+            "params": [int(m['student']), int(m['course']), semester, username],
+            "explanation": f"Enroll student {int(m['student'])} in course {int(m['course'])} for {semester}"}
+
+
+def _update_grade(m, username, role):
+    if role not in PROCEDURE_ROLES['update_grade']:
+        return None
+    grade = m['grade'].upper()
+    return {"operation": "update", "table": "enrollments", "query": None, "procedure": "update_grade",
+            "params": [int(m['enrollment']), grade, username],
+            "explanation": f"Set the grade of enrollment {int(m['enrollment'])} to {grade}"}
+
+
+def _update_cgpa(m, username, role):
+    if role not in STAFF_ROLES:
+        return None
+    cgpa = float(m['cgpa'])
+    return {"operation": "update", "table": "students", "query": "UPDATE students SET cgpa = %s WHERE student_id = %s",
+            "procedure": None, "params": [cgpa, int(m['student'])],
+            "explanation": f"Set the CGPA of student {int(m['student'])} to {cgpa}"}
+
+
+def _update_profile(m, username, role):
+    column = 'full_name' if m['field'].lower() == 'name' else 'email'
+    return {"operation": "update", "table": "system_users",
+            "query": f"UPDATE system_users SET {column} = %s WHERE username = %s",
+            "procedure": None, "params": [m['value'], username],
+            "explanation": f"Update your {m['field'].lower()} to {m['value']}"}
+
+
+# (intent, pattern, builder); patterns are matched against the whole request, case-insensitively
+INTENTS = [
+    ('all_students', r'(?:show|list|get) (?:me )?all (?:the )?students', _all_students),
+    ('all_faculty', r'(?:show|list|get) (?:me )?all (?:the )?(?:faculty|faculties|professors|teachers)', _all_faculty),
+    ('my_courses', r'(?:show|list|get) (?:me )?my courses', _my_courses),
+    ('my_students', r'(?:show|list|get) (?:me )?my students', _my_students),
+    ('course_enrollments', r'(?:show|list|get) (?:me )?(?:all )?enrollments (?:for|of|in) course (?:id )?(?P<course>\d+)',
+     _course_enrollments),
+    ('department_cgpa', r'(?:show )?(?:the )?(?:average|avg|mean) cgpa (?:by|per|for each|of each) department',
+     _department_cgpa),
+    ('course_counts', r'(?:show )?(?:the )?(?:enrollment count|number of enrollments|enrollments) per course(?: per semester)?',
+     _course_counts),
+    ('grade_distribution', r'(?:show )?(?:the )?grade distribution (?:for|of|in) (?:course )?(?P<code>[a-z]{2,4}\d{3})',
+     _grade_distribution),
+    ('enroll_student', rf'enroll student (?:id )?(?P<student>\d+) (?:in|into|to) course (?:id )?(?P<course>\d+)'
+                       rf'(?: (?:in|for) {SEMESTER})?', _enroll),
+    ('update_grade', rf'(?:update|set|change) (?:the )?grade (?:of|for) enrollment (?:id )?(?P<enrollment>\d+) to {GRADE}',
+     _update_grade),
+    ('update_cgpa', r'(?:update|set|change) (?:the )?cgpa (?:of|for) student (?:id )?(?P<student>\d+) to (?P<cgpa>\d(?:\.\d{1,2})?)',
+     _update_cgpa),
+    ('update_profile', r'(?:update|set|change) my (?P<field>name|email) to (?P<value>\S(?:.*\S)?)', _update_profile)
+]
+
+
+class IntentMatcher:
+    """Answers requests that match a known template; anything else returns None and goes to the LLM."""
+
+    def __init__(self, intents=None):
+        self.intents = [(name, re.compile(pattern, re.IGNORECASE), build) for name, pattern, build in intents or INTENTS]
+        self._lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = 0
+
+    def match(self, text, username, role):
+        text = re.sub(r'\s+', ' ', text.strip()).rstrip(' .?!;')
+        for name, pattern, build in self.intents:
+            m = pattern.fullmatch(text)
+            if m is None:
+                continue
+            parsed = build(m, username, role)
+            if parsed is not None:
+                with self._lock:
+                    self.hits[name] += 1
+                return parsed
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "hits": hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "by_intent": dict(self.hits)
+            }
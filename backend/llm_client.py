@@ -0,0 +1,292 @@
+# Deadlines, retries, hedging, a circuit breaker and a concurrency cap around LLM calls
+
+from collections import deque
+import asyncio
+import os
+import random
+import threading
+import time
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer within the deadline, or the circuit breaker is open."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+def retryable(error):
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failed calls; after `reset_timeout` seconds lets one probe through."""
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        """True while closed, 'probe' for the one call let through half-open, else False."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return 'probe'
+            return False
+
+    def end_probe(self):
+        # A probe that was cancelled or raised before recording its outcome frees the slot
+        with self._lock:
+            self.probing = False
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at) + 0.999))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened_at is None or self.probing:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class ResilientLLM:
+    """Runs LLM calls with a per-attempt timeout inside an overall deadline.
+
+    Retryable failures (timeouts, connection errors, 429/5xx) are retried with full
+    jitter. When hedging is on, an attempt still running after the recent p95 latency
+    gets a duplicate request and whichever answers first wins. Calls beyond
+    `max_concurrency` wait for a slot until the deadline instead of piling onto a slow
+    upstream.
+    """
+
+    def __init__(self, timeout=None, deadline=None, retries=None, backoff=None, hedge=None,
+                 hedge_after=None, max_concurrency=None, breaker_threshold=None, breaker_reset=None):
+        self.timeout = float(timeout or os.getenv('LLM_TIMEOUT', '10'))
+        self.deadline = float(deadline or os.getenv('LLM_DEADLINE', '20'))
+        self.retries = int(retries if retries is not None else os.getenv('LLM_RETRIES', '2'))
+        self.backoff = float(backoff or os.getenv('LLM_BACKOFF', '0.25'))
+        self.hedge = (hedge if hedge is not None else os.getenv('LLM_HEDGE', 'off').lower() in ('1', 'on', 'true'))
+        # Used until enough latencies have been observed to compute a p95
+        self.hedge_after = float(hedge_after or os.getenv('LLM_HEDGE_AFTER', '2'))
+        self.max_concurrency = int(max_concurrency or os.getenv('LLM_MAX_CONCURRENCY', '8'))
+        self.breaker = CircuitBreaker(int(breaker_threshold or os.getenv('LLM_BREAKER_THRESHOLD', '5')),
+                                      float(breaker_reset or os.getenv('LLM_BREAKER_RESET', '30')))
+        self._async_slots = None
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self._latencies) < 20:
+                return self.hedge_after
+            latencies = sorted(self._latencies)
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def _observe(self, started):
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+
+    def _backoff(self, attempt):
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _open(self):
+        with self._lock:
+            self.rejected += 1
+        return LLMUnavailable("The language model is temporarily unavailable, please try again shortly",
+                              retry_after=self.breaker.retry_after())
+
+    def _failed(self, error):
+        # A rejected request (400, bad key, ...) means the service is up; only outages trip the breaker
+        if error is None or isinstance(error, LLMUnavailable) or retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        with self._lock:
+            self.failures += 1
+        if isinstance(error, LLMUnavailable):
+            return error
+        reason = str(error) if error is not None and str(error) else 'timed out'
+        return LLMUnavailable(f"The language model did not answer: {reason}",
+                              retry_after=self.breaker.retry_after() or None)
+
+    async def call(self, factory):
+        """factory() returns a fresh awaitable for one attempt."""
+        admitted = self.breaker.allow()
+        if not admitted:
+            raise self._open()
+        try:
+            return await self._call(factory)
+        finally:
+            if admitted == 'probe':
+                self.breaker.end_probe()
+
+    async def _call(self, factory):
+        with self._lock:
+            self.calls += 1
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        end = loop.time() + self.deadline
+        try:
+            await asyncio.wait_for(self._async_slots.acquire(), self.deadline)
+        except asyncio.TimeoutError:
+            raise self._failed(LLMUnavailable("Too many requests are waiting for the language model"))
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    result = await self._attempt(factory, min(self.timeout, remaining))
+                    self.breaker.record_success()
+                    return result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    error = e
+                    if isinstance(e, asyncio.TimeoutError):
+                        with self._lock:
+                            self.timeouts += 1
+                    if not retryable(e) or attempt == self.retries:
+                        break
+                    with self._lock:
+                        self.retried += 1
+                    await asyncio.sleep(min(self._backoff(attempt), max(0.0, end - loop.time())))
+            raise self._failed(error)
+        finally:
+            self._async_slots.release()
+
+    async def _attempt(self, factory, timeout):
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(factory())]
+        primary = tasks[0]
+        try:
+            if self.hedge:
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(), timeout))
+                if not done:
+                    with self._lock:
+                        self.hedges += 1
+                    tasks.append(asyncio.ensure_future(factory()))
+            error = None
+            while tasks:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        self._observe(started)
+                        if task is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def call_sync(self, fn):
+        """Blocking variant for thread-pool callers; fn(timeout) performs one attempt. No hedging."""
+        admitted = self.breaker.allow()
+        if not admitted:
+            raise self._open()
+        try:
+            return self._call_sync(fn)
+        finally:
+            if admitted == 'probe':
+                self.breaker.end_probe()
+
+    def _call_sync(self, fn):
+        with self._lock:
+            self.calls += 1
+        end = time.monotonic() + self.deadline
+        if not self._sync_slots.acquire(timeout=self.deadline):
+            raise self._failed(LLMUnavailable("Too many requests are waiting for the language model"))
+        error = None
+        try:
+            for attempt in range(self.retries + 1):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                started = time.monotonic()
+                try:
+                    result = fn(min(self.timeout, remaining))
+                    self._observe(started)
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    error = e
+                    if not retryable(e) or attempt == self.retries:
+                        break
+                    with self._lock:
+                        self.retried += 1
+                    time.sleep(min(self._backoff(attempt), max(0.0, end - time.monotonic())))
+            raise self._failed(error)
+        finally:
+            self._sync_slots.release()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "breaker": self.breaker.state,
+                "breaker_trips": self.breaker.trips,
+                "calls": self.calls,
+                "failures": self.failures,
+                "retries": self.retried,
+                "timeouts": self.timeouts,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "rejected": self.rejected,
+                "p95_seconds": round(latencies[int(len(latencies) * 0.95) - 1], 3) if latencies else 0.0
+            }
@@ -0,0 +1,244 @@
+# Request, stage, database and LLM timings exported in the Prometheus text format, with optional trace spans
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ENABLED = os.getenv('METRICS', 'on').lower() not in ('0', 'off', 'false')
+# When on, every finished stage and request is printed as one JSON span line carrying the request ID
+TRACE = os.getenv('METRICS_TRACE', 'off').lower() in ('1', 'on', 'true')
+REQUEST_ID_HEADER = 'x-request-id'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = tuple(256 * 4 ** i for i in range(10))
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (+Inf last), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Read when scraped; fn returns a number, or a dict of label tuple -> number.
+
+    kind='counter' exposes a running total that some other component already keeps.
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"Gauge {self.name} failed: ", e)
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.add(Histogram(
+    'dbms_http_request_duration_seconds', 'Time from request received to response sent, by route',
+    ('method', 'route', 'status')))
+RESPONSE_BYTES = REGISTRY.add(Histogram(
+    'dbms_http_response_bytes', 'Response body size, by route', ('route',), BYTES_BUCKETS))
+STAGE_SECONDS = REGISTRY.add(Histogram(
+    'dbms_stage_duration_seconds', 'Time spent in one stage of handling a request', ('route', 'stage')))
+ROWS_RETURNED = REGISTRY.add(Histogram(
+    'dbms_rows_returned', 'Rows returned to the client per request', ('route',), ROWS_BUCKETS))
+DB_POOL_WAIT = REGISTRY.add(Histogram(
+    'dbms_db_pool_wait_seconds', 'Time spent waiting to check a connection out of the pool'))
+LLM_SECONDS = REGISTRY.add(Histogram(
+    'dbms_llm_request_duration_seconds', 'LLM call latency including retries', ('kind',)))
+LLM_TOKENS = REGISTRY.add(Counter(
+    'dbms_llm_tokens_total', 'Tokens reported by the LLM', ('direction',)))
+
+
+class RequestContext:
+    __slots__ = ('request_id', 'scope', 'started', 'last_stage_end')
+
+    def __init__(self, request_id, scope):
+        self.request_id = request_id
+        self.scope = scope
+        self.started = time.perf_counter()
+        self.last_stage_end = None
+
+    @property
+    def route(self):
+        # Set by FastAPI once the request is routed; the template keeps label cardinality bounded
+        route = self.scope.get('route')
+        return getattr(route, 'path', 'unmatched')
+
+
+_current = ContextVar('request_context', default=None)
+
+
+def request_id():
+    context = _current.get()
+    return context.request_id if context is not None else None
+
+
+def span(name, started, seconds, **fields):
+    print(json.dumps({"span": name, "request_id": request_id(), "start": round(started, 6),
+                      "duration_ms": round(seconds * 1000, 3), **fields}))
+
+
+@contextmanager
+def stage(name):
+    """Times one stage of the current request (parse, authorize, execute, ...)."""
+    context = _current.get()
+    if context is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        context.last_stage_end = end
+        STAGE_SECONDS.observe(end - started, context.route, name)
+        if TRACE:
+            span(name, time.time() - (end - started), end - started, route=context.route)
+
+
+def rows_returned(count):
+    context = _current.get()
+    if context is not None:
+        ROWS_RETURNED.observe(count, context.route)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request, streamed responses until their last chunk.
+
+    Takes the request ID from the X-Request-ID header (or makes one) and echoes it back.
+    The gap between the last stage of a handler and the response start is recorded as the
+    'serialize' stage, which covers response model validation and JSON encoding.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        incoming = dict(scope['headers']).get(REQUEST_ID_HEADER.encode())
+        context = RequestContext(incoming.decode('latin-1')[:128] if incoming else uuid.uuid4().hex, scope)
+        token = _current.set(context)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if context.last_stage_end is not None:
+                    STAGE_SECONDS.observe(time.perf_counter() - context.last_stage_end, context.route, 'serialize')
+                message['headers'] = list(message.get('headers', [])) + [
+                    (REQUEST_ID_HEADER.encode(), context.request_id.encode('latin-1'))]
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - context.started
+            route = context.route
+            REQUEST_SECONDS.observe(seconds, scope['method'], route, str(status))
+            RESPONSE_BYTES.observe(size, route)
+            if TRACE:
+                span('request', time.time() - seconds, seconds, route=route, method=scope['method'],
+                     status=status, bytes=size)
+            _current.reset(token)
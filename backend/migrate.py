@@ -0,0 +1,89 @@
+# Applies database/migrations/*.sql in order and records each one in schema_migrations
+#
+#   python backend/migrate.py            apply pending migrations
+#   python backend/migrate.py --status   list applied and pending migrations
+
+import argparse
+import hashlib
+import os
+import re
+from database import Database
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'database', 'migrations')
+
+# Files starting with this line run statement by statement outside a transaction
+# (needed for CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION = '-- migrate: no-transaction'
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(100) PRIMARY KEY,
+        checksum VARCHAR(64),
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+RECORD = "INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING"
+
+
+def available():
+    migrations = []
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if name.endswith('.sql'):
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                sql = f.read()
+            migrations.append((name[:-4], sql, hashlib.sha256(sql.encode()).hexdigest()))
+    return migrations
+
+
+def applied(db):
+    db.execute_query(CREATE_TABLE, fetch=False)
+    return {row['version']: row['checksum'] for row in db.execute_query("SELECT version, checksum FROM schema_migrations")}
+
+
+def apply(db, version, sql, checksum):
+    with db.connection() as conn:
+        if sql.startswith(NO_TRANSACTION):
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    for statement in re.split(r';\s*$', sql, flags=re.MULTILINE):
+                        if any(line.strip() and not line.strip().startswith('--') for line in statement.splitlines()):
+                            cur.execute(statement)
+                    cur.execute(RECORD, (version, checksum))
+            finally:
+                conn.autocommit = False
+        else:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    cur.execute(RECORD, (version, checksum))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+
+def migrate(db, status_only=False):
+    done = applied(db)
+    for version, sql, checksum in available():
+        if version in done:
+            # Migrations baked into schema.sql are recorded without a checksum
+            changed = done[version] is not None and done[version] != checksum
+            print(f"  applied  {version}{'  (file changed since it was applied)' if changed else ''}")
+        elif status_only:
+            print(f"  pending  {version}")
+        else:
+            print(f"  applying {version} ...")
+            apply(db, version, sql, checksum)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Apply database migrations")
+    arg_parser.add_argument('--status', action='store_true', help="list migrations without applying them")
+    args = arg_parser.parse_args()
+    db = Database(1, 1)
+    try:
+        migrate(db, status_only=args.status)
+    finally:
+        db.close()
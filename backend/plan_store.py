@@ -0,0 +1,67 @@
+# Server-side store for previewed query plans
+
+from collections import OrderedDict
+import os
+import secrets
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class PlanStore:
+    """Holds parsed plans between preview and confirm so the approved SQL is what runs."""
+
+    def __init__(self, ttl=None, max_per_user=None):
+        self.ttl = float(ttl or os.getenv('PLAN_TTL', '600'))
+        self.max_per_user = int(max_per_user or os.getenv('PLAN_MAX_PER_USER', '20'))
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def put(self, username: str, parsed: dict, question: str = None, role: str = None) -> str:
+        plan_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._puts += 1
+            if self._puts % 256 == 0:
+                self._sweep()
+            plans = self._plans.setdefault(username, OrderedDict())
+            self._evict_expired(plans)
+            # The question and role it was translated for travel with the plan
+            plans[plan_id] = (time.monotonic() + self.ttl, (parsed, question, role))
+            while len(plans) > self.max_per_user:
+                plans.popitem(last=False)
+        return plan_id
+
+    def take(self, username: str, plan_id: str, keep_if=None):
+        """Returns (parsed, question, role) as given to put(), or None once expired."""
+        with self._lock:
+            plans = self._plans.get(username)
+            if not plans or plan_id not in plans:
+                return None
+            expires_at, entry = plans[plan_id]
+            if keep_if is not None and keep_if(entry[0]) and expires_at > time.monotonic():
+                return entry
+            del plans[plan_id]
+            if not plans:
+                del self._plans[username]
+            return entry if expires_at > time.monotonic() else None
+
+    def _evict_expired(self, plans):
+        now = time.monotonic()
+        for plan_id in [k for k, (expires_at, _) in plans.items() if expires_at <= now]:
+            del plans[plan_id]
+
+    def _sweep(self):
+        for username in list(self._plans):
+            self._evict_expired(self._plans[username])
+            if not self._plans[username]:
+                del self._plans[username]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._plans),
+                "plans": sum(len(plans) for plans in self._plans.values())
+            }
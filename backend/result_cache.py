@@ -0,0 +1,218 @@
+# Role-scoped result cache with table-granular invalidation
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import pickle
+import time
+from dotenv import load_dotenv
+from sql_analyzer import analyze
+from analytics_views import MATERIALIZED_VIEWS
+from coalescing import SingleFlight
+
+load_dotenv()
+
+# Base tables read or written by each stored function / view, used as invalidation tags
+FUNCTION_TABLES = {
+    'add_student': {'system_users', 'students'},
+    'add_faculty': {'system_users', 'faculty'},
+    'add_course': {'courses'},
+    'enroll_student': {'enrollments'},
+    'update_grade': {'enrollments'},
+    'get_student_courses': {'enrollments', 'courses', 'faculty', 'system_users'},
+    'get_faculty_courses': {'courses', 'enrollments'},
+    'get_course_enrollments': {'enrollments', 'students', 'system_users'},
+    'get_my_profile': {'system_users', 'students', 'faculty'},
+    'get_all_users': {'system_users'}
+}
+
+VIEW_TABLES = {
+    'active_users': {'system_users'}
+}
+
+CACHEABLE_TABLES = {'system_users', 'students', 'faculty', 'courses', 'enrollments'}
+
+
+def referenced_tables(query):
+    """Base tables a statement touches, or None if it references anything the cache cannot track."""
+    analysis = analyze(query)
+    # Functions sqlglot does not know as built-ins may read any table
+    if analysis.kind in ('invalid', 'multiple', 'other') or analysis.functions - FUNCTION_TABLES.keys():
+        return None
+    tables = set()
+    for name in analysis.tables | analysis.functions:
+        if name in FUNCTION_TABLES:
+            tables |= FUNCTION_TABLES[name]
+        elif name in VIEW_TABLES:
+            tables |= VIEW_TABLES[name]
+        elif name in CACHEABLE_TABLES or name in MATERIALIZED_VIEWS:
+            # Refreshed materialized views notify under their own name
+            tables.add(name)
+        else:
+            return None
+    return tables or None
+
+
+class MemoryBackend:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._tags = {}
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, tables, ttl):
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, tables)
+        for table in tables:
+            self._tags.setdefault(table, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate(self, tables):
+        dropped = 0
+        for table in tables:
+            for key in self._tags.pop(table, set()):
+                if key in self._entries:
+                    self._drop(key)
+                    dropped += 1
+        return dropped
+
+    async def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for table in entry[2]:
+                keys = self._tags.get(table)
+                if keys is not None:
+                    keys.discard(key)
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Any Redis-compatible server (Redis, Valkey, KeyDB, ...); tags are kept as sets."""
+
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+
+    async def get(self, key):
+        value = await self.client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    async def set(self, key, value, tables, ttl):
+        pipe = self.client.pipeline()
+        pipe.set(key, pickle.dumps(value), ex=int(ttl))
+        for table in tables:
+            pipe.sadd(f"rc:tag:{table}", key)
+            pipe.expire(f"rc:tag:{table}", int(ttl))
+        await pipe.execute()
+
+    async def invalidate(self, tables):
+        dropped = 0
+        for table in tables:
+            tag = f"rc:tag:{table}"
+            keys = await self.client.smembers(tag)
+            if keys:
+                dropped += await self.client.delete(*keys)
+            await self.client.delete(tag)
+        return dropped
+
+    async def clear(self):
+        async for key in self.client.scan_iter("rc:*"):
+            await self.client.delete(key)
+
+    def size(self):
+        return None
+
+
+class ResultCache:
+    """Caches read results per endpoint, role and user; entries are dropped when a table they read changes."""
+
+    def __init__(self, backend=None):
+        self.ttl = float(os.getenv('RESULT_CACHE_TTL', '300'))
+        if backend is None:
+            kind = os.getenv('RESULT_CACHE_BACKEND', 'memory')
+            if kind == 'redis':
+                backend = RedisBackend(os.getenv('RESULT_CACHE_URL', 'redis://localhost:6379/0'))
+            else:
+                backend = MemoryBackend(int(os.getenv('RESULT_CACHE_SIZE', '2048')))
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation; a result loaded across one is not stored
+        self.generation = 0
+        # Concurrent misses on the same key wait for one load instead of stampeding the database
+        self.flights = SingleFlight()
+
+    @staticmethod
+    def make_key(endpoint, role, username, query='', params=None):
+        # The query text is used as is: spacing inside a string literal changes the result
+        raw = json.dumps([endpoint, role, username, query.strip(), params], default=str)
+        return "rc:" + hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key):
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value, tables, generation=None):
+        if generation is not None and generation != self.generation:
+            return
+        await self.backend.set(key, value, tables, self.ttl)
+
+    async def read_through(self, key, tables, load):
+        if not tables:
+            return await load()
+        value = await self.get(key)
+        if value is None:
+            value = await self.flights.do(key, lambda: self._load(key, tables, load))
+        return value
+
+    async def _load(self, key, tables, load):
+        generation = self.generation
+        value = await load()
+        await self.set(key, value, tables, generation)
+        return value
+
+    async def invalidate(self, tables):
+        self.generation += 1
+        self.invalidations += await self.backend.invalidate(tables)
+
+    async def handle_notify(self, payload):
+        # payload is a changed table name, or None when the listener (re)connected
+        if payload is None:
+            self.generation += 1
+            await self.backend.clear()
+        else:
+            await self.invalidate({payload})
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidated_entries": self.invalidations,
+            "coalesced_loads": self.flights.shared
+        }
@@ -0,0 +1,155 @@
+# Cached schema catalog built from pg_catalog
+
+import asyncio
+from sql_analyzer import STAFF_RELATIONS, is_audit_table
+
+RESTRICTED_TABLES = {'audit_log', 'row_changes', 'operations', 'system_users', 'schema_version', 'schema_migrations'}
+
+ROLE_PROCEDURES = {
+    # Faculty can see enrollment and grade management procedures
+    'faculty': ['enroll_student', 'update_grade', 'get_student_courses', 'get_faculty_courses', 'get_course_enrollments', 'get_my_profile'],
+    # Students can only view their own data
+    'student': ['get_student_courses', 'get_my_profile']
+}
+
+# Kept out of the LLM prompt: internal tables, secrets and helper functions the
+# parser must never generate calls to.
+PROMPT_HIDDEN_TABLES = {'audit_log', 'row_changes', 'operations', 'schema_version', 'schema_migrations'}
+PROMPT_HIDDEN_COLUMNS = {'password_hash'}
+PROMPT_HIDDEN_PROCEDURES = {
+    'log_operation', 'get_my_profile', 'get_audit_logs', 'get_all_users',
+    'create_audit_log_partition', 'ensure_audit_log_partitions', 'archive_audit_log_partitions',
+    'refresh_analytics_view', 'current_operation', 'get_operations', 'revert_operations', 'revert_user_operations',
+    'purge_row_changes'
+}
+
+RELATIONS_QUERY = """
+    SELECT c.relname AS table_name, c.relkind AS kind
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+        AND c.relkind IN ('r', 'p', 'v', 'm')
+        AND NOT c.relispartition
+    ORDER BY c.relname
+"""
+
+COLUMNS_QUERY = """
+    SELECT c.relname AS table_name, a.attname AS column_name, format_type(a.atttypid, NULL) AS data_type
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'public'
+        AND c.relkind IN ('r', 'p', 'v', 'm')
+        AND NOT c.relispartition
+        AND a.attnum > 0
+        AND NOT a.attisdropped
+    ORDER BY c.relname, a.attnum
+"""
+
+PROCEDURES_QUERY = """
+    SELECT
+        p.proname AS routine_name,
+        COALESCE(NULLIF(pg_get_function_identity_arguments(p.oid), ''), 'no parameters') AS parameters,
+        COALESCE(p.proargnames[1:p.pronargs], ARRAY[]::TEXT[]) AS arg_names
+    FROM pg_proc p
+    JOIN pg_namespace n ON n.oid = p.pronamespace
+    WHERE n.nspname = 'public'
+        AND p.prokind = 'f'
+        AND p.prorettype NOT IN ('trigger'::regtype, 'event_trigger'::regtype)
+    ORDER BY p.proname
+"""
+
+
+class SchemaCatalog:
+    """Introspects the public schema once and serves per-role views until a DDL change is notified."""
+
+    def __init__(self, db):
+        self.db = db
+        self.version = 0
+        self._snapshot = None
+        self._role_views = {}
+        self._lock = asyncio.Lock()
+        self._listeners = []
+
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    async def refresh(self):
+        async with self._lock:
+            relations = await self.db.execute_query(RELATIONS_QUERY)
+            columns = await self.db.execute_query(COLUMNS_QUERY)
+            procedures = await self.db.execute_query(PROCEDURES_QUERY)
+            version = await self.db.execute_query("SELECT version FROM schema_version")
+            self._snapshot = {"relations": relations, "columns": columns, "procedures": procedures}
+            self._role_views = {}
+            self.version = version[0]['version'] if version else self.version + 1
+        for callback in self._listeners:
+            callback()
+
+    async def handle_notify(self, payload):
+        # payload is the new schema version, or None when the listener (re)connected
+        if payload is None or self._snapshot is None or int(payload) != self.version:
+            await self.refresh()
+
+    async def for_role(self, role):
+        if self._snapshot is None:
+            await self.refresh()
+        view = self._role_views.get(role)
+        if view is None:
+            view = self._build_view(role)
+            self._role_views[role] = view
+        return view
+
+    def _build_view(self, role):
+        snapshot = self._snapshot
+        if role == 'admin':
+            hidden = set()
+            allowed_procs = None
+        else:
+            # Archived audit partitions are detached, so they are listed as tables of their own
+            hidden = RESTRICTED_TABLES | {r['table_name'] for r in snapshot['relations'] if is_audit_table(r['table_name'])}
+            if role != 'faculty':
+                hidden |= STAFF_RELATIONS
+            allowed_procs = set(ROLE_PROCEDURES.get(role, ROLE_PROCEDURES['student']))
+        return {
+            "tables": [{"table_name": r['table_name']} for r in snapshot['relations'] if r['table_name'] not in hidden],
+            "columns": [
+                {"table_name": c['table_name'], "column_name": c['column_name'], "data_type": c['data_type']}
+                for c in snapshot['columns'] if c['table_name'] not in hidden
+            ],
+            "procedures": [
+                {"routine_name": p['routine_name'], "parameters": p['parameters']}
+                for p in snapshot['procedures']
+                if allowed_procs is None or p['routine_name'] in allowed_procs
+            ]
+        }
+
+    def prompt_section(self, notes=None):
+        notes = notes or {}
+        snapshot = self._snapshot
+        columns = {}
+        for c in snapshot['columns']:
+            if c['column_name'] not in PROMPT_HIDDEN_COLUMNS:
+                columns.setdefault(c['table_name'], []).append(c['column_name'])
+
+        relations = [r for r in snapshot['relations']
+                     if r['table_name'] not in PROMPT_HIDDEN_TABLES and not is_audit_table(r['table_name'])]
+        tables = [r['table_name'] for r in relations if r['kind'] in ('r', 'p')]
+        views = [r['table_name'] for r in relations if r['kind'] in ('v', 'm')]
+        procedures = [p for p in snapshot['procedures'] if p['routine_name'] not in PROMPT_HIDDEN_PROCEDURES]
+
+        lines = ["TABLES:"]
+        for i, name in enumerate(tables, 1):
+            lines.append(f"{i}. {name} ({', '.join(columns.get(name, []))})")
+        if views:
+            lines += ["", "VIEWS:"]
+            for name in views:
+                lines.append(f"- {name} ({', '.join(columns.get(name, []))})")
+        if procedures:
+            lines += ["", "STORED PROCEDURES:"]
+            for i, p in enumerate(procedures, 1):
+                line = f"{i}. {p['routine_name']}({', '.join(p['arg_names'])})"
+                if p['routine_name'] in notes:
+                    line += f" - {notes[p['routine_name']]}"
+                lines.append(line)
+        return '\n'.join(lines)
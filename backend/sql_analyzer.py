@@ -0,0 +1,390 @@
+# SQL analysis and role policies for generated queries
+
+from dataclasses import dataclass
+from functools import lru_cache
+import re
+import sqlglot
+from sqlglot import exp
+from analytics_views import MATERIALIZED_VIEWS
+
+STATEMENT_KINDS = {
+    exp.Select: 'select',
+    exp.Union: 'select',
+    exp.Intersect: 'select',
+    exp.Except: 'select',
+    exp.Insert: 'insert',
+    exp.Update: 'update',
+    exp.Delete: 'delete'
+}
+
+SENSITIVE_COLUMNS = {('system_users', 'password_hash')}
+
+# Never callable from generated SQL, whatever the role
+DENIED_FUNCTIONS = {
+    'pg_read_file', 'pg_read_binary_file', 'pg_ls_dir', 'pg_stat_file', 'pg_sleep', 'pg_sleep_for', 'pg_sleep_until',
+    'pg_terminate_backend', 'pg_cancel_backend', 'pg_reload_conf', 'pg_rotate_logfile', 'set_config',
+    'lo_import', 'lo_export', 'dblink', 'dblink_exec', 'query_to_xml', 'pg_advisory_lock'
+}
+
+ADMIN_FUNCTIONS = {
+    'get_audit_logs', 'get_all_users', 'log_operation', 'add_student', 'add_faculty', 'add_course',
+    'create_audit_log_partition', 'ensure_audit_log_partitions', 'archive_audit_log_partitions',
+    'refresh_analytics_view', 'current_operation', 'get_operations', 'revert_operations', 'revert_user_operations',
+    'purge_row_changes'
+}
+
+# Row-change capture keeps before-images of every table, password hashes included.
+# <name>_* covers their partitions, attached or archived (audit_log_default, audit_log_p202501, ...)
+AUDIT_TABLES = {'audit_log', 'row_changes', 'operations'}
+
+# Roles allowed to call each stored procedure through /query
+PROCEDURE_ROLES = {
+    'add_student': {'admin'},
+    'add_faculty': {'admin'},
+    'add_course': {'admin'},
+    'enroll_student': {'admin', 'faculty'},
+    'update_grade': {'admin', 'faculty'},
+    'get_student_courses': {'admin', 'faculty', 'student'},
+    'get_faculty_courses': {'admin', 'faculty'},
+    'get_course_enrollments': {'admin', 'faculty'}
+}
+
+# Relations only admin and faculty may read: the analytics views aggregate every student's grades and CGPA
+STAFF_RELATIONS = frozenset(MATERIALIZED_VIEWS)
+
+# Columns a non-admin may change on their own system_users row
+PROFILE_COLUMNS = {'full_name', 'email'}
+
+
+class PolicyViolation(Exception):
+    def __init__(self, message, status_code=403):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass(frozen=True)
+class Analysis:
+    kind: str
+    tables: frozenset = frozenset()
+    functions: frozenset = frozenset()
+    columns: frozenset = frozenset()
+    filters: frozenset = frozenset()
+    exposes_sensitive: bool = False
+    has_limit: bool = False
+    target: str = None
+    set_columns: frozenset = frozenset()
+    owner_filter: tuple = None
+    nested_write: bool = False
+    select_into: bool = False
+    error: str = None
+
+
+def normalize_sql(sql: str) -> str:
+    # Line breaks are kept: they end -- comments, so collapsing them changes the statement
+    sql = re.sub(r'[^\S\n]+', ' ', sql.strip())
+    return re.sub(r' ?\n\s*', '\n', sql).rstrip(';').strip()
+
+
+def analyze(sql: str) -> Analysis:
+    return _analyze(normalize_sql(sql))
+
+
+@lru_cache(maxsize=4096)
+def _analyze(sql: str) -> Analysis:
+    try:
+        statements = [s for s in sqlglot.parse(sql, read='postgres') if s is not None]
+    except sqlglot.errors.SqlglotError as e:
+        return Analysis(kind='invalid', error=str(e).splitlines()[0])
+    if len(statements) != 1:
+        return Analysis(kind='multiple')
+
+    tree = statements[0]
+    # sqlglot reads (TABLE x) as a table or column named TABLE aliased x, which would hide x from
+    # the policy. TABLE is reserved in Postgres, so an unquoted one is always this statement.
+    if any(isinstance(node.this, exp.Identifier) and not node.this.quoted and node.name.upper() == 'TABLE'
+           for node in tree.find_all(exp.Table, exp.Column)):
+        return Analysis(kind='invalid', error="TABLE x is not supported, use SELECT * FROM x")
+    kind = next((k for t, k in STATEMENT_KINDS.items() if isinstance(tree, t)), 'other')
+    ctes = {cte.alias_or_name.lower(): cte for cte in tree.find_all(exp.CTE)}
+
+    tables, functions, aliases = set(), set(), {}
+    for table in tree.find_all(exp.Table):
+        if isinstance(table.this, exp.Func):
+            # Table-valued function in FROM, e.g. get_student_courses(...)
+            name = table.this.name.lower() if isinstance(table.this, exp.Anonymous) else table.this.sql_name().lower()
+            aliases[table.alias_or_name.lower()] = name
+            continue
+        name = table.name.lower()
+        aliases[table.alias_or_name.lower()] = name
+        if name not in ctes:
+            tables.add(name)
+    for func in tree.find_all(exp.Anonymous):
+        functions.add(func.name.lower())
+
+    columns = set()
+    for column in tree.find_all(exp.Column):
+        if isinstance(column.this, exp.Star):
+            continue
+        qualifier = column.table.lower()
+        columns.add((aliases.get(qualifier, qualifier) if qualifier else None, column.name.lower()))
+
+    # (table, column) pairs used in WHERE and JOIN ... ON, i.e. index candidates
+    filters = set()
+    conditions = [where.this for where in tree.find_all(exp.Where)]
+    conditions += [join.args['on'] for join in tree.find_all(exp.Join) if join.args.get('on') is not None]
+    for condition in conditions:
+        for column in condition.find_all(exp.Column):
+            qualifier = column.table.lower()
+            table = aliases.get(qualifier, qualifier) if qualifier else next(iter(tables)) if len(tables) == 1 else None
+            if table in tables:
+                filters.add((table, column.name.lower()))
+
+    # A data-modifying CTE or SELECT ... INTO would write through the read path
+    nested_write = any(node is not tree for node in tree.find_all(exp.Insert, exp.Update, exp.Delete, exp.Merge))
+    select_into = any(select.args.get('into') is not None for select in tree.find_all(exp.Select))
+
+    has_limit = kind == 'select' and (tree.args.get('limit') is not None or tree.args.get('fetch') is not None)
+
+    target, set_columns, owner_filter = None, frozenset(), None
+    if kind in ('insert', 'update', 'delete'):
+        target_table = tree.this if kind != 'insert' else tree.find(exp.Table)
+        target = target_table.name.lower() if isinstance(target_table, exp.Table) else None
+        if kind == 'update':
+            set_columns = frozenset(e.this.name.lower() for e in tree.expressions if isinstance(e, exp.EQ))
+            owner_filter = _owner_filter(tree)
+
+    return Analysis(
+        kind=kind,
+        tables=frozenset(tables),
+        functions=frozenset(functions),
+        columns=frozenset(columns),
+        filters=frozenset(filters),
+        exposes_sensitive=_exposes_sensitive(tree, tables, aliases, columns, ctes),
+        has_limit=has_limit,
+        target=target,
+        set_columns=set_columns,
+        owner_filter=owner_filter,
+        nested_write=nested_write,
+        select_into=select_into
+    )
+
+
+def _exposes_sensitive(tree, tables, aliases, columns, ctes):
+    sensitive_tables = {t for t, _ in SENSITIVE_COLUMNS}
+    for table, column in columns:
+        if (table, column) in SENSITIVE_COLUMNS:
+            return True
+        if table is None and any((t, column) in SENSITIVE_COLUMNS for t in tables):
+            return True
+
+    # A CTE that exposes a sensitive column makes its name a sensitive source too
+    sources = set(sensitive_tables)
+    for name, cte in ctes.items():
+        if _star_sources(cte.this, aliases) & sources or any(
+            isinstance(s, exp.Column) and s.name.lower() in {c for _, c in SENSITIVE_COLUMNS}
+            for s in cte.this.find_all(exp.Column)
+        ):
+            sources.add(name)
+    # A column alias list renames columns: SELECT c FROM system_users su(a, b, c)
+    if any(t.name.lower() in sources and t.args.get('alias') is not None and t.args['alias'].columns
+           for t in tree.find_all(exp.Table)):
+        return True
+    # A bare table name or alias is a whole-row reference: su, su::text, row_to_json(su), (su).password_hash
+    if any(table is None and aliases.get(column) in sources for table, column in columns):
+        return True
+    return any(_star_sources(select, aliases) & sources for select in tree.find_all(exp.Select))
+
+
+def _star_sources(select, aliases):
+    """Relations whose every column a SELECT expands through * or alias.*."""
+    if not isinstance(select, exp.Select):
+        return set()
+    direct = []
+    if select.args.get('from_') is not None:
+        direct.append(select.args['from_'].this)
+    direct += [join.this for join in select.args.get('joins') or []]
+    direct_names = {t.alias_or_name.lower(): t.name.lower() for t in direct if isinstance(t, exp.Table)}
+
+    sources = set()
+    for projection in select.expressions:
+        if isinstance(projection, exp.Star):
+            sources |= set(direct_names.values())
+        elif isinstance(projection, exp.Column) and isinstance(projection.this, exp.Star):
+            qualifier = projection.table.lower()
+            sources.add(direct_names.get(qualifier, aliases.get(qualifier, qualifier)))
+    return sources
+
+
+def _owner_filter(tree):
+    # Recognizes WHERE username = '<literal>' or WHERE username = %s
+    where = tree.args.get('where')
+    condition = where.this if where is not None else None
+    if not isinstance(condition, exp.EQ) or not isinstance(condition.this, exp.Column):
+        return None
+    if condition.this.name.lower() != 'username':
+        return None
+    value = condition.expression
+    if isinstance(value, exp.Literal) and value.is_string:
+        return ('literal', value.this)
+    if isinstance(value, exp.Placeholder):
+        placeholders = list(tree.find_all(exp.Placeholder, bfs=False))
+        return ('param', next(i for i, p in enumerate(placeholders) if p is value))
+    return None
+
+
+def check_statement(analysis: Analysis, role: str, username: str, params=None):
+    if analysis.kind == 'invalid':
+        raise PolicyViolation(f"Could not parse generated SQL: {analysis.error}", 400)
+    if analysis.kind == 'multiple':
+        raise PolicyViolation("Only one SQL statement can be executed at a time", 400)
+    if analysis.kind == 'other':
+        raise PolicyViolation("Unsupported statement type", 400)
+    if analysis.nested_write:
+        raise PolicyViolation("INSERT, UPDATE and DELETE cannot be nested inside another statement", 400)
+    if analysis.select_into:
+        raise PolicyViolation("SELECT ... INTO is not allowed", 400)
+
+    denied = analysis.functions & DENIED_FUNCTIONS
+    if denied:
+        raise PolicyViolation(f"Access denied: Function {sorted(denied)[0]} is not allowed")
+    if role == 'admin':
+        return
+
+    if any(is_audit_table(table) for table in analysis.tables):
+        raise PolicyViolation("Access denied: Cannot access audit logs")
+    if analysis.exposes_sensitive:
+        raise PolicyViolation("Access denied: Cannot access sensitive fields")
+    staff_only = analysis.tables & STAFF_RELATIONS
+    if staff_only and role != 'faculty':
+        raise PolicyViolation(f"Access denied: {sorted(staff_only)[0]} is not available to {role} users")
+    restricted = analysis.functions & ADMIN_FUNCTIONS
+    if restricted:
+        raise PolicyViolation(f"Access denied: {sorted(restricted)[0]} is admin only")
+    for function in analysis.functions & PROCEDURE_ROLES.keys():
+        if role not in PROCEDURE_ROLES[function]:
+            raise PolicyViolation(f"Access denied: {function} is not available to {role} users")
+
+    if analysis.kind == 'delete':
+        raise PolicyViolation("Only admin can delete records")
+    if analysis.kind == 'insert' and role == 'student':
+        raise PolicyViolation("Students cannot add records")
+    if analysis.kind == 'update':
+        if analysis.target == 'system_users':
+            if not _owns_row(analysis, username, params) or not analysis.set_columns <= PROFILE_COLUMNS:
+                raise PolicyViolation("Access denied: You can only update your own name or email")
+        elif role == 'student':
+            raise PolicyViolation("Students can only update their own profile")
+
+
+def is_audit_table(table):
+    return table in AUDIT_TABLES or any(table.startswith(f'{name}_') for name in AUDIT_TABLES)
+
+
+def _owns_row(analysis, username, params):
+    if analysis.owner_filter is None:
+        return False
+    source, value = analysis.owner_filter
+    if source == 'param':
+        value = params[value] if params and value < len(params) else None
+    return value == username
+
+
+def check_procedure(procedure: str, role: str):
+    if procedure not in PROCEDURE_ROLES:
+        raise PolicyViolation(f"Unknown procedure: {procedure}", 400)
+    if role not in PROCEDURE_ROLES[procedure]:
+        raise PolicyViolation(f"Access denied: {procedure} is not available to {role} users")
+
+
+def with_limit(sql: str, max_rows: int) -> str:
+    return f"{sql.strip().rstrip(';')}\nLIMIT {int(max_rows)}"
+
+
+def paged(sql: str):
+    """Splits a SELECT into (inner SQL, ORDER BY keys over page_q) for keyset paging.
+
+    Each ORDER BY key of a plain SELECT becomes a hidden _page_k<n> output column, so the
+    pager reproduces the query's own order. Keys are (column, desc, nulls_first) with the
+    NULL placement resolved. The inner SQL is in psycopg format: literal % is doubled and
+    placeholders stay %s. Returns None when a key cannot be tied to an output column
+    (e.g. ORDER BY 1 over *).
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read='postgres')
+    except sqlglot.errors.SqlglotError:
+        return None
+    order = tree.args.get('order')
+    terms = order.expressions if order is not None else []
+    projections = list(tree.selects) if isinstance(tree, (exp.Select, exp.Union, exp.Intersect, exp.Except)) else None
+    if projections is None:
+        return None
+
+    keys = []
+    for i, term in enumerate(terms):
+        target = term.this
+        if isinstance(target, exp.Literal) and not target.is_string:
+            position = int(target.this) - 1
+            if not 0 <= position < len(projections) or projections[position].is_star:
+                return None
+            target = projections[position]
+        elif isinstance(target, exp.Column) and not target.table:
+            target = next((p for p in projections if p.alias_or_name.lower() == target.name.lower()), target)
+        if isinstance(tree, exp.Select):
+            name = exp.to_identifier(f'_page_k{i}')
+            tree.select(exp.alias_(target.unalias().copy(), name), copy=False)
+        elif isinstance(target, (exp.Alias, exp.Column)) and target.alias_or_name:
+            # UNION and friends can only be ordered by their output columns
+            name = target.args['alias'] if isinstance(target, exp.Alias) else target.this
+        else:
+            return None
+        column = exp.column(name.copy(), table='page_q').sql(dialect='postgres')
+        keys.append((column, bool(term.args.get('desc')), bool(term.args.get('nulls_first'))))
+
+    if order is not None and not any(tree.args.get(arg) is not None for arg in ('limit', 'offset', 'fetch')):
+        # The pager orders; a sort inside would be wasted
+        tree.set('order', None)
+    for placeholder in list(tree.find_all(exp.Placeholder)):
+        placeholder.replace(exp.var('__page_param__'))
+    inner = tree.sql(dialect='postgres').replace('%', '%%').replace('__page_param__', '%s')
+    return inner, keys
+
+
+def page_query(inner: str, keys, after=None):
+    """Builds the statement for one page of paged() output, returning (sql, params).
+
+    Rows are ordered by the keys, then by the row's text form so the order is total, and
+    each row carries its key values and text form as _page_keys and _page_row. after is
+    the (key values, row text) of the last row already served, as text; the page seeks to
+    it with a predicate on the keys rather than numbering the rows before it. Rows equal
+    to it are included, so the caller skips the ones it served with the trailing OFFSET.
+    The OFFSET and LIMIT placeholders come after params and are left to the caller.
+    """
+    columns = [column for column, _, _ in keys]
+    order = [f"{column} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nulls_first else 'LAST'}"
+             for column, desc, nulls_first in keys]
+    where, params = '', []
+    if after is not None:
+        values, text = after
+        # Beyond the last row: equal on the leading keys and past it on the next one,
+        # or equal on every key and not before it in text order
+        disjuncts, equal, equal_params = [], [], []
+        for (column, desc, nulls_first), value in zip(keys, values):
+            if value is None:
+                beyond, beyond_params = (f'{column} IS NOT NULL' if nulls_first else None), []
+            else:
+                beyond, beyond_params = f"{column} {'<' if desc else '>'} %s", [value]
+                if not nulls_first:
+                    beyond = f'({beyond} OR {column} IS NULL)'
+            if beyond is not None:
+                disjuncts.append(' AND '.join([*equal, beyond]))
+                params += [*equal_params, *beyond_params]
+            equal.append(f'{column} IS NULL' if value is None else f'{column} = %s')
+            equal_params += [] if value is None else [value]
+        disjuncts.append(' AND '.join([*equal, 'page_q::text >= %s']))
+        params += [*equal_params, text]
+        where = ' WHERE ' + ' OR '.join(f'({d})' for d in disjuncts)
+    sql = (f"SELECT page_q.*, page_q::text AS _page_row, "
+           f"ARRAY[{', '.join(f'{c}::text' for c in columns)}]::text[] AS _page_keys "
+           f"FROM ({inner}) AS page_q{where} ORDER BY {', '.join([*order, '_page_row'])} OFFSET %s LIMIT %s")
+    return sql, params
@@ -0,0 +1,180 @@
+# NL -> SQL translation cache
+
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def normalize_text(text: str) -> str:
+    # Case is kept: names and codes in a question end up as SQL literals, which compare
+    # case-sensitively. Spacing inside quotes is kept for the same reason.
+    parts = re.split(r"""('[^']*'|"[^"]*")""", text.strip())
+    text = ''.join(part if i % 2 else re.sub(r'\s+', ' ', part) for i, part in enumerate(parts))
+    return text.rstrip(' .?!;')
+
+
+# Stands in for the caller's username in prompts and cached translations, so users
+# with the same role share one translation
+USER_PLACEHOLDER = '__user__'
+
+
+def bind_user(parsed, username: str):
+    """Returns a copy of a translation with USER_PLACEHOLDER replaced by the caller's username."""
+    if parsed is None:
+        return None
+    bound = dict(parsed)
+    if bound.get('query'):
+        literal = "'" + username.replace("'", "''") + "'"
+        bound['query'] = bound['query'].replace(f"'{USER_PLACEHOLDER}'", literal)
+    bound['params'] = [username if p == USER_PLACEHOLDER else p for p in bound.get('params') or []]
+    if bound.get('explanation'):
+        bound['explanation'] = bound['explanation'].replace(USER_PLACEHOLDER, username)
+    return bound
+
+
+class TranslationCache:
+    """LRU + TTL cache of parsed queries, with an optional SQLite tier that survives restarts."""
+
+    def __init__(self, max_size=None, ttl=None, path=None):
+        self.max_size = int(max_size or os.getenv('NL_CACHE_SIZE', '1024'))
+        self.ttl = float(ttl or os.getenv('NL_CACHE_TTL', '86400'))
+        self.path = path if path is not None else os.getenv('NL_CACHE_PATH', '')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._disk = None
+        # Serializes SQLite calls, which may come from several worker threads
+        self._disk_lock = threading.Lock()
+        if self.path:
+            self._disk = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS translations_expires_at ON translations (expires_at)")
+            self._prune()
+
+    @staticmethod
+    def make_key(text: str, username: str, role: str, prompt_version: str) -> str:
+        raw = '\x1f'.join([normalize_text(text), username, role, prompt_version])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, key: str):
+        value = self._get_memory(key)
+        if value is None and self._disk is not None:
+            value = self._get_disk(key)
+        if value is None:
+            self._miss()
+        return value
+
+    # The async variants run SQLite calls in a worker thread, off the event loop
+    async def get_async(self, key: str):
+        value = self._get_memory(key)
+        if value is None and self._disk is not None:
+            value = await asyncio.to_thread(self._get_disk, key)
+        if value is None:
+            self._miss()
+        return value
+
+    def set(self, key: str, parsed: dict):
+        value, expires_at = self._set_memory(key, parsed)
+        if self._disk is not None:
+            self._set_disk(key, value, expires_at)
+
+    async def set_async(self, key: str, parsed: dict):
+        value, expires_at = self._set_memory(key, parsed)
+        if self._disk is not None:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at)
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(value)
+            del self._entries[key]
+            return None
+
+    def _get_disk(self, key):
+        with self._disk_lock:
+            row = self._disk.execute(
+                "SELECT value, expires_at FROM translations WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._store(key, row[0], row[1])
+            self.disk_hits += 1
+        return json.loads(row[0])
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _set_memory(self, key, parsed):
+        value = json.dumps(parsed)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        return value, expires_at
+
+    def _set_disk(self, key, value, expires_at):
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO translations (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+        self._prune()
+
+    def _prune(self):
+        # The file holds at most max_size entries too; expires_at orders them by write time
+        with self._disk_lock:
+            self._disk.execute(
+                "DELETE FROM translations WHERE expires_at < ? OR key NOT IN "
+                "(SELECT key FROM translations ORDER BY expires_at DESC LIMIT ?)",
+                (time.time(), self.max_size)
+            )
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM translations")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
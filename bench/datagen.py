@@ -0,0 +1,261 @@
+# Deterministic synthetic university dataset, loaded with COPY at a chosen scale
+#
+#   python bench/datagen.py --scale 100k --yes     replace all data with ~100k rows
+#
+# WARNING: truncates system_users, students, faculty, courses, enrollments and audit_log.
+# The demo accounts (admin / student1 / faculty1) are recreated with their usual passwords.
+
+import argparse
+import datetime
+import os
+import random
+import time
+import psycopg
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Approximate total rows -> students; every student brings ~8 enrollments and ~2 audit entries,
+# so a scale is roughly 12x its student count
+SCALES = {'10k': 800, '100k': 8_000, '1m': 80_000, '10m': 800_000}
+
+# (department, course prefix, weight)
+DEPARTMENTS = [
+    ('Computer Science', 'CS', 30), ('Electrical Engineering', 'EE', 15), ('Mechanical Engineering', 'ME', 12),
+    ('Civil Engineering', 'CE', 10), ('Mathematics', 'MA', 8), ('Physics', 'PH', 7), ('Chemistry', 'CH', 6),
+    ('Economics', 'EC', 5), ('Biology', 'BI', 4), ('Humanities', 'HU', 3)
+]
+DESIGNATIONS = [('Professor', 2), ('Associate Professor', 3), ('Assistant Professor', 4), ('Lecturer', 3)]
+GRADES = [('O', 4), ('A+', 8), ('A', 14), ('B+', 18), ('B', 20), ('C+', 14), ('C', 10), ('D', 6), ('F', 6)]
+TOPICS = ['Foundations', 'Systems', 'Analysis', 'Design', 'Methods', 'Theory', 'Applications', 'Laboratory',
+          'Modelling', 'Optimization', 'Seminar', 'Project']
+LEVELS = ['I', 'II', 'III', 'Advanced', 'Applied', 'Introductory']
+FIRST_NAMES = ['Aarav', 'Aisha', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul',
+               'Riya', 'Rohan', 'Sara', 'Tanvi', 'Vikram', 'Zoya', 'Alex', 'Maria', 'Chen', 'Omar']
+LAST_NAMES = ['Sharma', 'Khan', 'Patel', 'Singh', 'Iyer', 'Das', 'Gupta', 'Reddy', 'Nair', 'Mehta',
+              'Joshi', 'Ali', 'Rao', 'Bose', 'Kapoor', 'Smith', 'Garcia', 'Wang', 'Hassan', 'Silva']
+# Fixed calendar so the same seed always produces the same rows
+SEMESTERS = [f"{term} {year}" for year in range(2021, 2026) for term in ('Spring', 'Fall')]
+CURRENT_SEMESTER = SEMESTERS[-1]
+AUDIT_END = datetime.datetime(2025, 12, 31)
+AUDIT_OPERATIONS = [('SELECT', 'query', 60), ('INSERT', 'enrollments', 12), ('UPDATE', 'enrollments', 10),
+                    ('UPDATE', 'students', 5), ('INSERT', 'students', 4), ('IMPORT', 'enrollments', 2),
+                    ('EXPORT', 'query', 4), ('DELETE', 'enrollments', 3)]
+
+# Same hashes as the seed rows in database/schema.sql (admin123 / user123)
+ADMIN_HASH = '$2b$12$cxl4Q7yXxvQrp.S.f4KbNOX//4arThEzjapmBrcip5MRywsChgEtq'
+USER_HASH = '$2b$12$Q//td0gORW/ed4Yu26aYqeatWo6pEi/73OYLNqvfpkLbCSV97rwnm'
+
+TABLES = ['system_users', 'students', 'faculty', 'courses', 'enrollments', 'audit_log', 'row_changes', 'operations']
+
+
+def connect():
+    return psycopg.connect(make_conninfo(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        dbname=os.getenv('DB_NAME', 'mydb'),
+        user=os.getenv('DB_USER', 'user'),
+        password=os.getenv('DB_PASSWORD', 'password')
+    ))
+
+
+def weighted(rng, choices):
+    values, weights = zip(*[(c[:-1] if len(c) > 2 else c[0], c[-1]) for c in choices])
+    return lambda: rng.choices(values, weights)[0]
+
+
+class Dataset:
+    """Builds rows table by table; ids are assigned in order so foreign keys need no lookups."""
+
+    def __init__(self, students, seed=42):
+        self.rng = random.Random(seed)
+        self.n_students = max(1, students)
+        self.n_faculty = max(1, self.n_students // 25)
+        self.n_courses = max(3, self.n_faculty * 2)
+        self.department = weighted(self.rng, DEPARTMENTS)
+        self.created = datetime.datetime(2021, 1, 1)
+        self.student_users = []
+        self.faculty_users = []
+        self.faculty_by_department = {}
+        self.faculty_department = {}
+        self.courses_by_department = {}
+        self.counts = {}
+
+    def _name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def _created_at(self):
+        return self.created + datetime.timedelta(seconds=self.rng.randrange(5 * 365 * 86400))
+
+    def users(self):
+        # admin = 1, student1 = 2, faculty1 = 3 as in the seed data; then the remaining students and faculty
+        yield (1, 'admin', ADMIN_HASH, 'admin', 'admin@university.edu', 'Admin User', True, self.created, None)
+        yield (2, 'student1', USER_HASH, 'student', 'student1@university.edu', 'John Doe', True, self.created, None)
+        yield (3, 'faculty1', USER_HASH, 'faculty', 'faculty1@university.edu', 'Dr. Jane Smith', True, self.created, None)
+        self.student_users = [2]
+        self.faculty_users = [3]
+        user_id = 3
+        for role, count, ids in (('student', self.n_students, self.student_users),
+                                 ('faculty', self.n_faculty, self.faculty_users)):
+            for k in range(2, count + 1):
+                user_id += 1
+                ids.append(user_id)
+                username = f"{role}{k}"
+                created = self._created_at()
+                last_login = created + datetime.timedelta(days=self.rng.randrange(30)) if self.rng.random() < 0.7 else None
+                name = self._name() if role == 'student' else f"Dr. {self._name()}"
+                yield (user_id, username, USER_HASH, role, f"{username}@university.edu", name,
+                       self.rng.random() > 0.02, created, last_login)
+        self.counts['system_users'] = user_id
+
+    def students(self):
+        for k, user_id in enumerate(self.student_users, 1):
+            if k == 1:
+                department, year, cgpa, roll = 'Computer Science', 3, 8.5, 'CS2021001'
+            else:
+                department, prefix = self.department()
+                year = self.rng.randint(1, 4)
+                cgpa = None if self.rng.random() < 0.03 else round(min(9.99, max(4.0, self.rng.gauss(7.5, 1.0))), 2)
+                roll = f"{prefix}{2026 - year}{k:07d}"
+            yield (k, user_id, roll, department, year, cgpa)
+        self.counts['students'] = len(self.student_users)
+
+    def faculty(self):
+        designation = weighted(self.rng, DESIGNATIONS)
+        for j, user_id in enumerate(self.faculty_users, 1):
+            if j == 1:
+                department, row = 'Computer Science', (1, user_id, 'FAC001', 'Computer Science', 'Professor')
+            else:
+                department = self.department()[0]
+                row = (j, user_id, f"FAC{j:06d}", department, designation())
+            self.faculty_by_department.setdefault(department, []).append(j)
+            self.faculty_department[j] = department
+            yield row
+        self.counts['faculty'] = len(self.faculty_users)
+
+    def courses(self):
+        seeded = ['Introduction to Programming', 'Data Structures', 'Database Systems']
+        numbers = {}
+        for course_id in range(1, self.n_courses + 1):
+            if course_id <= len(seeded):
+                department, prefix = 'Computer Science', 'CS'
+                name, credits, faculty_id = seeded[course_id - 1], 4 if course_id < 3 else 3, 1
+            else:
+                department, prefix = self.department()
+                name = f"{department} {self.rng.choice(TOPICS)} {self.rng.choice(LEVELS)}"
+                credits = self.rng.randint(2, 4)
+                candidates = self.faculty_by_department.get(department) or list(self.faculty_department)
+                # A few courses have no instructor assigned yet
+                faculty_id = None if self.rng.random() < 0.03 else self.rng.choice(candidates)
+            number = numbers.get(prefix, 101)
+            numbers[prefix] = number + 1
+            self.courses_by_department.setdefault(department, []).append(course_id)
+            yield (course_id, f"{prefix}{number}", name, credits, faculty_id, department)
+        self.counts['courses'] = self.n_courses
+
+    def enrollments(self, student_departments):
+        grade = weighted(self.rng, GRADES)
+        all_courses = range(1, self.n_courses + 1)
+        enrollment_id = 0
+        for student_id, (department, year) in enumerate(student_departments, 1):
+            if student_id == 1:
+                rows = [(1, 'A', 'Fall 2023'), (2, 'B+', 'Spring 2024')]
+            else:
+                # Mostly courses of the student's own department, spread over the semesters they attended
+                own = self.courses_by_department.get(department) or all_courses
+                semesters = SEMESTERS[-2 * year:]
+                chosen = set()
+                for _ in range(self.rng.randint(4, 12)):
+                    chosen.add(self.rng.choice(own) if self.rng.random() < 0.75 else self.rng.choice(all_courses))
+                rows = []
+                for course_id in sorted(chosen):
+                    semester = self.rng.choice(semesters)
+                    rows.append((course_id, None if semester == CURRENT_SEMESTER else grade(), semester))
+            for course_id, letter, semester in rows:
+                enrollment_id += 1
+                yield (enrollment_id, student_id, course_id, letter, semester)
+        self.counts['enrollments'] = enrollment_id
+
+    def audit_log(self, usernames):
+        operation = weighted(self.rng, AUDIT_OPERATIONS)
+        count = self.n_students * 2
+        span = 365 * 86400
+        for log_id in range(1, count + 1):
+            op, table = operation()
+            executed_at = AUDIT_END - datetime.timedelta(seconds=self.rng.randrange(span))
+            status = 'FAILED' if self.rng.random() < 0.03 else 'SUCCESS'
+            yield (log_id, op, table, self.rng.choice(usernames), executed_at, status)
+        self.counts['audit_log'] = count
+
+
+def copy_rows(cur, table, columns, rows):
+    started = time.perf_counter()
+    with cur.copy(sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns)))) as copy:
+        for row in rows:
+            copy.write_row(row)
+    print(f"  {table}: {time.perf_counter() - started:.1f}s")
+
+
+def generate(conn, students, seed=42):
+    """Replaces the data in every application table; returns the row count per table."""
+    data = Dataset(students, seed)
+    with conn.cursor() as cur:
+        # The generated rows are the baseline, not operations anyone could revert
+        cur.execute("SET LOCAL app.row_capture = off")
+        cur.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(
+            sql.SQL(', ').join(map(sql.Identifier, TABLES))))
+        # Monthly partitions for the audit rows, so they do not all land in audit_log_default
+        month = datetime.date(AUDIT_END.year - 1, AUDIT_END.month, 1)
+        while month <= AUDIT_END.date():
+            cur.execute("SELECT create_audit_log_partition(%s)", [month])
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+        copy_rows(cur, 'system_users', ['user_id', 'username', 'password_hash', 'role', 'email', 'full_name',
+                                        'is_active', 'created_at', 'last_login'], data.users())
+        students_rows = list(data.students())
+        copy_rows(cur, 'students', ['student_id', 'user_id', 'roll_number', 'department', 'year', 'cgpa'], students_rows)
+        copy_rows(cur, 'faculty', ['faculty_id', 'user_id', 'employee_id', 'department', 'designation'], data.faculty())
+        copy_rows(cur, 'courses', ['course_id', 'course_code', 'course_name', 'credits', 'faculty_id', 'department'],
+                  data.courses())
+        copy_rows(cur, 'enrollments', ['enrollment_id', 'student_id', 'course_id', 'grade', 'semester'],
+                  data.enrollments([(row[3], row[4]) for row in students_rows]))
+        usernames = ['admin'] + [f"faculty{j}" for j in range(1, min(data.n_faculty, 200) + 1)]
+        copy_rows(cur, 'audit_log', ['log_id', 'operation', 'table_name', 'executed_by', 'executed_at', 'status'],
+                  data.audit_log(usernames))
+
+        for table, column in (('system_users', 'user_id'), ('students', 'student_id'), ('faculty', 'faculty_id'),
+                              ('courses', 'course_id'), ('enrollments', 'enrollment_id'), ('audit_log', 'log_id')):
+            cur.execute(sql.SQL("SELECT setval(pg_get_serial_sequence(%s, %s), (SELECT max({}) FROM {}))").format(
+                sql.Identifier(column), sql.Identifier(table)), [table, column])
+        cur.execute("SELECT matviewname FROM pg_matviews WHERE schemaname = 'public'")
+        for (view,) in cur.fetchall():
+            cur.execute(sql.SQL("REFRESH MATERIALIZED VIEW {}").format(sql.Identifier(view)))
+    conn.commit()
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.commit()
+    return dict(data.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replace the database contents with a synthetic dataset")
+    parser.add_argument('--scale', choices=list(SCALES), default='10k', help="approximate total row count")
+    parser.add_argument('--students', type=int, help="exact student count (overrides --scale)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--yes', action='store_true', help="confirm that existing data may be deleted")
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("this deletes all users, courses, enrollments and audit logs; pass --yes to continue")
+
+    started = time.perf_counter()
+    with connect() as conn:
+        counts = generate(conn, args.students or SCALES[args.scale], args.seed)
+    print(f"Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s: "
+          + ', '.join(f"{table}={count:,}" for table, count in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
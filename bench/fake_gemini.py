@@ -0,0 +1,107 @@
+# Stand-in for the Gemini generateContent API: canned NL -> SQL answers with configurable latency and errors
+# Point the backend at it with GEMINI_BASE_URL=http://127.0.0.1:8765 (any GEMINI_API_KEY works)
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+# (pattern matched against the request text, answer); the first match wins, the last entry is the fallback
+CANNED = [
+    (r'\bcredits?\b', {
+        "operation": "select", "table": "courses",
+        "query": "SELECT course_code, course_name, credits FROM courses ORDER BY credits DESC",
+        "explanation": "Courses ordered by credits"}),
+    (r'\bdepartments?\b', {
+        "operation": "select", "table": "students",
+        "query": "SELECT department, COUNT(*) AS students, ROUND(AVG(cgpa), 2) AS avg_cgpa FROM students GROUP BY department",
+        "explanation": "Students and average CGPA per department"}),
+    (r'\bgrades?\b', {
+        "operation": "select", "table": "enrollments",
+        "query": "SELECT grade, COUNT(*) AS enrollments FROM enrollments WHERE grade IS NOT NULL GROUP BY grade ORDER BY grade",
+        "explanation": "Number of enrollments per grade"}),
+    (r'\bfaculty\b|\bprofessors?\b', {
+        "operation": "select", "table": "faculty",
+        "query": "SELECT f.employee_id, su.full_name, f.department, f.designation FROM faculty f "
+                 "JOIN system_users su ON f.user_id = su.user_id",
+        "explanation": "Faculty members with their departments"}),
+    (r'', {
+        "operation": "select", "table": "courses",
+        "query": "SELECT course_code, course_name, department FROM courses ORDER BY course_code",
+        "explanation": "All courses"})
+]
+
+app = FastAPI(title="Fake Gemini")
+config = {"latency_ms": 300.0, "jitter_ms": 100.0, "error_rate": 0.0}
+counters = {"calls": 0, "errors": 0, "batched_items": 0}
+
+
+def answer(text):
+    for pattern, plan in CANNED:
+        if re.search(pattern, text, re.IGNORECASE):
+            return {**plan, "procedure": None, "params": []}
+
+
+def request_texts(body):
+    # The backend sends "Query: <text>" once per request, or once per item in a micro-batch
+    contents = json.dumps(body.get('contents', ''))
+    return re.findall(r'Query: (.*?)(?:\\n|")', contents) or ['']
+
+
+@app.post("/control")
+async def control(request: Request):
+    """Changes latency_ms, jitter_ms or error_rate while a run is in progress."""
+    config.update({k: float(v) for k, v in (await request.json()).items() if k in config})
+    return {**config, **counters}
+
+
+@app.get("/stats")
+async def stats():
+    return {**config, **counters}
+
+
+@app.post("/{path:path}")
+async def generate_content(path: str, request: Request):
+    body = await request.json()
+    counters["calls"] += 1
+    delay = max(0.0, random.gauss(config["latency_ms"], config["jitter_ms"])) / 1000
+    await asyncio.sleep(delay)
+    if random.random() < config["error_rate"]:
+        counters["errors"] += 1
+        return JSONResponse({"error": {"code": 503, "message": "The model is overloaded", "status": "UNAVAILABLE"}},
+                            status_code=503)
+    texts = request_texts(body)
+    schema = body.get('generationConfig', {}).get('responseSchema') or {}
+    if str(schema.get('type', '')).upper() == 'ARRAY':
+        counters["batched_items"] += len(texts)
+        text = json.dumps([answer(t) for t in texts])
+    else:
+        text = json.dumps(answer(texts[-1]))
+    prompt_tokens = len(json.dumps(body)) // 4
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4,
+                          "totalTokenCount": prompt_tokens + len(text) // 4}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini generateContent server for load tests")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=config["latency_ms"], help="mean response latency")
+    parser.add_argument('--jitter-ms', type=float, default=config["jitter_ms"], help="standard deviation of the latency")
+    parser.add_argument('--error-rate', type=float, default=config["error_rate"], help="fraction of calls answered with 503")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
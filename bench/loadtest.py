@@ -0,0 +1,301 @@
+# End-to-end load test: scripted mixes of API traffic at a fixed concurrency, with latency percentiles,
+# throughput and error rates per operation, saved as JSON and compared against a stored baseline
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seeded demo accounts; virtual users take them in turn
+ACCOUNTS = [('admin', 'admin123'), ('student1', 'user123'), ('faculty1', 'user123')]
+
+# Phrased so the fast path does not answer them and each one reaches the (fake) LLM once
+QUESTIONS = [
+    "which courses carry the most credits",
+    "how many students are there in each department",
+    "how are grades spread across all enrollments",
+    "who are the faculty members and which departments are they in",
+    "give me an overview of the course catalogue"
+]
+
+MIN_COMPARE_SAMPLES = 50
+
+# Relative weights of the operations each virtual user picks from after logging in
+MIXES = {
+    'default': {'query': 40, 'profile': 25, 'schema': 15, 'audit_logs': 15, 'login': 5},
+    'nl_heavy': {'query': 80, 'profile': 10, 'schema': 10},
+    'read_only': {'profile': 50, 'schema': 25, 'audit_logs': 25}
+}
+
+
+class Recorder:
+    """Keeps samples that complete inside the measured window (after warmup, before the deadline)."""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.samples = {}
+
+    def add(self, operation, seconds, ok, status):
+        if self.start <= time.monotonic() <= self.end:
+            self.samples.setdefault(operation, []).append((seconds, ok, status))
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples, duration):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    errors = sum(1 for _, ok, _ in samples if not ok)
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "rps": round(len(samples) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "statuses": statuses
+    }
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, account, mix, rng, fresh_questions):
+        self.client = client
+        self.recorder = recorder
+        self.username, self.password = account
+        self.mix = mix
+        self.rng = rng
+        self.fresh_questions = fresh_questions
+        self.headers = {}
+
+    async def request(self, operation, method, path, ok_statuses=(200,), **kwargs):
+        headers = {**self.headers, "X-Request-ID": uuid.uuid4().hex}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.recorder.add(operation, time.perf_counter() - started, status in ok_statuses, status)
+        return response if status in ok_statuses else None
+
+    async def login(self):
+        response = await self.request('login', 'POST', '/auth/login',
+                                      json={"username": self.username, "password": self.password})
+        if response is not None:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            self.role = response.json()['role']
+        return response is not None
+
+    async def query(self):
+        text = self.rng.choice(QUESTIONS)
+        if self.fresh_questions:
+            # A new wording every time defeats the translation cache, so every preview calls the LLM
+            text = f"{text} (ref {uuid.uuid4().hex[:8]})"
+        started = time.perf_counter()
+        preview = await self.request('query_preview', 'POST', '/query', json={"text": text})
+        plan_id = preview.json().get('plan_id') if preview is not None else None
+        confirmed = plan_id is not None and await self.request(
+            'query_confirm', 'POST', '/query', json={"text": text, "confirm": True, "plan_id": plan_id}) is not None
+        self.recorder.add('query', time.perf_counter() - started, confirmed, 200 if confirmed else 'failed')
+
+    async def profile(self):
+        await self.request('profile', 'GET', '/profile')
+
+    async def schema(self):
+        await self.request('schema', 'GET', '/schema')
+
+    async def audit_logs(self):
+        await self.request('audit_logs', 'GET', '/audit-logs', params={"limit": 50})
+
+    async def run(self, deadline):
+        if not await self.login():
+            return
+        # The audit log is readable by admins only
+        mix = {op: weight for op, weight in self.mix.items() if op != 'audit_logs' or self.role == 'admin'}
+        operations, weights = list(mix), list(mix.values())
+        while time.monotonic() < deadline:
+            operation = self.rng.choices(operations, weights)[0]
+            await getattr(self, operation)()
+
+
+async def server_stats(client):
+    # Server-side counters (LLM calls, cache hit rates, pool use) to store alongside the client view
+    username, password = ACCOUNTS[0]
+    try:
+        response = await client.post('/auth/login', json={"username": username, "password": password})
+        token = response.json()['access_token']
+        return (await client.get('/stats', headers={"Authorization": f"Bearer {token}"})).json()
+    except Exception as e:
+        return {"error": str(e)}
+
+
+async def run(args):
+    mix = MIXES[args.mix]
+    measured_from = time.monotonic() + args.warmup
+    deadline = measured_from + args.duration
+    recorder = Recorder(measured_from, deadline)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        users = [VirtualUser(client, recorder, ACCOUNTS[i % len(ACCOUNTS)], mix, random.Random(args.seed + i),
+                             args.fresh_questions) for i in range(args.concurrency)]
+        await asyncio.gather(*(user.run(deadline) for user in users))
+        stats = await server_stats(client)
+    duration = args.duration
+
+    operations = {name: summarize(samples, duration) for name, samples in sorted(recorder.samples.items())}
+    # 'query' is the preview + confirm round trip, already counted by its two HTTP calls
+    http_samples = [s for name, samples in recorder.samples.items() if name != 'query' for s in samples]
+    return {
+        "meta": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration_s": round(duration, 2),
+            "warmup_s": args.warmup,
+            "fresh_questions": args.fresh_questions,
+            "url": args.url,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        "total": summarize(http_samples, duration),
+        "operations": operations,
+        "server": stats
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def print_report(result):
+    meta = result['meta']
+    print(f"mix={meta['mix']} concurrency={meta['concurrency']} duration={meta['duration_s']}s commit={meta['commit']}")
+    print(f"{'operation':<16}{'requests':>10}{'rps':>10}{'errors':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in list(result['operations'].items()) + [('TOTAL', result['total'])]:
+        print(f"{name:<16}{row['requests']:>10}{row['rps']:>10}{row['error_rate']:>9.2%}"
+              f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+
+def compare(result, baseline, tolerance):
+    """Returns one message per metric that is worse than the baseline by more than the tolerance."""
+    regressions = []
+    rows = [('TOTAL', result['total'], baseline.get('total'))] + [
+        (name, row, baseline.get('operations', {}).get(name)) for name, row in result['operations'].items()]
+    for name, row, base in rows:
+        # Tail percentiles of a handful of samples are noise
+        if not base or min(row['requests'], base['requests']) < MIN_COMPARE_SAMPLES:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if base[metric] and row[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name} {metric} {row[metric]} > baseline {base[metric]}")
+        if base['rps'] and row['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name} rps {row['rps']} < baseline {base['rps']}")
+        if row['error_rate'] > base['error_rate'] + 0.01:
+            regressions.append(f"{name} error_rate {row['error_rate']} > baseline {base['error_rate']}")
+    return regressions
+
+
+def wait_for(url, timeout=60):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_stack(args):
+    """Starts the fake LLM and the backend (against the database configured in .env)."""
+    fake_port = args.llm_port
+    processes = [subprocess.Popen([sys.executable, os.path.join(ROOT, 'bench', 'fake_gemini.py'),
+                                   '--port', str(fake_port), '--latency-ms', str(args.llm_latency_ms),
+                                   '--jitter-ms', str(args.llm_jitter_ms), '--error-rate', str(args.llm_error_rate),
+                                   '--seed', str(args.seed)])]
+    wait_for(f"http://127.0.0.1:{fake_port}/stats")
+    env = {**os.environ, "GEMINI_BASE_URL": f"http://127.0.0.1:{fake_port}",
+           "GEMINI_API_KEY": os.getenv('GEMINI_API_KEY', 'bench')}
+    port = httpx.URL(args.url).port or 8000
+    processes.append(subprocess.Popen([sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port),
+                                       '--workers', str(args.workers), '--log-level', 'warning'],
+                                      cwd=os.path.join(ROOT, 'backend'), env=env))
+    wait_for(f"{args.url}/health")
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend with a scripted traffic mix")
+    parser.add_argument('--url', default=os.getenv('BENCH_URL', 'http://127.0.0.1:8000'))
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--concurrency', type=int, default=20, help="virtual users")
+    parser.add_argument('--duration', type=float, default=30, help="measured seconds")
+    parser.add_argument('--warmup', type=float, default=5, help="seconds of traffic before measuring")
+    parser.add_argument('--timeout', type=float, default=30, help="per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--fresh-questions', action='store_true', help="make every question unique to bypass caches")
+    parser.add_argument('--out', help="write the result as JSON")
+    parser.add_argument('--baseline', help="compare against this result file; exit 1 on regression")
+    parser.add_argument('--save-baseline', help="write the result to this path as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument('--start', action='store_true', help="start the fake LLM and the backend first")
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn workers when using --start")
+    parser.add_argument('--llm-port', type=int, default=8765, help="fake LLM port when using --start")
+    parser.add_argument('--llm-latency-ms', type=float, default=300)
+    parser.add_argument('--llm-jitter-ms', type=float, default=100)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    processes = start_stack(args) if args.start else []
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    print_report(result)
+    for path in (args.out, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
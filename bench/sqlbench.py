@@ -0,0 +1,294 @@
+# SQL-level benchmark of the stored procedures and the prompt's example SELECTs on synthetic data
+#
+#   python bench/sqlbench.py --scales 10k,100k --yes --out bench/results/sql.json
+#   python bench/sqlbench.py --no-generate --baseline bench/results/sql.json
+#
+# For every case it records latency percentiles over repeated calls and EXPLAIN (ANALYZE, BUFFERS)
+# plans. For PL/pgSQL functions the plans are of the statements inside the function body, which
+# is where the work happens; a plain EXPLAIN of the call only shows a Function Scan.
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from psycopg import sql
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+from datagen import SCALES, TABLES, CURRENT_SEMESTER, connect, generate
+from gemini_parser import EXAMPLES
+from translation_cache import USER_PLACEHOLDER
+
+GRADES = ['O', 'A+', 'A', 'B+', 'B', 'C+', 'C', 'D', 'F']
+# Statements in a function body that touch a table (skips the SELECT TRUE, '...' status rows)
+BODY_STATEMENT = re.compile(r"(?<![\w'])((?:(?:SELECT|DELETE)\b[^;]*?\bFROM|INSERT\s+INTO|UPDATE)\b[^;]*);",
+                            re.IGNORECASE)
+
+
+class Case:
+    def __init__(self, name, query, params=None, function=None):
+        self.name = name
+        self.query = query
+        # params(cur, rng, ids) -> list of arguments for one call
+        self.params = params or (lambda cur, rng, ids: [])
+        self.function = function
+
+
+def _user_of_student(cur, student_id):
+    cur.execute("SELECT user_id FROM students WHERE student_id = %s", [student_id])
+    return cur.fetchone()[0]
+
+
+def procedure_cases():
+    return [
+        Case('get_student_courses', "SELECT * FROM get_student_courses(%s)",
+             lambda cur, rng, ids: [rng.randint(1, ids['students'])], 'get_student_courses'),
+        Case('get_faculty_courses', "SELECT * FROM get_faculty_courses(%s)",
+             lambda cur, rng, ids: [rng.randint(1, ids['faculty'])], 'get_faculty_courses'),
+        Case('get_course_enrollments', "SELECT * FROM get_course_enrollments(%s)",
+             lambda cur, rng, ids: [rng.randint(1, ids['courses'])], 'get_course_enrollments'),
+        Case('get_my_profile', "SELECT * FROM get_my_profile(%s, %s)",
+             lambda cur, rng, ids: [_user_of_student(cur, rng.randint(1, ids['students'])), 'student'],
+             'get_my_profile'),
+        # Every call is rolled back, so the writes leave the data the same between calls
+        Case('update_grade', "SELECT * FROM update_grade(%s, %s, %s)",
+             lambda cur, rng, ids: [rng.randint(1, ids['enrollments']), rng.choice(GRADES), 'admin'],
+             'update_grade'),
+        Case('enroll_student', "SELECT * FROM enroll_student(%s, %s, %s, %s)",
+             lambda cur, rng, ids: [rng.randint(1, ids['students']), rng.randint(1, ids['courses']),
+                                    CURRENT_SEMESTER, 'admin'],
+             'enroll_student')
+    ]
+
+
+def example_cases():
+    cases = []
+    for question, answer in EXAMPLES:
+        if not answer.upper().startswith('SELECT'):
+            continue
+        username = 'faculty1' if 'faculty)' in question else 'student1'
+        cases.append(Case(f"example: {question}", answer.replace(USER_PLACEHOLDER, username).replace('%', '%%')))
+    return cases
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def table_ids(cur):
+    ids = {}
+    for table, column in (('students', 'student_id'), ('faculty', 'faculty_id'), ('courses', 'course_id'),
+                          ('enrollments', 'enrollment_id')):
+        cur.execute(sql.SQL("SELECT coalesce(max({}), 1) FROM {}").format(sql.Identifier(column), sql.Identifier(table)))
+        ids[table] = cur.fetchone()[0]
+    return ids
+
+
+def row_counts(cur):
+    counts = {}
+    for table in TABLES:
+        cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(table)))
+        counts[table] = cur.fetchone()[0]
+    return counts
+
+
+def function_body(cur, function):
+    cur.execute("SELECT prosrc, proargnames FROM pg_proc WHERE proname = %s ORDER BY oid DESC LIMIT 1", [function])
+    row = cur.fetchone()
+    return (row[0], row[1] or []) if row else (None, [])
+
+
+def inner_statements(cur, case, params):
+    """The statements inside a function body with its arguments bound, or the case's own query."""
+    if case.function is None:
+        return [(case.query, params)]
+    body, argnames = function_body(cur, case.function)
+    if body is None:
+        return []
+    values = dict(zip(argnames, params))
+    statements = []
+    for match in BODY_STATEMENT.finditer(body):
+        statement = match.group(1).replace('%', '%%')
+        names = [name for name in re.findall(r'\b(p_\w+)\b', statement) if name in values]
+        statements.append((re.sub(r'\b(p_\w+)\b', lambda m: f"%({m.group(1)})s" if m.group(1) in values else m.group(1),
+                                  statement), {name: values[name] for name in names}))
+    return statements
+
+
+def summarize_plan(plan):
+    nodes, seq_scans = [], []
+
+    def walk(node):
+        nodes.append(node['Node Type'])
+        if node['Node Type'] == 'Seq Scan':
+            seq_scans.append(node.get('Relation Name'))
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan['Plan'])
+    return {
+        "planning_ms": plan.get('Planning Time'),
+        "execution_ms": plan.get('Execution Time'),
+        "total_cost": plan['Plan'].get('Total Cost'),
+        "rows": plan['Plan'].get('Actual Rows'),
+        "shared_hit": plan['Plan'].get('Shared Hit Blocks'),
+        "shared_read": plan['Plan'].get('Shared Read Blocks'),
+        "nodes": nodes,
+        "seq_scans": sorted(set(filter(None, seq_scans)))
+    }
+
+
+def explain(conn, case, params):
+    plans = []
+    with conn.cursor() as cur:
+        for statement, values in inner_statements(cur, case, params):
+            try:
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", values or None)
+                plan = cur.fetchone()[0][0]
+                plans.append({"statement": ' '.join(statement.split()), **summarize_plan(plan), "plan": plan})
+            except Exception as e:
+                plans.append({"statement": ' '.join(statement.split()), "error": str(e).strip()})
+            conn.rollback()
+    return plans
+
+
+def run_case(conn, case, ids, iterations, warmup, rng):
+    timings = []
+    errors = 0
+    with conn.cursor() as cur:
+        for i in range(warmup + iterations):
+            params = case.params(cur, rng, ids)
+            started = time.perf_counter()
+            try:
+                cur.execute(case.query, params or None)
+                cur.fetchall()
+            except Exception:
+                errors += 1
+            elapsed = time.perf_counter() - started
+            conn.rollback()
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+        sample = case.params(cur, rng, ids)
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3) if timings else 0.0,
+        "plans": explain(conn, case, sample)
+    }
+
+
+def benchmark(conn, iterations, warmup, seed):
+    with conn.cursor() as cur:
+        ids = table_ids(cur)
+        counts = row_counts(cur)
+    conn.rollback()
+    rng = random.Random(seed)
+    cases = {}
+    for case in procedure_cases() + example_cases():
+        cases[case.name] = run_case(conn, case, ids, iterations, warmup, rng)
+        result = cases[case.name]
+        seq = sorted({t for plan in result['plans'] for t in plan.get('seq_scans', [])})
+        print(f"  {case.name:<60} p50 {result['p50_ms']:>8} ms  p95 {result['p95_ms']:>8} ms"
+              + (f"  seq scans: {', '.join(seq)}" if seq else ''))
+    return {"rows": counts, "cases": cases}
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Latency regressions beyond the tolerance, plus sequential scans gained or lost, per scale and case."""
+    regressions, plan_changes = [], []
+    if not set(result['scales']) & set(baseline.get('scales', {})):
+        regressions.append(f"no scale in common with the baseline ({', '.join(baseline.get('scales', {}))})")
+    for scale, current in result['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if not previous:
+            continue
+        for name, case in current['cases'].items():
+            base = previous['cases'].get(name)
+            if not base:
+                continue
+            # Sub-millisecond swings are timer and scheduling noise, whatever their ratio
+            if case['p95_ms'] > base['p95_ms'] * (1 + tolerance) and case['p95_ms'] - base['p95_ms'] >= min_delta_ms:
+                regressions.append(f"[{scale}] {name} p95 {case['p95_ms']} ms > baseline {base['p95_ms']} ms")
+            before = {t for plan in base['plans'] for t in plan.get('seq_scans', [])}
+            after = {t for plan in case['plans'] for t in plan.get('seq_scans', [])}
+            if after - before:
+                plan_changes.append(f"[{scale}] {name} now seq scans {', '.join(sorted(after - before))}")
+            if before - after:
+                plan_changes.append(f"[{scale}] {name} no longer seq scans {', '.join(sorted(before - after))}")
+    return regressions, plan_changes
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stored procedures and example queries at several data scales")
+    parser.add_argument('--scales', default='10k,100k', help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--no-generate', action='store_true', help="benchmark the data already in the database")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--yes', action='store_true', help="confirm that generating data may delete existing data")
+    parser.add_argument('--out', help="write the result as JSON")
+    parser.add_argument('--baseline', help="compare against this result file; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative p95 regression (default 0.25)")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="ignore p95 increases smaller than this")
+    args = parser.parse_args()
+    scales = ['current'] if args.no_generate else [s.strip() for s in args.scales.split(',') if s.strip()]
+    for scale in scales:
+        if scale != 'current' and scale not in SCALES:
+            parser.error(f"unknown scale {scale}, expected one of {', '.join(SCALES)}")
+    if not args.no_generate and not args.yes:
+        parser.error("generating data deletes all users, courses, enrollments and audit logs; pass --yes or --no-generate")
+
+    result = {"meta": {"commit": git_commit(), "iterations": args.iterations, "seed": args.seed,
+                       "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}, "scales": {}}
+    with connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            result['meta']['postgres'] = cur.fetchone()[0]
+        conn.rollback()
+        for scale in scales:
+            if scale != 'current':
+                print(f"Generating {scale}")
+                started = time.perf_counter()
+                generate(conn, SCALES[scale], args.seed)
+                print(f"  done in {time.perf_counter() - started:.1f}s")
+            print(f"Benchmarking {scale}")
+            result['scales'][scale] = benchmark(conn, args.iterations, args.warmup, args.seed)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, plan_changes = compare(result, json.load(f), args.tolerance, args.min_delta_ms)
+        for message in plan_changes:
+            print(f"PLAN CHANGE: {message}")
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+-- Converts an existing audit_log into a table range-partitioned by month.
+-- Safe to run more than once: the conversion is skipped when audit_log is already partitioned.
+
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'audit_log' AND relkind = 'r') THEN
+        ALTER TABLE audit_log RENAME TO audit_log_legacy;
+        ALTER TABLE audit_log_legacy DROP CONSTRAINT IF EXISTS audit_log_pkey;
+
+        CREATE TABLE audit_log (
+            log_id INTEGER NOT NULL DEFAULT nextval('audit_log_log_id_seq'),
+            operation VARCHAR(50) NOT NULL,
+            table_name VARCHAR(100) NOT NULL,
+            executed_by VARCHAR(100) NOT NULL,
+            executed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            status VARCHAR(20) NOT NULL,
+            PRIMARY KEY (executed_at, log_id)
+        ) PARTITION BY RANGE (executed_at);
+        ALTER SEQUENCE audit_log_log_id_seq OWNED BY audit_log.log_id;
+
+        CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+        CREATE INDEX idx_audit_log_executed_by ON audit_log (executed_by, executed_at DESC);
+        CREATE INDEX idx_audit_log_table_name ON audit_log (table_name, executed_at DESC);
+
+        FOR v_month IN
+            SELECT DISTINCT date_trunc('month', executed_at)::DATE
+            FROM audit_log_legacy
+            WHERE executed_at IS NOT NULL
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+                format('audit_log_p%s', to_char(v_month, 'YYYYMM')), v_month, (v_month + INTERVAL '1 month')::DATE
+            );
+        END LOOP;
+
+        INSERT INTO audit_log (log_id, operation, table_name, executed_by, executed_at, status)
+        SELECT log_id, operation, table_name, executed_by, COALESCE(executed_at, CURRENT_TIMESTAMP), status
+        FROM audit_log_legacy;
+
+        DROP TABLE audit_log_legacy;
+
+        ALTER TABLE audit_log ENABLE ROW LEVEL SECURITY;
+        CREATE POLICY audit_admin_only ON audit_log
+            FOR SELECT
+            USING (current_setting('app.role', true) = 'admin');
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION create_audit_log_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_name TEXT := format('audit_log_p%s', to_char(p_month, 'YYYYMM'));
+BEGIN
+    IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_start, (v_start + INTERVAL '1 month')::DATE
+        );
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ensure_audit_log_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM create_audit_log_partition((date_trunc('month', CURRENT_DATE) + make_interval(months => i))::DATE);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detaches monthly partitions older than p_keep_months. Detached tables keep their
+-- name so they can be dumped to cold storage; p_drop removes them instead.
+CREATE OR REPLACE FUNCTION archive_audit_log_partitions(p_keep_months INTEGER DEFAULT 12, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS TABLE(partition_name TEXT, action TEXT) AS $$
+DECLARE
+    v_cutoff TEXT := to_char(date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months), 'YYYYMM');
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname::TEXT
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit_log'::regclass
+            AND c.relname ~ '^audit_log_p[0-9]{6}$'
+            AND substring(c.relname FROM 12) < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE audit_log DETACH PARTITION %I', v_partition);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+            RETURN QUERY SELECT v_partition, 'dropped'::TEXT;
+        ELSE
+            RETURN QUERY SELECT v_partition, 'detached'::TEXT;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_audit_log_partitions(3);
+
+CREATE OR REPLACE FUNCTION log_operation(
+    p_operation VARCHAR,
+    p_table VARCHAR,
+    p_user VARCHAR,
+    p_status VARCHAR
+) RETURNS VOID AS $$
+BEGIN
+    INSERT INTO audit_log (operation, table_name, executed_by, status)
+    VALUES (p_operation, p_table, p_user, p_status);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS get_audit_logs(VARCHAR);
+
+-- Filters are appended only when given so each call gets a plan that can prune
+-- partitions and walk the (executed_at, log_id) primary key backwards.
+CREATE OR REPLACE FUNCTION get_audit_logs(
+    p_role VARCHAR,
+    p_limit INTEGER DEFAULT 100,
+    p_executed_by VARCHAR DEFAULT NULL,
+    p_operation VARCHAR DEFAULT NULL,
+    p_table_name VARCHAR DEFAULT NULL,
+    p_status VARCHAR DEFAULT NULL,
+    p_from TIMESTAMP DEFAULT NULL,
+    p_to TIMESTAMP DEFAULT NULL,
+    p_before_at TIMESTAMP DEFAULT NULL,
+    p_before_id INTEGER DEFAULT NULL
+)
+RETURNS TABLE(
+    log_id INTEGER,
+    operation VARCHAR,
+    table_name VARCHAR,
+    executed_by VARCHAR,
+    executed_at TIMESTAMP,
+    status VARCHAR
+) AS $$
+DECLARE
+    v_sql TEXT := 'SELECT a.log_id, a.operation, a.table_name, a.executed_by, a.executed_at, a.status FROM audit_log a WHERE TRUE';
+BEGIN
+    IF p_role != 'admin' THEN
+        RAISE EXCEPTION 'Only admin can view audit logs';
+    END IF;
+    
+    PERFORM set_config('app.role', 'admin', false);
+    
+    IF p_executed_by IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_by = $1'; END IF;
+    IF p_operation IS NOT NULL THEN v_sql := v_sql || ' AND a.operation = $2'; END IF;
+    IF p_table_name IS NOT NULL THEN v_sql := v_sql || ' AND a.table_name = $3'; END IF;
+    IF p_status IS NOT NULL THEN v_sql := v_sql || ' AND a.status = $4'; END IF;
+    IF p_from IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_at >= $5'; END IF;
+    IF p_to IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_at < $6'; END IF;
+    IF p_before_at IS NOT NULL THEN
+        v_sql := v_sql || ' AND (a.executed_at, a.log_id) < ($7, $8)';
+    END IF;
+    v_sql := v_sql || ' ORDER BY a.executed_at DESC, a.log_id DESC LIMIT $9';
+    
+    RETURN QUERY EXECUTE v_sql
+    USING p_executed_by, p_operation, p_table_name, p_status, p_from, p_to,
+          p_before_at, COALESCE(p_before_id, 2147483647), LEAST(GREATEST(p_limit, 1), 1000);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET app.role = 'admin';
+
@@ -0,0 +1,44 @@
+-- Schema version counter and DDL event triggers used to invalidate the backend's schema catalog.
+-- Event triggers require a superuser.
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_version DEFAULT VALUES ON CONFLICT (id) DO NOTHING;
+
+-- Bumps schema_version and notifies listeners on any DDL outside temporary schemas
+CREATE OR REPLACE FUNCTION notify_schema_change()
+RETURNS event_trigger AS $$
+DECLARE
+    v_version BIGINT;
+BEGIN
+    IF TG_EVENT = 'sql_drop' THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_event_trigger_dropped_objects()
+            WHERE schema_name IS NOT NULL AND schema_name NOT LIKE 'pg_temp%'
+        ) THEN
+            RETURN;
+        END IF;
+    ELSIF NOT EXISTS (
+        SELECT 1 FROM pg_event_trigger_ddl_commands()
+        WHERE schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%'
+    ) THEN
+        RETURN;
+    END IF;
+    
+    UPDATE schema_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    RETURNING version INTO v_version;
+    PERFORM pg_notify('schema_changed', v_version::TEXT);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS schema_change_notify;
+CREATE EVENT TRIGGER schema_change_notify ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_change();
+
+DROP EVENT TRIGGER IF EXISTS schema_drop_notify;
+CREATE EVENT TRIGGER schema_drop_notify ON sql_drop
+    EXECUTE FUNCTION notify_schema_change();
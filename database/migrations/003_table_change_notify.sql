@@ -0,0 +1,25 @@
+-- Statement-level triggers that tell backends which tables changed, so cached
+-- results reading them can be dropped. NOTIFY is delivered on commit and
+-- deduplicated per transaction.
+CREATE OR REPLACE FUNCTION notify_table_change()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('table_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['system_users', 'students', 'faculty', 'courses', 'enrollments'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', v_table || '_notify_change', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()',
+            v_table || '_notify_change', v_table
+        );
+    END LOOP;
+END;
+$$;
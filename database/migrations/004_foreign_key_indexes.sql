@@ -0,0 +1,10 @@
+-- migrate: no-transaction
+-- Secondary indexes for the joins and filters the procedures and generated queries use.
+-- students.user_id, faculty.user_id and system_users.username are already covered by their UNIQUE constraints.
+-- Built CONCURRENTLY so writes are not blocked; each statement runs on its own.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_enrollments_course_id ON enrollments (course_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_courses_faculty_id ON courses (faculty_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_students_department ON students (department);
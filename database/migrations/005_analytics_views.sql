@@ -0,0 +1,79 @@
+-- Materialized aggregates for dashboard-style questions. Each view has a unique
+-- index so it can be refreshed CONCURRENTLY (readers are never blocked); the
+-- backend refreshes them a few seconds after their base tables change.
+CREATE MATERIALIZED VIEW IF NOT EXISTS course_enrollment_stats AS
+SELECT c.course_id, c.course_code, c.course_name, c.department, c.faculty_id, e.semester,
+       COUNT(*) AS enrollment_count,
+       COUNT(e.grade) AS graded_count
+FROM courses c
+JOIN enrollments e ON e.course_id = c.course_id
+GROUP BY c.course_id, e.semester;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_course_enrollment_stats ON course_enrollment_stats (course_id, semester);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grade_distribution AS
+SELECT c.course_id, c.course_code, e.semester, e.grade,
+       COUNT(*) AS student_count
+FROM courses c
+JOIN enrollments e ON e.course_id = c.course_id
+WHERE e.grade IS NOT NULL
+GROUP BY c.course_id, e.semester, e.grade;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_grade_distribution ON grade_distribution (course_id, semester, grade);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS department_cgpa_stats AS
+SELECT department,
+       COUNT(*) AS student_count,
+       COUNT(cgpa) AS rated_count,
+       ROUND(AVG(cgpa), 2) AS avg_cgpa,
+       MIN(cgpa) AS min_cgpa,
+       MAX(cgpa) AS max_cgpa,
+       ROUND(percentile_cont(0.5) WITHIN GROUP (ORDER BY cgpa)::NUMERIC, 2) AS median_cgpa
+FROM students
+GROUP BY department;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_department_cgpa_stats ON department_cgpa_stats (department);
+
+-- Refreshes one analytics view and tells every backend's result cache about it.
+-- Returns FALSE without waiting when another session is already refreshing it.
+CREATE OR REPLACE FUNCTION refresh_analytics_view(p_view TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    IF p_view NOT IN ('course_enrollment_stats', 'grade_distribution', 'department_cgpa_stats') THEN
+        RAISE EXCEPTION 'Unknown analytics view: %', p_view;
+    END IF;
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_view'), hashtext(p_view)) THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY %I', p_view);
+    PERFORM pg_notify('table_changed', p_view);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Refreshing a materialized view changes data, not schema; don't bump schema_version for it
+CREATE OR REPLACE FUNCTION notify_schema_change()
+RETURNS event_trigger AS $$
+DECLARE
+    v_version BIGINT;
+BEGIN
+    IF TG_EVENT = 'sql_drop' THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_event_trigger_dropped_objects()
+            WHERE schema_name IS NOT NULL AND schema_name NOT LIKE 'pg_temp%'
+        ) THEN
+            RETURN;
+        END IF;
+    ELSIF NOT EXISTS (
+        SELECT 1 FROM pg_event_trigger_ddl_commands()
+        WHERE (schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%')
+            AND command_tag <> 'REFRESH MATERIALIZED VIEW'
+    ) THEN
+        RETURN;
+    END IF;
+
+    UPDATE schema_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    RETURNING version INTO v_version;
+    PERFORM pg_notify('schema_changed', v_version::TEXT);
+END;
+$$ LANGUAGE plpgsql;
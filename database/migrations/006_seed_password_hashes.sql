@@ -0,0 +1,11 @@
+-- The seed accounts shipped with hashes that matched none of the documented
+-- passwords. Give them real bcrypt hashes (admin / admin123, student1 and
+-- faculty1 / user123), but only where the original placeholder is still set.
+UPDATE system_users SET password_hash = '$2b$12$cxl4Q7yXxvQrp.S.f4KbNOX//4arThEzjapmBrcip5MRywsChgEtq'
+WHERE username = 'admin' AND password_hash = '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5oe2K7xpkJu9u';
+
+UPDATE system_users SET password_hash = '$2b$12$Q//td0gORW/ed4Yu26aYqeatWo6pEi/73OYLNqvfpkLbCSV97rwnm'
+WHERE username = 'student1' AND password_hash = '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW';
+
+UPDATE system_users SET password_hash = '$2b$12$pbIRENQ8GwFkeeZT2txNWeGcEZLGrJ2frxdeQg/rq12oCgbxqaUOK'
+WHERE username = 'faculty1' AND password_hash = '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW';
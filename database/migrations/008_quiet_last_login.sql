@@ -0,0 +1,13 @@
+-- Writes that no cached result depends on (the batched last_login update) can skip
+-- the change notification with SET app.table_notify = off, so they do not flush
+-- every cached read of system_users.
+CREATE OR REPLACE FUNCTION notify_table_change()
+RETURNS trigger AS $$
+BEGIN
+    IF current_setting('app.table_notify', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('table_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
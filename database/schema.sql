@@ -6,6 +6,9 @@ DROP TABLE IF EXISTS faculty CASCADE;
 DROP TABLE IF EXISTS students CASCADE;
 DROP TABLE IF EXISTS audit_log CASCADE;
 DROP TABLE IF EXISTS system_users CASCADE;
+DROP TABLE IF EXISTS row_changes CASCADE;
+DROP TABLE IF EXISTS operations CASCADE;
+DROP SEQUENCE IF EXISTS row_changes_seq;
 
 CREATE TABLE system_users (
     user_id SERIAL PRIMARY KEY,
@@ -54,14 +57,25 @@ CREATE TABLE enrollments (
     UNIQUE(student_id, course_id, semester)
 );
 
+CREATE INDEX idx_enrollments_course_id ON enrollments (course_id);
+CREATE INDEX idx_courses_faculty_id ON courses (faculty_id);
+CREATE INDEX idx_students_department ON students (department);
+
 CREATE TABLE audit_log (
-    log_id SERIAL PRIMARY KEY,
+    log_id SERIAL,
     operation VARCHAR(50) NOT NULL,
     table_name VARCHAR(100) NOT NULL,
     executed_by VARCHAR(100) NOT NULL,
-    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    status VARCHAR(20) NOT NULL
-);
+    executed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20) NOT NULL,
+    op_id BIGINT,
+    PRIMARY KEY (executed_at, log_id)
+) PARTITION BY RANGE (executed_at);
+
+CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT;
+
+CREATE INDEX idx_audit_log_executed_by ON audit_log (executed_by, executed_at DESC);
+CREATE INDEX idx_audit_log_table_name ON audit_log (table_name, executed_at DESC);
 
 ALTER TABLE audit_log ENABLE ROW LEVEL SECURITY;
 
@@ -75,9 +89,9 @@ FROM system_users
 WHERE is_active = TRUE;
 
 INSERT INTO system_users (username, password_hash, role, email, full_name) VALUES 
-    ('admin', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5oe2K7xpkJu9u', 'admin', 'admin@university.edu', 'Admin User'),
-    ('student1', '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW', 'student', 'student1@university.edu', 'John Doe'),
-    ('faculty1', '$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW', 'faculty', 'faculty1@university.edu', 'Dr. Jane Smith');
+    ('admin', '$2b$12$cxl4Q7yXxvQrp.S.f4KbNOX//4arThEzjapmBrcip5MRywsChgEtq', 'admin', 'admin@university.edu', 'Admin User'),
+    ('student1', '$2b$12$Q//td0gORW/ed4Yu26aYqeatWo6pEi/73OYLNqvfpkLbCSV97rwnm', 'student', 'student1@university.edu', 'John Doe'),
+    ('faculty1', '$2b$12$pbIRENQ8GwFkeeZT2txNWeGcEZLGrJ2frxdeQg/rq12oCgbxqaUOK', 'faculty', 'faculty1@university.edu', 'Dr. Jane Smith');
 
 INSERT INTO students (user_id, roll_number, department, year, cgpa) VALUES 
     (2, 'CS2021001', 'Computer Science', 3, 8.5);
@@ -94,6 +108,61 @@ INSERT INTO enrollments (student_id, course_id, grade, semester) VALUES
     (1, 1, 'A', 'Fall 2023'),
     (1, 2, 'B+', 'Spring 2024');
 
+CREATE OR REPLACE FUNCTION create_audit_log_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_name TEXT := format('audit_log_p%s', to_char(p_month, 'YYYYMM'));
+BEGIN
+    IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_start, (v_start + INTERVAL '1 month')::DATE
+        );
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION ensure_audit_log_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM create_audit_log_partition((date_trunc('month', CURRENT_DATE) + make_interval(months => i))::DATE);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Detaches monthly partitions older than p_keep_months. Detached tables keep their
+-- name so they can be dumped to cold storage; p_drop removes them instead.
+CREATE OR REPLACE FUNCTION archive_audit_log_partitions(p_keep_months INTEGER DEFAULT 12, p_drop BOOLEAN DEFAULT FALSE)
+RETURNS TABLE(partition_name TEXT, action TEXT) AS $$
+DECLARE
+    v_cutoff TEXT := to_char(date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months), 'YYYYMM');
+    v_partition TEXT;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname::TEXT
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'audit_log'::regclass
+            AND c.relname ~ '^audit_log_p[0-9]{6}$'
+            AND substring(c.relname FROM 12) < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE audit_log DETACH PARTITION %I', v_partition);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+            RETURN QUERY SELECT v_partition, 'dropped'::TEXT;
+        ELSE
+            RETURN QUERY SELECT v_partition, 'detached'::TEXT;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_audit_log_partitions(3);
+
 CREATE OR REPLACE FUNCTION log_operation(
     p_operation VARCHAR,
     p_table VARCHAR,
@@ -101,8 +170,8 @@ CREATE OR REPLACE FUNCTION log_operation(
     p_status VARCHAR
 ) RETURNS VOID AS $$
 BEGIN
-    INSERT INTO audit_log (operation, table_name, executed_by, status)
-    VALUES (p_operation, p_table, p_user, p_status);
+    INSERT INTO audit_log (operation, table_name, executed_by, status, op_id)
+    VALUES (p_operation, p_table, p_user, p_status, NULLIF(current_setting('app.op_id', true), '')::BIGINT);
 END;
 $$ LANGUAGE plpgsql;
 
@@ -142,15 +211,34 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE OR REPLACE FUNCTION get_audit_logs(p_role VARCHAR)
+DROP FUNCTION IF EXISTS get_audit_logs(VARCHAR);
+DROP FUNCTION IF EXISTS get_audit_logs(VARCHAR, INTEGER, VARCHAR, VARCHAR, VARCHAR, VARCHAR, TIMESTAMP, TIMESTAMP, TIMESTAMP, INTEGER);
+
+-- Filters are appended only when given so each call gets a plan that can prune
+-- partitions and walk the (executed_at, log_id) primary key backwards.
+CREATE OR REPLACE FUNCTION get_audit_logs(
+    p_role VARCHAR,
+    p_limit INTEGER DEFAULT 100,
+    p_executed_by VARCHAR DEFAULT NULL,
+    p_operation VARCHAR DEFAULT NULL,
+    p_table_name VARCHAR DEFAULT NULL,
+    p_status VARCHAR DEFAULT NULL,
+    p_from TIMESTAMP DEFAULT NULL,
+    p_to TIMESTAMP DEFAULT NULL,
+    p_before_at TIMESTAMP DEFAULT NULL,
+    p_before_id INTEGER DEFAULT NULL
+)
 RETURNS TABLE(
     log_id INTEGER,
     operation VARCHAR,
     table_name VARCHAR,
     executed_by VARCHAR,
     executed_at TIMESTAMP,
-    status VARCHAR
+    status VARCHAR,
+    op_id BIGINT
 ) AS $$
+DECLARE
+    v_sql TEXT := 'SELECT a.log_id, a.operation, a.table_name, a.executed_by, a.executed_at, a.status, a.op_id FROM audit_log a WHERE TRUE';
 BEGIN
     IF p_role != 'admin' THEN
         RAISE EXCEPTION 'Only admin can view audit logs';
@@ -158,11 +246,20 @@ BEGIN
     
     PERFORM set_config('app.role', 'admin', false);
     
-    RETURN QUERY
-    SELECT a.log_id, a.operation, a.table_name, a.executed_by, a.executed_at, a.status
-    FROM audit_log a
-    ORDER BY a.executed_at DESC
-    LIMIT 100;
+    IF p_executed_by IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_by = $1'; END IF;
+    IF p_operation IS NOT NULL THEN v_sql := v_sql || ' AND a.operation = $2'; END IF;
+    IF p_table_name IS NOT NULL THEN v_sql := v_sql || ' AND a.table_name = $3'; END IF;
+    IF p_status IS NOT NULL THEN v_sql := v_sql || ' AND a.status = $4'; END IF;
+    IF p_from IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_at >= $5'; END IF;
+    IF p_to IS NOT NULL THEN v_sql := v_sql || ' AND a.executed_at < $6'; END IF;
+    IF p_before_at IS NOT NULL THEN
+        v_sql := v_sql || ' AND (a.executed_at, a.log_id) < ($7, $8)';
+    END IF;
+    v_sql := v_sql || ' ORDER BY a.executed_at DESC, a.log_id DESC LIMIT $9';
+    
+    RETURN QUERY EXECUTE v_sql
+    USING p_executed_by, p_operation, p_table_name, p_status, p_from, p_to,
+          p_before_at, COALESCE(p_before_id, 2147483647), LEAST(GREATEST(p_limit, 1), 1000);
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER SET app.role = 'admin';
 
@@ -186,3 +283,500 @@ BEGIN
     ORDER BY su.role, su.full_name;
 END;
 $$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_version DEFAULT VALUES ON CONFLICT (id) DO NOTHING;
+
+-- Bumps schema_version and notifies listeners on any DDL outside temporary schemas
+-- (materialized view refreshes change data, not schema)
+CREATE OR REPLACE FUNCTION notify_schema_change()
+RETURNS event_trigger AS $$
+DECLARE
+    v_version BIGINT;
+BEGIN
+    IF TG_EVENT = 'sql_drop' THEN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_event_trigger_dropped_objects()
+            WHERE schema_name IS NOT NULL AND schema_name NOT LIKE 'pg_temp%'
+        ) THEN
+            RETURN;
+        END IF;
+    ELSIF NOT EXISTS (
+        SELECT 1 FROM pg_event_trigger_ddl_commands()
+        WHERE (schema_name IS NULL OR schema_name NOT LIKE 'pg_temp%')
+            AND command_tag <> 'REFRESH MATERIALIZED VIEW'
+    ) THEN
+        RETURN;
+    END IF;
+    
+    UPDATE schema_version SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    RETURNING version INTO v_version;
+    PERFORM pg_notify('schema_changed', v_version::TEXT);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS schema_change_notify;
+CREATE EVENT TRIGGER schema_change_notify ON ddl_command_end
+    EXECUTE FUNCTION notify_schema_change();
+
+DROP EVENT TRIGGER IF EXISTS schema_drop_notify;
+CREATE EVENT TRIGGER schema_drop_notify ON sql_drop
+    EXECUTE FUNCTION notify_schema_change();
+
+-- Statement-level triggers that tell backends which tables changed, so cached
+-- results reading them can be dropped. NOTIFY is delivered on commit and
+-- deduplicated per transaction. Writes no cached result depends on can skip it
+-- with SET app.table_notify = off.
+CREATE OR REPLACE FUNCTION notify_table_change()
+RETURNS trigger AS $$
+BEGIN
+    IF current_setting('app.table_notify', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('table_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['system_users', 'students', 'faculty', 'courses', 'enrollments'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', v_table || '_notify_change', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()',
+            v_table || '_notify_change', v_table
+        );
+    END LOOP;
+END;
+$$;
+
+-- Materialized aggregates for dashboard-style questions. Each view has a unique
+-- index so it can be refreshed CONCURRENTLY (readers are never blocked); the
+-- backend refreshes them a few seconds after their base tables change.
+CREATE MATERIALIZED VIEW IF NOT EXISTS course_enrollment_stats AS
+SELECT c.course_id, c.course_code, c.course_name, c.department, c.faculty_id, e.semester,
+       COUNT(*) AS enrollment_count,
+       COUNT(e.grade) AS graded_count
+FROM courses c
+JOIN enrollments e ON e.course_id = c.course_id
+GROUP BY c.course_id, e.semester;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_course_enrollment_stats ON course_enrollment_stats (course_id, semester);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS grade_distribution AS
+SELECT c.course_id, c.course_code, e.semester, e.grade,
+       COUNT(*) AS student_count
+FROM courses c
+JOIN enrollments e ON e.course_id = c.course_id
+WHERE e.grade IS NOT NULL
+GROUP BY c.course_id, e.semester, e.grade;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_grade_distribution ON grade_distribution (course_id, semester, grade);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS department_cgpa_stats AS
+SELECT department,
+       COUNT(*) AS student_count,
+       COUNT(cgpa) AS rated_count,
+       ROUND(AVG(cgpa), 2) AS avg_cgpa,
+       MIN(cgpa) AS min_cgpa,
+       MAX(cgpa) AS max_cgpa,
+       ROUND(percentile_cont(0.5) WITHIN GROUP (ORDER BY cgpa)::NUMERIC, 2) AS median_cgpa
+FROM students
+GROUP BY department;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_department_cgpa_stats ON department_cgpa_stats (department);
+
+-- Refreshes one analytics view and tells every backend's result cache about it.
+-- Returns FALSE without waiting when another session is already refreshing it.
+CREATE OR REPLACE FUNCTION refresh_analytics_view(p_view TEXT)
+RETURNS BOOLEAN AS $$
+BEGIN
+    IF p_view NOT IN ('course_enrollment_stats', 'grade_distribution', 'department_cgpa_stats') THEN
+        RAISE EXCEPTION 'Unknown analytics view: %', p_view;
+    END IF;
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_view'), hashtext(p_view)) THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY %I', p_view);
+    PERFORM pg_notify('table_changed', p_view);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row-change capture for operation-level rollback: statement-level triggers copy compact
+-- before-images out of the transition tables into row_changes, keyed by operation.
+-- Created after the seed rows so those are not recorded as an operation.
+CREATE TABLE IF NOT EXISTS operations (
+    op_id BIGSERIAL PRIMARY KEY,
+    executed_by VARCHAR(100) NOT NULL,
+    description TEXT,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    reverted_at TIMESTAMP,
+    reverted_by VARCHAR(100),
+    reverted_by_op BIGINT
+);
+
+CREATE INDEX IF NOT EXISTS idx_operations_executed_by ON operations (executed_by, started_at);
+
+-- One seq value per captured statement orders the changes to a row across operations
+CREATE SEQUENCE IF NOT EXISTS row_changes_seq;
+
+CREATE TABLE IF NOT EXISTS row_changes (
+    op_id BIGINT NOT NULL,
+    seq BIGINT NOT NULL,
+    table_name TEXT NOT NULL,
+    action CHAR(1) NOT NULL CHECK (action IN ('I', 'U', 'D')),
+    row_pk INTEGER NOT NULL,
+    before_image JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_row_changes_op_id ON row_changes (op_id);
+-- seq only grows, so a BRIN index finds "changes after X" at almost no write cost
+CREATE INDEX IF NOT EXISTS idx_row_changes_seq ON row_changes USING brin (seq);
+
+-- The operation the current transaction writes under, opened on first use.
+-- app.user and app.op_description are set by the backend for the transaction.
+CREATE OR REPLACE FUNCTION current_operation()
+RETURNS BIGINT AS $$
+DECLARE
+    v_op_id BIGINT := NULLIF(current_setting('app.op_id', true), '')::BIGINT;
+BEGIN
+    IF v_op_id IS NULL THEN
+        INSERT INTO operations (executed_by, description)
+        VALUES (COALESCE(NULLIF(current_setting('app.user', true), ''), current_user),
+                NULLIF(current_setting('app.op_description', true), ''))
+        RETURNING operations.op_id INTO v_op_id;
+        PERFORM set_config('app.op_id', v_op_id::TEXT, true);
+    END IF;
+    RETURN v_op_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Later jsonb values lose to earlier ones when aggregated ORDER BY seq DESC,
+-- so the oldest before-image of each column wins
+CREATE OR REPLACE AGGREGATE jsonb_merge_agg(JSONB) (
+    SFUNC = jsonb_concat,
+    STYPE = JSONB
+);
+
+-- TG_ARGV[0] is the table's primary key column; primary keys are treated as immutable.
+-- Bulk loads can skip capture with SET app.row_capture = off.
+CREATE OR REPLACE FUNCTION capture_row_changes()
+RETURNS trigger AS $$
+DECLARE
+    v_op_id BIGINT;
+    v_seq BIGINT;
+    v_unchanged TEXT;
+BEGIN
+    IF current_setting('app.row_capture', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+    v_op_id := current_operation();
+    v_seq := nextval('row_changes_seq');
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format(
+            'INSERT INTO row_changes (op_id, seq, table_name, action, row_pk)
+             SELECT $1, $2, $3, ''I'', n.%I FROM new_rows n', TG_ARGV[0])
+        USING v_op_id, v_seq, TG_TABLE_NAME;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- The old row minus every column the statement left alone; comparing typed
+        -- columns is much cheaper than diffing two jsonb documents key by key
+        SELECT string_agg(format('CASE WHEN o.%1$I IS NOT DISTINCT FROM n.%1$I THEN %1$L END', a.attname), ', ')
+        INTO v_unchanged
+        FROM pg_attribute a
+        WHERE a.attrelid = TG_RELID AND a.attnum > 0 AND NOT a.attisdropped;
+        EXECUTE format(
+            'INSERT INTO row_changes (op_id, seq, table_name, action, row_pk, before_image)
+             SELECT $1, $2, $3, ''U'', o.%1$I, to_jsonb(o) - ARRAY[%2$s]::TEXT[]
+             FROM old_rows o
+             JOIN new_rows n ON n.%1$I = o.%1$I
+             WHERE o IS DISTINCT FROM n', TG_ARGV[0], v_unchanged)
+        USING v_op_id, v_seq, TG_TABLE_NAME;
+    ELSE
+        EXECUTE format(
+            'INSERT INTO row_changes (op_id, seq, table_name, action, row_pk, before_image)
+             SELECT $1, $2, $3, ''D'', o.%I, to_jsonb(o) FROM old_rows o', TG_ARGV[0])
+        USING v_op_id, v_seq, TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow a single event per trigger, hence three per table
+DO $$
+DECLARE
+    v_table TEXT;
+    v_pk TEXT;
+BEGIN
+    FOR v_table, v_pk IN
+        SELECT * FROM (VALUES ('system_users', 'user_id'), ('students', 'student_id'), ('faculty', 'faculty_id'),
+                              ('courses', 'course_id'), ('enrollments', 'enrollment_id')) AS t(table_name, pk)
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', v_table || '_capture_insert', v_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', v_table || '_capture_update', v_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', v_table || '_capture_delete', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION capture_row_changes(%L)',
+            v_table || '_capture_insert', v_table, v_pk
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION capture_row_changes(%L)',
+            v_table || '_capture_update', v_table, v_pk
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION capture_row_changes(%L)',
+            v_table || '_capture_delete', v_table, v_pk
+        );
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION get_operations(
+    p_executed_by VARCHAR DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50,
+    p_before_id BIGINT DEFAULT NULL
+)
+RETURNS TABLE(
+    op_id BIGINT,
+    executed_by VARCHAR,
+    description TEXT,
+    started_at TIMESTAMP,
+    reverted_at TIMESTAMP,
+    reverted_by VARCHAR,
+    reverted_by_op BIGINT,
+    tables TEXT[],
+    rows_changed BIGINT
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT o.op_id, o.executed_by, o.description, o.started_at, o.reverted_at, o.reverted_by, o.reverted_by_op,
+           c.tables, COALESCE(c.rows_changed, 0)
+    FROM operations o
+    LEFT JOIN LATERAL (
+        SELECT array_agg(DISTINCT rc.table_name) AS tables, count(*) AS rows_changed
+        FROM row_changes rc
+        WHERE rc.op_id = o.op_id
+    ) c ON TRUE
+    WHERE (p_executed_by IS NULL OR o.executed_by = p_executed_by)
+        AND o.op_id < COALESCE(p_before_id, 9223372036854775807)
+    ORDER BY o.op_id DESC
+    LIMIT LEAST(GREATEST(p_limit, 1), 500);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Undoes the given operations in one transaction and records the revert as an operation
+-- of its own (so it can be reverted too). The net before-image of every touched row is
+-- computed first; rows that later, unreverted operations changed again are refused
+-- unless p_force. Restores run parent tables first and deletes child tables first.
+CREATE OR REPLACE FUNCTION revert_operations(
+    p_op_ids BIGINT[],
+    p_username VARCHAR,
+    p_force BOOLEAN DEFAULT FALSE
+) RETURNS TABLE(success BOOLEAN, message TEXT, op_id BIGINT, rows_reverted BIGINT, tables TEXT[]) AS $$
+DECLARE
+    v_op_id BIGINT;
+    v_found INTEGER;
+    v_reverted BIGINT;
+    v_conflicts BIGINT;
+    v_table TEXT;
+    v_pk TEXT;
+    v_columns TEXT;
+    v_values TEXT;
+    v_count BIGINT;
+    v_total BIGINT := 0;
+    v_tables TEXT[];
+    v_order TEXT[] := ARRAY['system_users', 'students', 'faculty', 'courses', 'enrollments'];
+BEGIN
+    p_op_ids := ARRAY(SELECT DISTINCT id FROM unnest(p_op_ids) AS ids(id) ORDER BY id);
+    IF cardinality(p_op_ids) = 0 THEN
+        RAISE EXCEPTION 'No operations to revert';
+    END IF;
+
+    -- Row locks keep two admins from reverting the same operation at once
+    SELECT count(*), min(o.op_id) FILTER (WHERE o.reverted_at IS NOT NULL AND o.reverted_by_op <> ALL(p_op_ids))
+    INTO v_found, v_reverted
+    FROM (SELECT * FROM operations WHERE operations.op_id = ANY(p_op_ids) FOR UPDATE) o;
+    IF v_found < cardinality(p_op_ids) THEN
+        RAISE EXCEPTION 'Operation not found';
+    END IF;
+    IF v_reverted IS NOT NULL THEN
+        RAISE EXCEPTION 'Operation % was already reverted', v_reverted;
+    END IF;
+
+    INSERT INTO operations (executed_by, description)
+    VALUES (p_username, 'Revert of operation ' || array_to_string(p_op_ids, ', '))
+    RETURNING operations.op_id INTO v_op_id;
+    PERFORM set_config('app.op_id', v_op_id::TEXT, true);
+
+    DROP TABLE IF EXISTS revert_rows;
+    CREATE TEMP TABLE revert_rows ON COMMIT DROP AS
+    SELECT rc.table_name, rc.row_pk,
+           (array_agg(rc.action ORDER BY rc.seq))[1] AS first_action,
+           min(rc.seq) AS first_seq,
+           jsonb_merge_agg(rc.before_image ORDER BY rc.seq DESC) AS image
+    FROM row_changes rc
+    WHERE rc.op_id = ANY(p_op_ids)
+    GROUP BY rc.table_name, rc.row_pk;
+    ANALYZE revert_rows;
+
+    SELECT count(DISTINCT (r.table_name, r.row_pk)) INTO v_conflicts
+    FROM row_changes rc
+    JOIN revert_rows r ON r.table_name = rc.table_name AND r.row_pk = rc.row_pk AND rc.seq > r.first_seq
+    JOIN operations o ON o.op_id = rc.op_id
+    WHERE rc.seq > (SELECT min(first_seq) FROM revert_rows)
+        AND rc.op_id <> ALL(p_op_ids)
+        AND o.reverted_at IS NULL
+        -- A revert and the operation it undid cancel out
+        AND NOT EXISTS (SELECT 1 FROM operations x WHERE x.reverted_by_op = rc.op_id);
+    IF v_conflicts > 0 AND NOT p_force THEN
+        RAISE EXCEPTION '% row(s) were changed again by later operations; revert those first or force the revert', v_conflicts;
+    END IF;
+
+    v_tables := ARRAY(SELECT DISTINCT r.table_name FROM revert_rows r ORDER BY 1);
+
+    -- Changed rows get their old values back and deleted rows are inserted again
+    FOREACH v_table IN ARRAY v_order LOOP
+        CONTINUE WHEN NOT v_table = ANY(v_tables);
+        SELECT a.attname INTO v_pk
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = v_table::regclass AND i.indisprimary;
+        SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum),
+               string_agg('p.' || quote_ident(a.attname), ', ' ORDER BY a.attnum)
+        INTO v_columns, v_values
+        FROM pg_attribute a
+        WHERE a.attrelid = v_table::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attname <> v_pk;
+
+        EXECUTE format(
+            'UPDATE %1$I t SET (%3$s) = (SELECT %4$s FROM jsonb_populate_record(t, r.image) p)
+             FROM revert_rows r
+             WHERE r.table_name = $1 AND r.first_action <> ''I'' AND t.%2$I = r.row_pk',
+            v_table, v_pk, v_columns, v_values)
+        USING v_table;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        v_total := v_total + v_count;
+
+        EXECUTE format(
+            'INSERT INTO %1$I SELECT p.* FROM revert_rows r, jsonb_populate_record(NULL::%1$I, r.image) p
+             WHERE r.table_name = $1 AND r.first_action = ''D''
+                 AND NOT EXISTS (SELECT 1 FROM %1$I t WHERE t.%2$I = r.row_pk)',
+            v_table, v_pk)
+        USING v_table;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        v_total := v_total + v_count;
+    END LOOP;
+
+    -- Rows the operations inserted are deleted, children before parents
+    FOREACH v_table IN ARRAY ARRAY(SELECT t FROM unnest(v_order) WITH ORDINALITY AS u(t, n) ORDER BY n DESC) LOOP
+        CONTINUE WHEN NOT v_table = ANY(v_tables);
+        SELECT a.attname INTO v_pk
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = v_table::regclass AND i.indisprimary;
+        EXECUTE format(
+            'DELETE FROM %1$I t USING revert_rows r
+             WHERE r.table_name = $1 AND r.first_action = ''I'' AND t.%2$I = r.row_pk',
+            v_table, v_pk)
+        USING v_table;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        v_total := v_total + v_count;
+    END LOOP;
+
+    UPDATE operations
+    SET reverted_at = CURRENT_TIMESTAMP, reverted_by = p_username, reverted_by_op = v_op_id
+    WHERE operations.op_id = ANY(p_op_ids) AND operations.reverted_at IS NULL;
+
+    PERFORM log_operation('REVERT', left(array_to_string(v_tables, ','), 100), p_username, 'SUCCESS');
+
+    RETURN QUERY SELECT TRUE, format('Reverted %s row(s) changed by operation %s', v_total, array_to_string(p_op_ids, ', ')),
+                        v_op_id, v_total, v_tables;
+EXCEPTION WHEN OTHERS THEN
+    PERFORM log_operation('REVERT', 'operations', p_username, 'FAILED');
+    RETURN QUERY SELECT FALSE, SQLERRM::TEXT, NULL::BIGINT, 0::BIGINT, NULL::TEXT[];
+END;
+$$ LANGUAGE plpgsql;
+
+-- Everything one user did in [p_from, p_to) that has not been reverted yet. An operation already
+-- undone by a revert in the same window is taken along with it, so the pair cancels out and the
+-- rows go back to how they were before the window.
+CREATE OR REPLACE FUNCTION revert_user_operations(
+    p_executed_by VARCHAR,
+    p_from TIMESTAMP,
+    p_to TIMESTAMP,
+    p_username VARCHAR,
+    p_force BOOLEAN DEFAULT FALSE
+) RETURNS TABLE(success BOOLEAN, message TEXT, op_id BIGINT, rows_reverted BIGINT, tables TEXT[]) AS $$
+DECLARE
+    v_op_ids BIGINT[];
+BEGIN
+    v_op_ids := ARRAY(
+        WITH RECURSIVE picked AS (
+            SELECT o.op_id FROM operations o
+            WHERE o.executed_by = p_executed_by
+                AND o.started_at >= p_from
+                AND o.started_at < COALESCE(p_to, 'infinity')
+                AND o.reverted_at IS NULL
+            UNION
+            SELECT o.op_id FROM operations o
+            JOIN picked p ON o.reverted_by_op = p.op_id
+            WHERE o.executed_by = p_executed_by
+                AND o.started_at >= p_from
+                AND o.started_at < COALESCE(p_to, 'infinity')
+        )
+        SELECT p.op_id FROM picked p
+    );
+    IF cardinality(v_op_ids) = 0 THEN
+        RETURN QUERY SELECT FALSE, format('No operations by %s found in that window', p_executed_by), NULL::BIGINT, 0::BIGINT, NULL::TEXT[];
+        RETURN;
+    END IF;
+    RETURN QUERY SELECT * FROM revert_operations(v_op_ids, p_username, p_force);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Captured changes are kept for p_keep_days; older operations can no longer be reverted
+CREATE OR REPLACE FUNCTION purge_row_changes(p_keep_days INTEGER DEFAULT 30)
+RETURNS BIGINT AS $$
+DECLARE
+    v_cutoff BIGINT;
+    v_count BIGINT;
+BEGIN
+    SELECT max(o.op_id) INTO v_cutoff
+    FROM operations o
+    WHERE o.started_at < CURRENT_TIMESTAMP - make_interval(days => p_keep_days);
+    IF v_cutoff IS NULL THEN
+        RETURN 0;
+    END IF;
+    DELETE FROM row_changes WHERE op_id <= v_cutoff;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    DELETE FROM operations WHERE op_id <= v_cutoff;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Migrations already folded into this file; backend/migrate.py skips them on a fresh install
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(100) PRIMARY KEY,
+    checksum VARCHAR(64),
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO schema_migrations (version) VALUES
+    ('001_partition_audit_log'),
+    ('002_schema_change_events'),
+    ('003_table_change_notify'),
+    ('004_foreign_key_indexes'),
+    ('005_analytics_views'),
+    ('006_seed_password_hashes'),
+    ('007_row_changes')
+ON CONFLICT (version) DO NOTHING;
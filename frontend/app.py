@@ -3,12 +3,16 @@
 import streamlit as st
 import requests
 import os
+import uuid
 import pandas as pd
+import pyarrow as pa
+from datetime import timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:8000')
+PAGE_SIZE = int(os.getenv('QUERY_PAGE_SIZE', '200'))
 
 st.set_page_config(page_title="AI-Native DBMS", layout="wide")
 
@@ -26,10 +30,15 @@ if 'show_confirmation' not in st.session_state:
     st.session_state.show_confirmation = False
 if 'last_result' not in st.session_state:
     st.session_state.last_result = None
+if 'audit_filters' not in st.session_state:
+    st.session_state.audit_filters = {}
+if 'audit_cursors' not in st.session_state:
+    st.session_state.audit_cursors = []
 
 def login(username, password):
     try:
-        response = requests.post(f"{BACKEND_URL}/auth/login", json={"username": username, "password": password}, timeout=10)
+        response = requests.post(f"{BACKEND_URL}/auth/login", json={"username": username, "password": password},
+                                 headers={"X-Request-ID": uuid.uuid4().hex}, timeout=10)
         if response.status_code == 200:
             data = response.json()
             st.session_state.logged_in = True
@@ -46,17 +55,48 @@ def logout():
     st.session_state.user_info = {}
 
 def get_auth_headers():
-    return {"Authorization": f"Bearer {st.session_state.token}"}
+    # A fresh request ID per call; the backend logs it with its metrics spans and echoes it back
+    return {"Authorization": f"Bearer {st.session_state.token}", "X-Request-ID": uuid.uuid4().hex}
 
-def execute_query(text, confirm=False):
+def execute_query(text, confirm=False, plan_id=None, limit=None, cursor=None):
     try:
-        response = requests.post(f"{BACKEND_URL}/query", json={"text": text, "confirm": confirm}, headers=get_auth_headers(), timeout=30)
+        payload = {"text": text, "confirm": confirm, "plan_id": plan_id, "limit": limit, "cursor": cursor}
+        response = requests.post(f"{BACKEND_URL}/query", json=payload, headers=get_auth_headers(), timeout=30)
         if response.status_code == 200:
             return response.json()
-        return {"success": False, "message": response.json().get('detail', 'Failed'), "data": [], "needs_confirmation": False}
+        detail = response.json().get('detail', 'Failed')
+        if isinstance(detail, dict):
+            # Structured errors (cost budget, timeout) carry their numbers alongside the message
+            return {"success": False, "message": detail['message'], "error": detail, "data": [], "needs_confirmation": False}
+        return {"success": False, "message": detail, "data": [], "needs_confirmation": False}
     except Exception as e:
         return {"success": False, "message": str(e), "data": [], "needs_confirmation": False}
 
+def export_query(plan_id, fmt):
+    try:
+        response = requests.post(f"{BACKEND_URL}/export", json={"plan_id": plan_id, "format": fmt},
+                                 headers=get_auth_headers(), timeout=300)
+        if response.status_code == 200:
+            return True, response.content
+        detail = response.json().get('detail', 'Export failed')
+        return False, detail['message'] if isinstance(detail, dict) else detail
+    except Exception as e:
+        return False, str(e)
+
+def load_dataframe(plan_id):
+    # Arrow IPC goes straight into a DataFrame, with no JSON in between
+    success, content = export_query(plan_id, 'arrow')
+    if not success:
+        return False, content
+    return True, pa.ipc.open_stream(content).read_pandas()
+
+def show_query_error(result):
+    st.error(result['message'])
+    error = result.get('error') or {}
+    if error.get('error') == 'query_too_expensive':
+        st.caption(f"Estimated cost {error['estimated_cost']:,.0f} (limit {error['max_cost']:,.0f}), "
+                   f"estimated rows {error['estimated_rows']:,.0f} (limit {error['max_rows']:,.0f})")
+
 def get_profile():
     try:
         response = requests.get(f"{BACKEND_URL}/profile", headers=get_auth_headers(), timeout=10)
@@ -66,14 +106,17 @@ def get_profile():
         pass
     return {}
 
-def get_audit_logs():
+def get_audit_logs(filters=None, cursor=None):
     try:
-        response = requests.get(f"{BACKEND_URL}/audit-logs", headers=get_auth_headers(), timeout=10)
+        params = {k: v for k, v in (filters or {}).items() if v}
+        if cursor:
+            params['cursor'] = cursor
+        response = requests.get(f"{BACKEND_URL}/audit-logs", params=params, headers=get_auth_headers(), timeout=10)
         if response.status_code == 200:
-            return response.json()['logs']
+            return response.json()
     except:
         pass
-    return []
+    return {"logs": [], "next_cursor": None}
 
 def get_users():
     try:
@@ -144,7 +187,11 @@ def show_query_page():
         with col1:
             if st.button("Yes, Execute", type="primary", width='stretch'):
                 with st.spinner("Executing..."):
-                    result = execute_query(st.session_state.pending_query['text'], confirm=True)
+                    pending = st.session_state.pending_query
+                    result = execute_query(pending['text'], confirm=True,
+                                           plan_id=pending.get('plan_id'), limit=PAGE_SIZE)
+                    result['text'] = pending['text']
+                    result['plan_id'] = pending.get('plan_id')
                     st.session_state.last_result = result
                     st.session_state.pending_query = None
                     st.session_state.show_confirmation = False
@@ -163,11 +210,54 @@ def show_query_page():
         result = st.session_state.last_result
         if result['success']:
             st.success(result['message'])
-            if result['data']:
+            if result.get('frame') is not None:
+                st.dataframe(result['frame'], width='stretch')
+            elif result['data']:
                 st.dataframe(pd.DataFrame(result['data']), width='stretch')
         else:
-            st.error(result['message'])
-        st.session_state.last_result = None
+            show_query_error(result)
+        
+        if result.get('next_cursor'):
+            st.caption(f"Showing {len(result['data'])} rows")
+            col1, col2 = st.columns([1, 1])
+            with col1:
+                if st.button("Load more rows", width='stretch'):
+                    with st.spinner("Loading..."):
+                        page = execute_query(result['text'], confirm=True, plan_id=result['plan_id'],
+                                             limit=PAGE_SIZE, cursor=result['next_cursor'])
+                    if page['success']:
+                        result['data'] = result['data'] + page['data']
+                        result['next_cursor'] = page.get('next_cursor')
+                    else:
+                        result['next_cursor'] = None
+                        st.error(page['message'])
+                    st.rerun()
+            with col2:
+                if st.button("Load all rows", width='stretch'):
+                    with st.spinner("Loading..."):
+                        success, frame = load_dataframe(result['plan_id'])
+                    if success:
+                        result['frame'] = frame
+                        result['next_cursor'] = None
+                        st.rerun()
+                    else:
+                        st.error(frame)
+        
+        if result['success'] and result.get('operation') == 'select' and result.get('plan_id'):
+            with st.expander("Export"):
+                fmt = st.radio("Format", ['csv', 'parquet'], horizontal=True)
+                if st.button("Prepare download"):
+                    with st.spinner("Exporting..."):
+                        success, content = export_query(result['plan_id'], fmt)
+                    if success:
+                        result['download'] = (fmt, content)
+                    else:
+                        st.error(content)
+                if result.get('download'):
+                    fmt, content = result['download']
+                    st.download_button(f"Download {fmt.upper()}", content, file_name=f"export.{fmt}")
+        elif not result.get('next_cursor'):
+            st.session_state.last_result = None
     
     user_input = st.text_area("Enter your query:", 
                              placeholder="e.g., show all students in computer science",
@@ -176,6 +266,7 @@ def show_query_page():
     
     if st.button("Execute Query", type="primary", disabled=st.session_state.show_confirmation):
         if user_input:
+            st.session_state.last_result = None
             with st.spinner("Processing..."):
                 result = execute_query(user_input, confirm=False)
                 
@@ -183,7 +274,8 @@ def show_query_page():
                     st.session_state.pending_query = {
                         'text': user_input,
                         'sql_query': result.get('sql_query', ''),
-                        'explanation': result.get('explanation', '')
+                        'explanation': result.get('explanation', ''),
+                        'plan_id': result.get('plan_id')
                     }
                     st.session_state.show_confirmation = True
                     st.rerun()
@@ -192,7 +284,7 @@ def show_query_page():
                     if result['data']:
                         st.dataframe(pd.DataFrame(result['data']), width='stretch')
                 else:
-                    st.error(result['message'])
+                    show_query_error(result)
 
 def show_profile_page():
     st.title("My Profile")
@@ -240,11 +332,44 @@ def show_audit_logs_page():
     st.title("Audit Logs")
     st.divider()
     
-    logs = get_audit_logs()
-    if logs:
-        st.dataframe(pd.DataFrame(logs), width='stretch', height=600)
+    with st.expander("Filters"):
+        col1, col2, col3, col4 = st.columns(4)
+        executed_by = col1.text_input("User")
+        operation = col2.text_input("Operation")
+        table_name = col3.text_input("Table")
+        log_status = col4.selectbox("Status", ["", "SUCCESS", "FAILED"])
+        col5, col6 = st.columns(2)
+        start = col5.date_input("From", value=None)
+        end = col6.date_input("To", value=None)
+    
+    filters = {
+        'executed_by': executed_by,
+        'operation': operation.upper(),
+        'table_name': table_name,
+        'status': log_status,
+        'start': start.isoformat() if start else None,
+        'end': (end + timedelta(days=1)).isoformat() if end else None
+    }
+    if filters != st.session_state.audit_filters:
+        st.session_state.audit_filters = filters
+        st.session_state.audit_cursors = []
+    
+    cursor = st.session_state.audit_cursors[-1] if st.session_state.audit_cursors else None
+    result = get_audit_logs(filters, cursor)
+    if result['logs']:
+        st.dataframe(pd.DataFrame(result['logs']), width='stretch', height=600)
     else:
         st.info("No logs found")
+    
+    col1, col2, _ = st.columns([1, 1, 4])
+    with col1:
+        if st.button("Newer", disabled=not st.session_state.audit_cursors, width='stretch'):
+            st.session_state.audit_cursors.pop()
+            st.rerun()
+    with col2:
+        if st.button("Older", disabled=not result.get('next_cursor'), width='stretch'):
+            st.session_state.audit_cursors.append(result['next_cursor'])
+            st.rerun()
 
 def show_users_page():
     if st.session_state.user_info['role'] != 'admin':
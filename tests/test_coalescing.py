@@ -0,0 +1,130 @@
+import asyncio
+import pytest
+from coalescing import MicroBatcher, SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    async def run():
+        flights, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'rows'
+
+        results = await asyncio.gather(*(flights.do('k', work) for _ in range(5)))
+        again = await flights.do('k', work)
+        return results, again, len(calls), flights.stats()
+
+    results, again, calls, stats = asyncio.run(run())
+    assert results == ['rows'] * 5 and again == 'rows'
+    # Finished flights are not cached: the sixth call ran the work again
+    assert calls == 2
+    assert stats == {"in_flight": 0, "executions": 2, "shared": 4, "shared_rate": 0.6667}
+
+
+def test_different_keys_run_separately():
+    async def run():
+        flights = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flights.do('a', lambda: work(1)), flights.do('b', lambda: work(2)))
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flights.do('k', work) for _ in range(3)), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(run())] == [ValueError] * 3
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def run():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return 'done'
+
+        first = asyncio.ensure_future(flights.do('k', work))
+        second = asyncio.ensure_future(flights.do('k', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == 'done'
+
+
+def test_batcher_groups_items_within_the_window():
+    async def run():
+        seen = []
+
+        async def run_batch(items):
+            seen.append(items)
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(run_batch, window=0.01, max_size=10)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        return results, seen, batcher.stats()
+
+    results, seen, stats = asyncio.run(run())
+    assert results == [0, 2, 4] and seen == [[0, 1, 2]]
+    assert stats == {"window_ms": 10.0, "batches": 1, "items": 3, "avg_batch_size": 3.0}
+
+
+def test_batcher_flushes_at_max_size():
+    async def run():
+        seen = []
+
+        async def run_batch(items):
+            seen.append(items)
+            return items
+
+        batcher = MicroBatcher(run_batch, window=10, max_size=2)
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(4))), 1), seen
+
+    assert asyncio.run(run()) == ([0, 1, 2, 3], [[0, 1], [2, 3]])
+
+
+def test_batch_errors():
+    async def run():
+        async def per_item(items):
+            return [ValueError(item) if item == 'bad' else item for item in items]
+
+        async def whole(items):
+            raise RuntimeError("batch failed")
+
+        first = MicroBatcher(per_item, window=0.01, max_size=10)
+        second = MicroBatcher(whole, window=0.01, max_size=10)
+        return (await asyncio.gather(first.submit('ok'), first.submit('bad'), return_exceptions=True),
+                await asyncio.gather(second.submit(1), second.submit(2), return_exceptions=True))
+
+    (ok, bad), failed = asyncio.run(run())
+    assert ok == 'ok' and isinstance(bad, ValueError)
+    assert all(isinstance(result, RuntimeError) for result in failed)
+
+
+def test_batch_with_missing_results_fails_the_rest():
+    async def run():
+        async def short(items):
+            return items[:1]
+
+        batcher = MicroBatcher(short, window=0.01, max_size=10)
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.submit('a'), batcher.submit('b'), return_exceptions=True), 1)
+
+    first, second = asyncio.run(run())
+    assert first == 'a' and isinstance(second, RuntimeError)
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from cost_guard import CostGuard, QueryTooExpensive, load_budgets
+
+
+class FakeDB:
+    def __init__(self, plan):
+        self.plan = plan
+        self.statements = []
+
+    async def execute_query(self, query, params=None):
+        self.statements.append((query, params))
+        return [{'QUERY PLAN': [{'Plan': self.plan}]}]
+
+
+def scan(cost, rows):
+    return {'Node Type': 'Seq Scan', 'Total Cost': cost, 'Plan Rows': rows}
+
+
+def test_budgets_are_overridable_per_role(monkeypatch):
+    monkeypatch.setenv('QUERY_MAX_COST_STUDENT', '50')
+    monkeypatch.setenv('QUERY_STATEMENT_TIMEOUT_FACULTY', '3s')
+    budgets = load_budgets()
+    assert budgets['student']['max_cost'] == 50.0
+    assert budgets['faculty']['statement_timeout'] == '3s'
+    assert budgets['admin']['max_cost'] == 10000000
+
+
+def test_over_budget_statements_are_refused():
+    guard = CostGuard(FakeDB(scan(500000, 10)))
+    assert asyncio.run(guard.check("SELECT * FROM enrollments", None, 'faculty'))['cost'] == 500000
+    with pytest.raises(QueryTooExpensive) as e:
+        asyncio.run(guard.check("SELECT * FROM enrollments", None, 'student'))
+    assert e.value.detail['error'] == 'query_too_expensive' and e.value.detail['max_cost'] == 100000
+    assert guard.stats()['rejected'] == 1
+
+
+def test_unknown_roles_get_the_student_budget():
+    guard = CostGuard(FakeDB(scan(1, 1)))
+    assert guard.budget('visitor') == guard.budget('student')
+    assert guard.settings('visitor') == {'statement_timeout': '5s', 'work_mem': '4MB'}
+
+
+def test_writes_are_judged_by_the_rows_they_modify():
+    plan = {'Node Type': 'ModifyTable', 'Total Cost': 10, 'Plan Rows': 0, 'Plans': [scan(10, 200000)]}
+    guard = CostGuard(FakeDB(plan))
+    with pytest.raises(QueryTooExpensive):
+        asyncio.run(guard.check("DELETE FROM enrollments", None, 'student'))
+
+
+def test_estimates_are_cached_per_statement_and_params():
+    db = FakeDB(scan(1, 1))
+    guard = CostGuard(db)
+    asyncio.run(guard.estimate("SELECT * FROM courses WHERE course_id = %s;", [1]))
+    asyncio.run(guard.estimate("SELECT *  FROM courses WHERE course_id = %s", [1]))
+    asyncio.run(guard.estimate("SELECT * FROM courses WHERE course_id = %s", [2]))
+    assert db.statements == [
+        ("EXPLAIN (FORMAT JSON) SELECT * FROM courses WHERE course_id = %s", [1]),
+        ("EXPLAIN (FORMAT JSON) SELECT * FROM courses WHERE course_id = %s", [2]),
+    ]
+    assert guard.stats()['hits'] == 1
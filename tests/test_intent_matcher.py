@@ -0,0 +1,76 @@
+import datetime
+import pytest
+from intent_matcher import IntentMatcher, current_semester
+from sql_analyzer import analyze, check_statement
+
+
+@pytest.fixture
+def matcher():
+    return IntentMatcher()
+
+
+@pytest.mark.parametrize('text, role', [
+    ("Show all students", 'admin'),
+    ("list me all the professors.", 'faculty'),
+    ("show my courses", 'student'),
+    ("show my courses", 'faculty'),
+    ("list my students", 'faculty'),
+    ("show enrollments for course 12", 'faculty'),
+    ("average CGPA per department?", 'faculty'),
+    ("enrollment count per course per semester", 'admin'),
+    ("grade distribution for cs101", 'faculty'),
+    ("change my email to new@example.com", 'student'),
+    ("update cgpa of student 7 to 8.5", 'admin'),
+])
+def test_templates_pass_the_role_policy(matcher, text, role):
+    parsed = matcher.match(text, 'user1', role)
+    assert parsed is not None and parsed['procedure'] is None
+    check_statement(analyze(parsed['query']), role, 'user1', parsed['params'])
+
+
+def test_role_specific_templates_fall_through(matcher):
+    assert matcher.match("show my courses", 'admin', 'admin') is None
+    assert matcher.match("show my students", 'user1', 'student') is None
+    assert matcher.match("average CGPA per department?", 'user1', 'student') is None
+    assert matcher.match("enrollments per course", 'user1', 'student') is None
+    assert matcher.match("grade distribution for cs101", 'user1', 'student') is None
+    assert matcher.match("show all students", 'user1', 'student') is None
+    assert matcher.match("show enrollments for course 12", 'user1', 'student') is None
+    assert matcher.match("enroll student 3 in course 9", 'user1', 'student') is None
+    assert matcher.match("set grade of enrollment 42 to A", 'user1', 'student') is None
+    assert matcher.match("update cgpa of student 7 to 8.5", 'user1', 'student') is None
+
+
+def test_slots_are_filled(matcher):
+    parsed = matcher.match("Enroll student 3 in course 9 for fall 2025", 'prof', 'faculty')
+    assert parsed['procedure'] == 'enroll_student' and parsed['params'] == [3, 9, 'Fall 2025', 'prof']
+    parsed = matcher.match("set grade of enrollment 42 to b+", 'prof', 'faculty')
+    assert parsed['procedure'] == 'update_grade' and parsed['params'] == [42, 'B+', 'prof']
+    parsed = matcher.match("grade distribution for cs101", 'prof', 'faculty')
+    assert parsed['params'] == ['CS101']
+    parsed = matcher.match("change my name to  Ada Lovelace ", 'user1', 'student')
+    assert parsed['params'] == ['Ada Lovelace', 'user1']
+
+
+def test_enroll_defaults_to_the_current_semester(matcher):
+    parsed = matcher.match("enroll student 3 in course 9", 'prof', 'faculty')
+    assert parsed['params'][2] == current_semester()
+    assert current_semester(datetime.date(2025, 3, 1)) == 'Spring 2025'
+    assert current_semester(datetime.date(2025, 9, 1)) == 'Fall 2025'
+
+
+@pytest.mark.parametrize('text', [
+    "show all students in year 2",
+    "which students have cgpa above 9",
+    "update cgpa of student 7 to 10.5",
+    "delete all enrollments",
+])
+def test_anything_else_goes_to_the_llm(matcher, text):
+    assert matcher.match(text, 'user1', 'admin') is None
+
+
+def test_stats_count_hits_per_intent(matcher):
+    matcher.match("show all students", 'a', 'admin')
+    matcher.match("show all students", 'a', 'admin')
+    matcher.match("something else", 'a', 'admin')
+    assert matcher.stats() == {"hits": 2, "misses": 1, "hit_rate": 0.6667, "by_intent": {'all_students': 2}}
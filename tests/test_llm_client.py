@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from llm_client import CircuitBreaker, LLMUnavailable, ResilientLLM
+
+
+def llm(**kwargs):
+    options = dict(timeout=1, deadline=2, retries=0, breaker_threshold=2, breaker_reset=30)
+    return ResilientLLM(**{**options, **kwargs})
+
+
+def half_open(client):
+    client.breaker.opened_at -= client.breaker.reset_timeout
+
+
+async def failing():
+    raise ConnectionError("upstream down")
+
+
+async def answer():
+    return 'ok'
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.trips == 1
+    assert breaker.allow() is False
+    assert breaker.retry_after() == 30
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    breaker.opened_at -= 30
+    assert breaker.state == 'half_open'
+    assert breaker.allow() == 'probe'
+    assert breaker.allow() is False
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() is True
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    breaker.opened_at -= 30
+    assert breaker.allow() == 'probe'
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.trips == 2 and not breaker.probing
+
+
+def test_open_breaker_rejects_without_calling():
+    client = llm()
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.call(failing))
+    calls = []
+    with pytest.raises(LLMUnavailable) as e:
+        asyncio.run(client.call(lambda: calls.append(1) or answer()))
+    assert not calls and e.value.retry_after == 30
+    assert client.stats()['rejected'] == 1
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    class BadRequest(Exception):
+        code = 400
+
+    async def rejected():
+        raise BadRequest("invalid prompt")
+
+    client = llm()
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            asyncio.run(client.call(rejected))
+    assert client.breaker.state == 'closed'
+
+
+def test_cancelled_probe_frees_the_breaker():
+    client = llm()
+    client.breaker.record_failure()
+    client.breaker.record_failure()
+    half_open(client)
+
+    async def cancel_probe():
+        probe = asyncio.ensure_future(client.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        assert client.breaker.probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+    assert not client.breaker.probing
+    assert asyncio.run(client.call(answer)) == 'ok'
+    assert client.breaker.state == 'closed'
+
+
+def test_sync_probe_interrupted_before_recording_frees_the_breaker():
+    client = llm()
+    client.breaker.record_failure()
+    client.breaker.record_failure()
+    half_open(client)
+
+    def interrupted(timeout):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        client.call_sync(interrupted)
+    assert not client.breaker.probing
+    assert client.call_sync(lambda timeout: 'ok') == 'ok'
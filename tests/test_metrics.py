@@ -0,0 +1,79 @@
+import asyncio
+from metrics import Counter, Gauge, Histogram, MetricsMiddleware, Registry, STAGE_SECONDS, stage
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram('h', 'help', buckets=(1, 5))
+    for value in (0.5, 1, 3, 5, 7):
+        histogram.observe(value)
+    assert histogram.render() == [
+        '# HELP h help',
+        '# TYPE h histogram',
+        'h_bucket{le="1"} 2',
+        'h_bucket{le="5"} 4',
+        'h_bucket{le="+Inf"} 5',
+        'h_sum 16.5',
+        'h_count 5',
+    ]
+
+
+def test_histogram_series_per_label_set():
+    histogram = Histogram('h', 'help', ('route',), buckets=(1,))
+    histogram.observe(2, '/b')
+    histogram.observe(0.5, '/a')
+    lines = histogram.render()
+    assert lines[2:] == [
+        'h_bucket{route="/a",le="1"} 1', 'h_bucket{route="/a",le="+Inf"} 1',
+        'h_sum{route="/a"} 0.5', 'h_count{route="/a"} 1',
+        'h_bucket{route="/b",le="1"} 0', 'h_bucket{route="/b",le="+Inf"} 1',
+        'h_sum{route="/b"} 2.0', 'h_count{route="/b"} 1',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter('c', 'help', ('route',))
+    counter.inc(2, 'a"b\\c\nd')
+    assert counter.render()[2] == 'c{route="a\\"b\\\\c\\nd"} 2'
+
+
+def test_gauge_reads_when_rendered_and_survives_errors():
+    values = {('x',): 3}
+    registry = Registry()
+    registry.add(Gauge('g', 'help', lambda: values, ('name',)))
+    registry.add(Gauge('broken', 'help', lambda: 1 / 0, kind='counter'))
+    values[('y',)] = 1.5
+    assert registry.render() == (
+        '# HELP g help\n# TYPE g gauge\ng{name="x"} 3\ng{name="y"} 1.5\n'
+        '# HELP broken help\n# TYPE broken counter\n'
+    )
+
+
+def test_middleware_times_stages_and_echoes_the_request_id():
+    class Route:
+        path = '/test/{id}'
+
+    async def app(scope, receive, send):
+        scope['route'] = Route()
+        with stage('execute'):
+            pass
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'ok'})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'headers': [(b'x-request-id', b'req-1')]}
+    asyncio.run(MetricsMiddleware(app)(scope, None, send))
+    assert (b'x-request-id', b'req-1') in sent[0]['headers']
+    rendered = '\n'.join(STAGE_SECONDS.render())
+    assert 'dbms_stage_duration_seconds_count{route="/test/{id}",stage="execute"} 1' in rendered
+    assert 'dbms_stage_duration_seconds_count{route="/test/{id}",stage="serialize"} 1' in rendered
+
+
+def test_stage_outside_a_request_records_nothing():
+    before = STAGE_SECONDS.render()
+    with stage('parse'):
+        pass
+    assert STAGE_SECONDS.render() == before
@@ -0,0 +1,42 @@
+import time
+from plan_store import PlanStore
+
+
+def test_take_returns_the_stored_question_and_role():
+    plans = PlanStore(ttl=60)
+    plan_id = plans.put('user1', {'operation': 'delete'}, 'remove my enrollment', 'student')
+    assert plans.take('user1', plan_id) == ({'operation': 'delete'}, 'remove my enrollment', 'student')
+    assert plans.take('user1', plan_id) is None
+
+
+def test_plans_are_per_user():
+    plans = PlanStore(ttl=60)
+    plan_id = plans.put('user1', {'operation': 'select'}, 'q', 'student')
+    assert plans.take('user2', plan_id) is None
+    assert plans.take('user1', plan_id) is not None
+
+
+def test_keep_if_leaves_the_plan_in_place():
+    plans = PlanStore(ttl=60)
+    plan_id = plans.put('user1', {'operation': 'select'}, 'q', 'student')
+    for _ in range(3):
+        assert plans.take('user1', plan_id, keep_if=lambda plan: plan['operation'] == 'select') is not None
+    assert plans.stats() == {'users': 1, 'plans': 1}
+
+
+def test_expired_plans_are_gone(monkeypatch):
+    plans = PlanStore(ttl=10)
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    plan_id = plans.put('user1', {'operation': 'select'}, 'q', 'student')
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert plans.take('user1', plan_id, keep_if=lambda plan: True) is None
+    assert plans.stats() == {'users': 0, 'plans': 0}
+
+
+def test_oldest_plans_are_evicted_past_the_per_user_cap():
+    plans = PlanStore(ttl=60, max_per_user=2)
+    first, second, third = (plans.put('user1', {'n': n}, 'q', 'student') for n in range(3))
+    assert plans.take('user1', first) is None
+    assert plans.take('user1', second)[0] == {'n': 1}
+    assert plans.take('user1', third)[0] == {'n': 2}
@@ -0,0 +1,87 @@
+import asyncio
+from result_cache import MemoryBackend, ResultCache, referenced_tables
+
+
+def cache(max_size=16):
+    return ResultCache(MemoryBackend(max_size))
+
+
+def test_referenced_tables():
+    assert referenced_tables("SELECT * FROM courses c JOIN enrollments e ON e.course_id = c.course_id") == \
+        {'courses', 'enrollments'}
+    assert referenced_tables("SELECT * FROM get_student_courses('user1')") == \
+        {'enrollments', 'courses', 'faculty', 'system_users'}
+    assert referenced_tables("SELECT * FROM grade_distribution") == {'grade_distribution'}
+    # Anything the cache cannot track is not cached at all
+    assert referenced_tables("SELECT * FROM audit_log") is None
+    assert referenced_tables("SELECT * FROM some_function()") is None
+    assert referenced_tables("SELECT 1") is None
+
+
+def test_key_is_scoped_to_endpoint_role_and_user():
+    key = ResultCache.make_key
+    base = key('query', 'student', 'user1', "SELECT * FROM courses", [1])
+    assert base == key('query', 'student', 'user1', " SELECT * FROM courses ", [1])
+    assert base != key('query', 'faculty', 'user1', "SELECT * FROM courses", [1])
+    assert base != key('query', 'student', 'user2', "SELECT * FROM courses", [1])
+    assert base != key('query', 'student', 'user1', "SELECT * FROM courses", [2])
+
+
+def test_key_keeps_spacing_inside_literals():
+    key = ResultCache.make_key
+    assert key('query', 'student', 'user1', "SELECT * FROM courses WHERE course_name = 'a  b'") != \
+        key('query', 'student', 'user1', "SELECT * FROM courses WHERE course_name = 'a b'")
+
+
+def test_invalidation_drops_entries_that_read_the_table():
+    async def run():
+        results = cache()
+        loads = []
+
+        def load(value):
+            async def inner():
+                loads.append(value)
+                return value
+            return inner
+
+        assert await results.read_through('a', {'courses'}, load(['a'])) == ['a']
+        assert await results.read_through('b', {'students'}, load(['b'])) == ['b']
+        assert await results.read_through('a', {'courses'}, load(['stale'])) == ['a']
+        await results.invalidate({'courses'})
+        assert await results.read_through('a', {'courses'}, load(['a2'])) == ['a2']
+        assert await results.read_through('b', {'students'}, load(['stale'])) == ['b']
+        return loads
+
+    assert asyncio.run(run()) == [['a'], ['b'], ['a2']]
+
+
+def test_result_loaded_across_an_invalidation_is_not_stored():
+    async def run():
+        results = cache()
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def slow_load():
+            started.set()
+            await finish.wait()
+            return ['old']
+
+        reader = asyncio.ensure_future(results.read_through('a', {'courses'}, slow_load))
+        await started.wait()
+        await results.invalidate({'courses'})
+        finish.set()
+        assert await reader == ['old']
+        return await results.get('a')
+
+    assert asyncio.run(run()) is None
+
+
+def test_memory_backend_evicts_least_recently_used():
+    async def run():
+        backend = MemoryBackend(2)
+        await backend.set('a', 1, {'courses'}, 60)
+        await backend.set('b', 2, {'courses'}, 60)
+        await backend.get('a')
+        await backend.set('c', 3, {'students'}, 60)
+        return await backend.get('a'), await backend.get('b'), await backend.invalidate({'courses'}), backend.size()
+
+    assert asyncio.run(run()) == (1, None, 1, 1)
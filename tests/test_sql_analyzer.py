@@ -0,0 +1,237 @@
+import pytest
+from sql_analyzer import PolicyViolation, analyze, check_statement, page_query, paged, with_limit
+
+
+def allowed(sql, role, username='user1', params=None):
+    check_statement(analyze(sql), role, username, params)
+
+
+def denied(sql, role, username='user1', params=None):
+    with pytest.raises(PolicyViolation) as e:
+        check_statement(analyze(sql), role, username, params)
+    return e.value
+
+
+@pytest.mark.parametrize('sql', [
+    "WITH x AS (DELETE FROM students RETURNING *) SELECT * FROM x",
+    "WITH x AS (UPDATE students SET cgpa = 10 RETURNING *) SELECT * FROM x",
+    "WITH x AS (INSERT INTO courses (course_code, course_name, credits, department) "
+    "VALUES ('X1', 'X', 3, 'CS') RETURNING *) SELECT * FROM x",
+    "SELECT * FROM students WHERE student_id IN "
+    "(WITH d AS (DELETE FROM enrollments RETURNING student_id) SELECT student_id FROM d)",
+    "WITH d AS (DELETE FROM enrollments RETURNING course_id) UPDATE courses SET credits = 0 "
+    "WHERE course_id IN (SELECT course_id FROM d)",
+])
+@pytest.mark.parametrize('role', ['student', 'faculty', 'admin'])
+def test_nested_writes_are_rejected(sql, role):
+    assert analyze(sql).nested_write
+    assert denied(sql, role).status_code == 400
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT 1 INTO newtable",
+    "SELECT * INTO TEMP copied FROM students",
+])
+@pytest.mark.parametrize('role', ['student', 'faculty', 'admin'])
+def test_select_into_is_rejected(sql, role):
+    assert analyze(sql).kind == 'select'
+    assert denied(sql, role).status_code == 400
+
+
+def test_top_level_writes_are_not_nested():
+    assert not analyze("INSERT INTO enrollments (student_id, course_id, semester) "
+                       "SELECT student_id, 1, 'Fall 2025' FROM students").nested_write
+    assert not analyze("WITH s AS (SELECT 1) UPDATE courses SET credits = 4 WHERE course_id = 1").nested_write
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT password_hash FROM system_users",
+    "SELECT su.password_hash FROM system_users su",
+    "SELECT * FROM system_users",
+    "SELECT su.* FROM system_users su",
+    "SELECT su FROM system_users su",
+    "SELECT su::text FROM system_users su",
+    "SELECT row_to_json(su) FROM system_users su",
+    "SELECT to_jsonb(system_users) FROM system_users",
+    "SELECT (su).password_hash FROM system_users su",
+    "SELECT (system_users).* FROM system_users",
+    "SELECT s.roll_number, su FROM students s JOIN system_users su ON su.user_id = s.user_id",
+    "WITH u AS (SELECT * FROM system_users) SELECT u FROM u",
+    "WITH u AS (SELECT * FROM system_users) SELECT username FROM u WHERE u::text LIKE '%$2b$%'",
+    "SELECT * FROM (SELECT * FROM system_users) x",
+    "SELECT c FROM system_users su(a, b, c)",
+    "SELECT x.h FROM students s JOIN system_users x(i, n, h) ON x.i = s.user_id",
+])
+@pytest.mark.parametrize('role', ['student', 'faculty'])
+def test_password_hash_is_never_exposed(sql, role):
+    assert analyze(sql).exposes_sensitive
+    assert denied(sql, role).status_code == 403
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT username, full_name, email FROM system_users",
+    "SELECT su.full_name, s.roll_number FROM students s JOIN system_users su ON su.user_id = s.user_id",
+    "SELECT * FROM students",
+    "SELECT s FROM students s",
+    "SELECT a FROM students s(a)",
+])
+def test_explicit_columns_are_not_sensitive(sql):
+    assert not analyze(sql).exposes_sensitive
+
+
+def test_admin_may_read_password_hashes():
+    allowed("SELECT su FROM system_users su", 'admin')
+    allowed("SELECT * FROM audit_log", 'admin')
+
+
+@pytest.mark.parametrize('sql, role, ok', [
+    ("SELECT * FROM courses", 'student', True),
+    ("SELECT * FROM courses", 'faculty', True),
+    ("SELECT * FROM audit_log", 'faculty', False),
+    ("SELECT * FROM audit_log_default", 'student', False),
+    ("SELECT * FROM audit_log_p202501", 'student', False),
+    ("SELECT * FROM public.audit_log_p202401 a JOIN students s ON s.user_id = a.log_id", 'faculty', False),
+    ("SELECT * FROM row_changes_default", 'faculty', False),
+    ("SELECT * FROM row_changes", 'student', False),
+    ("SELECT * FROM department_cgpa_stats", 'student', False),
+    ("SELECT * FROM department_cgpa_stats", 'faculty', True),
+    ("SELECT course_code FROM grade_distribution WHERE grade = 'F'", 'student', False),
+    ("SELECT c.course_name FROM courses c JOIN course_enrollment_stats s ON s.course_code = c.course_code", 'student', False),
+    ("SELECT * FROM course_enrollment_stats", 'faculty', True),
+    ("SELECT * FROM operations", 'faculty', False),
+    ("SELECT * FROM get_audit_logs('admin')", 'faculty', False),
+    ("SELECT * FROM revert_operations(ARRAY[1], 'x')", 'faculty', False),
+    ("SELECT pg_sleep(10)", 'student', False),
+    ("SELECT * FROM get_student_courses(1)", 'student', True),
+    ("SELECT * FROM get_faculty_courses(1)", 'student', False),
+    ("SELECT * FROM get_faculty_courses(1)", 'faculty', True),
+    ("DELETE FROM enrollments WHERE enrollment_id = 1", 'faculty', False),
+    ("INSERT INTO courses (course_code, course_name, credits, department) VALUES ('X', 'X', 3, 'CS')", 'student', False),
+    ("INSERT INTO courses (course_code, course_name, credits, department) VALUES ('X', 'X', 3, 'CS')", 'faculty', True),
+    ("UPDATE enrollments SET grade = 'A' WHERE enrollment_id = 1", 'student', False),
+    ("UPDATE enrollments SET grade = 'A' WHERE enrollment_id = 1", 'faculty', True),
+    ("UPDATE system_users SET email = 'a@b.c' WHERE username = 'user1'", 'student', True),
+    ("UPDATE system_users SET email = 'a@b.c' WHERE username = 'someone_else'", 'student', False),
+    ("UPDATE system_users SET role = 'admin' WHERE username = 'user1'", 'faculty', False),
+    ("UPDATE system_users SET email = 'a@b.c'", 'faculty', False),
+])
+def test_role_matrix(sql, role, ok):
+    if ok:
+        allowed(sql, role)
+    else:
+        denied(sql, role)
+
+
+def test_owner_filter_from_params():
+    sql = "UPDATE system_users SET full_name = %s WHERE username = %s"
+    allowed(sql, 'student', params=['New Name', 'user1'])
+    denied(sql, 'student', params=['New Name', 'user2'])
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM (TABLE system_users) t",
+    "WITH u AS (TABLE system_users) SELECT * FROM u",
+    "SELECT * FROM courses WHERE course_id IN (TABLE enrollments)",
+])
+@pytest.mark.parametrize('role', ['student', 'faculty'])
+def test_table_subqueries_are_rejected(sql, role):
+    assert denied(sql, role).status_code == 400
+
+
+@pytest.mark.parametrize('sql, status', [
+    ("SELECT 1; SELECT 2", 400),
+    ("SELECT 1 -- note\n; DELETE FROM students", 400),
+    ("DROP TABLE students", 400),
+    ("SELEC * FROM", 400),
+])
+def test_unsupported_statements(sql, status):
+    assert denied(sql, 'admin').status_code == status
+
+
+def test_paged_keeps_the_query_order():
+    inner, keys = paged("SELECT course_name FROM courses ORDER BY credits DESC NULLS LAST, 1")
+    assert inner == "SELECT course_name, credits AS _page_k0, course_name AS _page_k1 FROM courses"
+    assert keys == [("page_q._page_k0", True, False), ("page_q._page_k1", False, False)]
+
+
+def test_paged_resolves_aliases_and_aggregates():
+    inner, keys = paged("SELECT department AS d, COUNT(*) FROM students GROUP BY department ORDER BY d, COUNT(*) DESC")
+    assert inner == "SELECT department AS d, COUNT(*), department AS _page_k0, COUNT(*) AS _page_k1 " \
+                    "FROM students GROUP BY department"
+    # PostgreSQL puts NULLs first in descending order unless told otherwise
+    assert keys == [("page_q._page_k0", False, False), ("page_q._page_k1", True, True)]
+
+
+def test_paged_keeps_order_under_a_limit():
+    inner, keys = paged("SELECT * FROM students ORDER BY cgpa DESC LIMIT 5")
+    assert inner == "SELECT *, cgpa AS _page_k0 FROM students ORDER BY cgpa DESC LIMIT 5"
+    assert keys == [("page_q._page_k0", True, True)]
+
+
+def test_paged_unordered_query_has_no_keys():
+    assert paged("SELECT * FROM courses") == ("SELECT * FROM courses", [])
+
+
+def test_paged_set_operations_use_output_columns():
+    assert paged("SELECT name FROM a UNION SELECT name FROM b ORDER BY 1 DESC") == \
+        ("SELECT name FROM a UNION SELECT name FROM b", [("page_q.name", True, True)])
+    assert paged("SELECT COUNT(*) FROM a UNION SELECT 1 ORDER BY 1") is None
+
+
+@pytest.mark.parametrize('sql', ["SELECT * FROM courses ORDER BY 1", "SELECT name FROM a ORDER BY 2"])
+def test_paged_refuses_unresolvable_keys(sql):
+    assert paged(sql) is None
+
+
+def test_page_query_first_page_has_no_predicate():
+    sql, params = page_query("SELECT 1", [("page_q._page_k0", True, True)])
+    assert sql == "SELECT page_q.*, page_q::text AS _page_row, ARRAY[page_q._page_k0::text]::text[] AS _page_keys " \
+                  "FROM (SELECT 1) AS page_q ORDER BY page_q._page_k0 DESC NULLS FIRST, _page_row OFFSET %s LIMIT %s"
+    assert params == []
+
+
+def test_page_query_seeks_past_the_last_row():
+    keys = [("page_q.a", False, False), ("page_q.b", True, True)]
+    sql, params = page_query("SELECT 1", keys, (["4", "x"], "(4,x)"))
+    assert " WHERE ((page_q.a > %s OR page_q.a IS NULL)) OR (page_q.a = %s AND page_q.b < %s) " \
+           "OR (page_q.a = %s AND page_q.b = %s AND page_q::text >= %s) ORDER BY" in sql
+    assert params == ["4", "4", "x", "4", "x", "(4,x)"]
+
+
+def test_page_query_places_nulls_like_the_order():
+    keys = [("page_q.a", False, False), ("page_q.b", False, True)]
+    # a is NULL and sorts last, so only later b values or later rows remain
+    sql, params = page_query("SELECT 1", keys, ([None, None], "(,)"))
+    assert " WHERE (page_q.a IS NULL AND page_q.b IS NOT NULL) " \
+           "OR (page_q.a IS NULL AND page_q.b IS NULL AND page_q::text >= %s) ORDER BY" in sql
+    assert params == ["(,)"]
+
+
+def test_paged_escapes_literal_percent():
+    inner, _ = paged("SELECT course_name FROM courses WHERE course_name LIKE 'Intro%' AND credits % 2 = %s")
+    assert inner == "SELECT course_name FROM courses WHERE course_name LIKE 'Intro%%' AND credits %% 2 = %s"
+
+
+@pytest.mark.parametrize('sql, has_limit', [
+    ("SELECT * FROM courses", False),
+    ("SELECT * FROM courses LIMIT 10", True),
+    ("SELECT * FROM courses FETCH FIRST 5 ROWS ONLY", True),
+    ("SELECT * FROM (SELECT * FROM courses LIMIT 10) c", False),
+    ("SELECT name FROM a UNION SELECT name FROM b LIMIT 3", True),
+    ("UPDATE courses SET credits = 4 WHERE course_id = 1", False),
+])
+def test_has_limit_is_top_level_only(sql, has_limit):
+    assert analyze(sql).has_limit is has_limit
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT * FROM courses",
+    "SELECT * FROM courses;",
+    "SELECT * FROM courses -- every course",
+    "SELECT name FROM a UNION SELECT name FROM b ORDER BY 1",
+])
+def test_with_limit_caps_the_whole_statement(sql):
+    bounded = with_limit(sql, 500)
+    analysis = analyze(bounded)
+    assert analysis.kind == 'select' and analysis.has_limit
+    assert bounded.endswith("\nLIMIT 500")
@@ -0,0 +1,96 @@
+import asyncio
+import sqlite3
+import time
+from translation_cache import USER_PLACEHOLDER, TranslationCache, bind_user, normalize_text
+
+
+def test_key_ignores_spacing_and_trailing_punctuation():
+    key = TranslationCache.make_key
+    assert key("Show all  courses?", USER_PLACEHOLDER, 'student', 'v1') == \
+        key("  Show all courses ", USER_PLACEHOLDER, 'student', 'v1')
+    assert normalize_text("Show   ALL courses!?") == "Show ALL courses"
+
+
+def test_key_keeps_case_and_quoted_text():
+    # Both end up in SQL literals, which compare exactly
+    key = TranslationCache.make_key
+    assert key("grades of John", USER_PLACEHOLDER, 'faculty', 'v1') != \
+        key("grades of john", USER_PLACEHOLDER, 'faculty', 'v1')
+    assert normalize_text("courses named  'Intro  to DB' ?") == "courses named 'Intro  to DB'"
+
+
+def test_key_separates_role_user_and_prompt_version():
+    key = TranslationCache.make_key
+    base = key("show my grades", USER_PLACEHOLDER, 'student', 'v1')
+    assert base != key("show my grades", USER_PLACEHOLDER, 'faculty', 'v1')
+    assert base != key("show my grades", 'user1', 'student', 'v1')
+    assert base != key("show my grades", USER_PLACEHOLDER, 'student', 'v2')
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TranslationCache(max_size=2, path='')
+    cache.set('a', {'n': 1})
+    cache.set('b', {'n': 2})
+    assert cache.get('a') == {'n': 1}
+    cache.set('c', {'n': 3})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'n': 1} and cache.get('c') == {'n': 3}
+    assert cache.stats()['size'] == 2
+
+
+def test_expired_entries_miss(monkeypatch):
+    cache = TranslationCache(ttl=10, path='')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    cache.set('a', {'n': 1})
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert cache.get('a') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'translations.db')
+    cache = TranslationCache(path=path)
+    cache.set('a', {'operation': 'select'})
+    cache.close()
+    reopened = TranslationCache(path=path)
+    assert reopened.get('a') == {'operation': 'select'}
+    assert reopened.stats()['disk_hits'] == 1
+    reopened.close()
+
+
+def test_disk_tier_is_capped_on_write(tmp_path):
+    path = str(tmp_path / 'translations.db')
+    cache = TranslationCache(max_size=2, path=path)
+    for key in 'abc':
+        cache.set(key, {'key': key})
+    cache.close()
+    keys = sqlite3.connect(path).execute("SELECT key FROM translations ORDER BY key").fetchall()
+    assert keys == [('b',), ('c',)]
+
+
+def test_async_access_reads_through_the_disk_tier(tmp_path):
+    path = str(tmp_path / 'translations.db')
+
+    async def run():
+        cache = TranslationCache(path=path)
+        await cache.set_async('a', {'operation': 'select'})
+        cache.close()
+        reopened = TranslationCache(path=path)
+        found, missing = await reopened.get_async('a'), await reopened.get_async('b')
+        reopened.close()
+        return found, missing, reopened.stats()
+
+    found, missing, stats = asyncio.run(run())
+    assert found == {'operation': 'select'} and missing is None
+    assert stats['disk_hits'] == 1 and stats['misses'] == 1
+
+
+def test_bind_user_fills_the_placeholder():
+    parsed = {'query': f"SELECT * FROM students WHERE username = '{USER_PLACEHOLDER}'",
+              'params': [1, USER_PLACEHOLDER], 'explanation': f"Courses of {USER_PLACEHOLDER}"}
+    bound = bind_user(parsed, "o'brien")
+    assert bound['query'] == "SELECT * FROM students WHERE username = 'o''brien'"
+    assert bound['params'] == [1, "o'brien"]
+    assert bound['explanation'] == "Courses of o'brien"
+    assert parsed['params'] == [1, USER_PLACEHOLDER]